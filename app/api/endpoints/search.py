@@ -1,6 +1,9 @@
-from typing import List, Any, Optional
+import json
+from typing import List, Any, Optional, Tuple
 
 from fastapi import APIRouter, Depends
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import StreamingResponse
 
 from app import schemas
 from app.chain.media import MediaChain
@@ -8,7 +11,7 @@ from app.chain.search import SearchChain
 from app.core.config import settings
 from app.core.event import eventmanager
 from app.core.metainfo import MetaInfo
-from app.core.security import verify_token
+from app.core.security import verify_token, verify_resource_token
 from app.schemas import MediaRecognizeConvertEventData
 from app.schemas.types import MediaType, ChainEventType
 
@@ -24,120 +27,118 @@ def search_latest(_: schemas.TokenPayload = Depends(verify_token)) -> Any:
     return [torrent.to_dict() for torrent in torrents]
 
 
-@router.get("/media/{mediaid}", summary="精确搜索资源", response_model=schemas.Response)
-def search_by_id(mediaid: str,
-                 mtype: Optional[str] = None,
-                 area: Optional[str] = "title",
-                 title: Optional[str] = None,
-                 year: Optional[str] = None,
-                 season: Optional[str] = None,
-                 sites: Optional[str] = None,
-                 _: schemas.TokenPayload = Depends(verify_token)) -> Any:
+def _parse_search_params(mtype: Optional[str] = None,
+                         season: Optional[str] = None,
+                         sites: Optional[str] = None) -> Tuple[Optional[MediaType], Optional[int], Optional[List[int]]]:
     """
-    根据TMDBID/豆瓣ID精确搜索站点资源 tmdb:/douban:/bangumi:
+    解析搜索参数
+    :return: 媒体类型、季号、站点ID列表
+    """
+    media_type = MediaType(mtype) if mtype else None
+    media_season = int(season) if season else None
+    site_list = [int(site) for site in sites.split(",") if site] if sites else None
+    return media_type, media_season, site_list
+
+
+def _resolve_mediaid(mediaid: str,
+                     media_type: Optional[MediaType] = None,
+                     media_season: Optional[int] = None,
+                     title: Optional[str] = None,
+                     year: Optional[str] = None) -> Tuple[dict, Optional[str]]:
+    """
+    根据前缀识别媒体ID，按识别源转换为TMDBID或豆瓣ID
+    :return: 搜索参数（tmdbid、doubanid、season），错误信息
     """
-    if mtype:
-        media_type = MediaType(mtype)
-    else:
-        media_type = None
-    if season:
-        media_season = int(season)
-    else:
-        media_season = None
-    if sites:
-        site_list = [int(site) for site in sites.split(",") if site]
-    else:
-        site_list = None
-    torrents = None
     # 根据前缀识别媒体ID
     if mediaid.startswith("tmdb:"):
         tmdbid = int(mediaid.replace("tmdb:", ""))
         if settings.RECOGNIZE_SOURCE == "douban":
             # 通过TMDBID识别豆瓣ID
             doubaninfo = MediaChain().get_doubaninfo_by_tmdbid(tmdbid=tmdbid, mtype=media_type)
-            if doubaninfo:
-                torrents = SearchChain().search_by_id(doubanid=doubaninfo.get("id"),
-                                                      mtype=media_type, area=area, season=media_season,
-                                                      sites=site_list, cache_local=True)
-            else:
-                return schemas.Response(success=False, message="未识别到豆瓣媒体信息")
-        else:
-            torrents = SearchChain().search_by_id(tmdbid=tmdbid, mtype=media_type, area=area, season=media_season,
-                                                  sites=site_list, cache_local=True)
+            if not doubaninfo:
+                return {}, "未识别到豆瓣媒体信息"
+            return {"doubanid": doubaninfo.get("id"), "season": media_season}, None
+        return {"tmdbid": tmdbid, "season": media_season}, None
     elif mediaid.startswith("douban:"):
         doubanid = mediaid.replace("douban:", "")
         if settings.RECOGNIZE_SOURCE == "themoviedb":
             # 通过豆瓣ID识别TMDBID
             tmdbinfo = MediaChain().get_tmdbinfo_by_doubanid(doubanid=doubanid, mtype=media_type)
-            if tmdbinfo:
-                if tmdbinfo.get('season') and not media_season:
-                    media_season = tmdbinfo.get('season')
-                torrents = SearchChain().search_by_id(tmdbid=tmdbinfo.get("id"),
-                                                      mtype=media_type, area=area, season=media_season,
-                                                      sites=site_list, cache_local=True)
-            else:
-                return schemas.Response(success=False, message="未识别到TMDB媒体信息")
-        else:
-            torrents = SearchChain().search_by_id(doubanid=doubanid, mtype=media_type, area=area, season=media_season,
-                                                  sites=site_list, cache_local=True)
+            if not tmdbinfo:
+                return {}, "未识别到TMDB媒体信息"
+            if tmdbinfo.get('season') and not media_season:
+                media_season = tmdbinfo.get('season')
+            return {"tmdbid": tmdbinfo.get("id"), "season": media_season}, None
+        return {"doubanid": doubanid, "season": media_season}, None
     elif mediaid.startswith("bangumi:"):
         bangumiid = int(mediaid.replace("bangumi:", ""))
         if settings.RECOGNIZE_SOURCE == "themoviedb":
             # 通过BangumiID识别TMDBID
             tmdbinfo = MediaChain().get_tmdbinfo_by_bangumiid(bangumiid=bangumiid)
-            if tmdbinfo:
-                torrents = SearchChain().search_by_id(tmdbid=tmdbinfo.get("id"),
-                                                      mtype=media_type, area=area, season=media_season,
-                                                      sites=site_list, cache_local=True)
-            else:
-                return schemas.Response(success=False, message="未识别到TMDB媒体信息")
-        else:
-            # 通过BangumiID识别豆瓣ID
-            doubaninfo = MediaChain().get_doubaninfo_by_bangumiid(bangumiid=bangumiid)
-            if doubaninfo:
-                torrents = SearchChain().search_by_id(doubanid=doubaninfo.get("id"),
-                                                      mtype=media_type, area=area, season=media_season,
-                                                      sites=site_list, cache_local=True)
-            else:
-                return schemas.Response(success=False, message="未识别到豆瓣媒体信息")
-    else:
-        # 未知前缀，广播事件解析媒体信息
-        event_data = MediaRecognizeConvertEventData(
-            mediaid=mediaid,
-            convert_type=settings.RECOGNIZE_SOURCE
-        )
-        event = eventmanager.send_event(ChainEventType.MediaRecognizeConvert, event_data)
-        # 使用事件返回的上下文数据
-        if event and event.event_data:
-            event_data: MediaRecognizeConvertEventData = event.event_data
-            if event_data.media_dict:
-                search_id = event_data.media_dict.get("id")
-                if event_data.convert_type == "themoviedb":
-                    torrents = SearchChain().search_by_id(tmdbid=search_id, mtype=media_type, area=area,
-                                                          season=media_season, cache_local=True)
-                elif event_data.convert_type == "douban":
-                    torrents = SearchChain().search_by_id(doubanid=search_id, mtype=media_type, area=area,
-                                                          season=media_season, cache_local=True)
-        else:
-            if not title:
-                return schemas.Response(success=False, message="未知的媒体ID")
-            # 使用名称识别兜底
-            meta = MetaInfo(title)
-            if year:
-                meta.year = year
-            if media_type:
-                meta.type = media_type
-            if media_season:
-                meta.type = MediaType.TV
-                meta.begin_season = media_season
-            mediainfo = MediaChain().recognize_media(meta=meta)
-            if mediainfo:
-                if settings.RECOGNIZE_SOURCE == "themoviedb":
-                    torrents = SearchChain().search_by_id(tmdbid=mediainfo.tmdb_id, mtype=media_type, area=area,
-                                                          season=media_season, cache_local=True)
-                else:
-                    torrents = SearchChain().search_by_id(doubanid=mediainfo.douban_id, mtype=media_type, area=area,
-                                                          season=media_season, cache_local=True)
+            if not tmdbinfo:
+                return {}, "未识别到TMDB媒体信息"
+            return {"tmdbid": tmdbinfo.get("id"), "season": media_season}, None
+        # 通过BangumiID识别豆瓣ID
+        doubaninfo = MediaChain().get_doubaninfo_by_bangumiid(bangumiid=bangumiid)
+        if not doubaninfo:
+            return {}, "未识别到豆瓣媒体信息"
+        return {"doubanid": doubaninfo.get("id"), "season": media_season}, None
+    # 未知前缀，广播事件解析媒体信息
+    event_data = MediaRecognizeConvertEventData(
+        mediaid=mediaid,
+        convert_type=settings.RECOGNIZE_SOURCE
+    )
+    event = eventmanager.send_event(ChainEventType.MediaRecognizeConvert, event_data)
+    # 使用事件返回的上下文数据
+    if event and event.event_data:
+        event_data: MediaRecognizeConvertEventData = event.event_data
+        if event_data.media_dict:
+            search_id = event_data.media_dict.get("id")
+            if event_data.convert_type == "themoviedb":
+                return {"tmdbid": search_id, "season": media_season}, None
+            elif event_data.convert_type == "douban":
+                return {"doubanid": search_id, "season": media_season}, None
+        return {}, None
+    if not title:
+        return {}, "未知的媒体ID"
+    # 使用名称识别兜底
+    meta = MetaInfo(title)
+    if year:
+        meta.year = year
+    if media_type:
+        meta.type = media_type
+    if media_season:
+        meta.type = MediaType.TV
+        meta.begin_season = media_season
+    mediainfo = MediaChain().recognize_media(meta=meta)
+    if not mediainfo:
+        return {}, None
+    if settings.RECOGNIZE_SOURCE == "themoviedb":
+        return {"tmdbid": mediainfo.tmdb_id, "season": media_season}, None
+    return {"doubanid": mediainfo.douban_id, "season": media_season}, None
+
+
+@router.get("/media/{mediaid}", summary="精确搜索资源", response_model=schemas.Response)
+def search_by_id(mediaid: str,
+                 mtype: Optional[str] = None,
+                 area: Optional[str] = "title",
+                 title: Optional[str] = None,
+                 year: Optional[str] = None,
+                 season: Optional[str] = None,
+                 sites: Optional[str] = None,
+                 _: schemas.TokenPayload = Depends(verify_token)) -> Any:
+    """
+    根据TMDBID/豆瓣ID精确搜索站点资源 tmdb:/douban:/bangumi:
+    """
+    media_type, media_season, site_list = _parse_search_params(mtype=mtype, season=season, sites=sites)
+    search_params, message = _resolve_mediaid(mediaid=mediaid, media_type=media_type, media_season=media_season,
+                                              title=title, year=year)
+    if message:
+        return schemas.Response(success=False, message=message)
+    torrents = None
+    if search_params:
+        torrents = SearchChain().search_by_id(**search_params, mtype=media_type, area=area,
+                                              sites=site_list, cache_local=True)
     # 返回搜索结果
     if not torrents:
         return schemas.Response(success=False, message="未搜索到任何资源")
@@ -145,6 +146,40 @@ def search_by_id(mediaid: str,
         return schemas.Response(success=True, data=[torrent.to_dict() for torrent in torrents])
 
 
+@router.get("/media/{mediaid}/stream", summary="流式精确搜索资源")
+def search_by_id_stream(mediaid: str,
+                        mtype: Optional[str] = None,
+                        area: Optional[str] = "title",
+                        title: Optional[str] = None,
+                        year: Optional[str] = None,
+                        season: Optional[str] = None,
+                        sites: Optional[str] = None,
+                        _: schemas.TokenPayload = Depends(verify_resource_token)) -> Any:
+    """
+    根据TMDBID/豆瓣ID精确搜索站点资源，返回格式为SSE：
+    每个站点完成后推送 partial 事件（该站点排序后的资源），全部完成后推送 final 事件（整体重新排序的资源）
+    """
+    media_type, media_season, site_list = _parse_search_params(mtype=mtype, season=season, sites=sites)
+
+    def event_generator():
+        search_params, message = _resolve_mediaid(mediaid=mediaid, media_type=media_type,
+                                                  media_season=media_season, title=title, year=year)
+        if message or not search_params:
+            yield f"event: error\ndata: {json.dumps({'message': message or '未识别到媒体信息'})}\n\n"
+            return
+        for event in SearchChain().search_by_id_stream(**search_params, mtype=media_type, area=area,
+                                                       sites=site_list, cache_local=True):
+            data = {
+                "site": event.get("site"),
+                "finished": event.get("finished"),
+                "total": event.get("total"),
+                "data": [context.to_dict() for context in event.get("contexts")]
+            }
+            yield f"event: {event.get('event')}\ndata: {json.dumps(jsonable_encoder(data))}\n\n"
+
+    return StreamingResponse(event_generator(), media_type="text/event-stream")
+
+
 @router.get("/title", summary="模糊搜索资源", response_model=schemas.Response)
 def search_by_title(keyword: Optional[str] = None,
                     page: Optional[int] = 0,
@@ -17,6 +17,7 @@ from app import schemas
 from app.chain.search import SearchChain
 from app.chain.system import SystemChain
 from app.core.config import global_vars, settings
+from app.core.event import eventmanager
 from app.core.metainfo import MetaInfo
 from app.core.module import ModuleManager
 from app.core.security import verify_apitoken, verify_resource_token, verify_token
@@ -466,6 +467,23 @@ def moduletest(moduleid: str, _: schemas.TokenPayload = Depends(verify_token)):
     return schemas.Response(success=state, message=errmsg)
 
 
+@router.get("/event/handlers", summary="查询事件处理器", response_model=schemas.Response)
+def event_handlers(_: User = Depends(get_current_active_superuser)):
+    """
+    查询已注册的事件处理器及启用状态（仅管理员）
+    """
+    return schemas.Response(success=True, data=eventmanager.visualize_handlers())
+
+
+@router.get("/event/metrics", summary="事件总线统计", response_model=schemas.Response)
+def event_metrics(top: Optional[int] = 10,
+                  _: User = Depends(get_current_active_superuser)):
+    """
+    查询事件总线统计：各广播事件的积压、丢弃和调度延迟，各处理器的 p50/p95 耗时、出错次数及最慢的处理器（仅管理员）
+    """
+    return schemas.Response(success=True, data=eventmanager.get_metrics(top=top))
+
+
 @router.get("/restart", summary="重启系统", response_model=schemas.Response)
 def restart_system(_: User = Depends(get_current_active_superuser)):
     """
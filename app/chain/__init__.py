@@ -353,6 +353,20 @@ class ChainBase(metaclass=ABCMeta):
         return self.run_module("filter_torrents", rule_groups=rule_groups,
                                torrent_list=torrent_list, mediainfo=mediainfo)
 
+    def filter_torrents_batch(self, rule_groups_list: List[List[str]],
+                              torrent_list: List[TorrentInfo],
+                              mediainfos: List[Optional[MediaInfo]] = None
+                              ) -> Optional[Dict[Tuple[str, ...], List[Optional[int]]]]:
+        """
+        批量过滤种子资源，一次性计算多个规则组组合下每个种子的优先级
+        :param rule_groups_list:  规则组名称列表的集合，每一项为一种规则组组合
+        :param torrent_list:  资源列表
+        :param mediainfos:  与资源列表一一对应的媒体信息
+        :return: 规则组组合 -> 与资源列表一一对应的优先级，不符合过滤规则时为None
+        """
+        return self.run_module("filter_torrents_batch", rule_groups_list=rule_groups_list,
+                               torrent_list=torrent_list, mediainfos=mediainfos)
+
     def download(self, content: Union[Path, str], download_dir: Path, cookie: str,
                  episodes: Set[int] = None, category: Optional[str] = None, label: Optional[str] = None,
                  downloader: Optional[str] = None
@@ -1,13 +1,19 @@
+import re
 import threading
-from typing import List, Union, Optional, Generator, Any
+import time
+from concurrent.futures import Future, ThreadPoolExecutor, as_completed
+from typing import Dict, List, Set, Tuple, Union, Optional, Generator, Any
 
 from app.chain import ChainBase
 from app.core.cache import cached
-from app.core.config import global_vars
+from app.core.config import global_vars, settings
+from app.core.event import eventmanager, Event
 from app.db.mediaserver_oper import MediaServerOper
 from app.helper.service import ServiceConfigHelper
 from app.log import logger
-from app.schemas import MediaServerLibrary, MediaServerItem, MediaServerSeasonInfo, MediaServerPlayItem
+from app.schemas import MediaServerConf, MediaServerLibrary, MediaServerItem, MediaServerSeasonInfo, MediaServerPlayItem, \
+    WebhookEventInfo
+from app.schemas.types import EventType
 
 lock = threading.Lock()
 
@@ -17,6 +23,10 @@ class MediaServerChain(ChainBase):
     媒体服务器处理链
     """
 
+    # 媒体服务器入库、删除的Webhook事件，Emby 原生通知为 library.*，Webhook 插件为 Item*，Plex 无删除事件
+    _library_events = ["library.new", "library.deleted", "ItemAdded", "ItemDeleted"]
+    _delete_events = ["library.deleted", "ItemDeleted"]
+
     def __init__(self):
         super().__init__()
         self.dboper = MediaServerOper()
@@ -119,20 +129,21 @@ class MediaServerChain(ChainBase):
         """
         return self.run_module("mediaserver_play_url", server=server, item_id=item_id)
 
-    def sync(self):
+    def sync(self, full: bool = False):
         """
-        同步媒体库所有数据到本地数据库
+        同步媒体库所有数据到本地数据库，按item_id增量比对，所有变更在同一事务中提交，同步过程中查询仍得到原有数据
+        各媒体服务器并发同步，服务器内的媒体库和剧集信息按 MEDIASERVER_SYNC_WORKERS 限制并发
+        :param full: 是否全量同步，全量同步时忽略媒体服务器提供的变化时间，重新获取所有剧集信息
         """
         # 设置的媒体服务器
         mediaservers = ServiceConfigHelper.get_mediaserver_configs()
         if not mediaservers:
             return
         with lock:
-            # 汇总统计
-            total_count = 0
-            # 清空登记薄
-            self.dboper.empty()
-            # 遍历媒体服务器
+            # 已同步条目的最后变化时间
+            sync_dates = {} if full else self.dboper.list_sync_dates()
+            # 启用的媒体服务器
+            servers = []
             for mediaserver in mediaservers:
                 if not mediaserver:
                     continue
@@ -140,43 +151,171 @@ class MediaServerChain(ChainBase):
                 if not mediaserver.enabled:
                     logger.info(f"媒体服务器 {mediaserver.name} 未启用，跳过")
                     continue
-                server_name = mediaserver.name
-                sync_libraries = mediaserver.sync_libraries or []
-                logger.info(f"开始同步媒体服务器 {server_name} 的数据 ...")
-                libraries = self.librarys(server_name)
-                if not libraries:
-                    logger.info(f"没有获取到媒体服务器 {server_name} 的媒体库，跳过")
-                    continue
-                for library in libraries:
-                    if sync_libraries \
-                            and "all" not in sync_libraries \
-                            and str(library.id) not in sync_libraries:
-                        logger.info(f"{library.name} 未在 {server_name} 同步媒体库列表中，跳过")
-                        continue
-                    logger.info(f"正在同步 {server_name} 媒体库 {library.name} ...")
-                    library_count = 0
-                    for item in self.items(server=server_name, library_id=library.id):
-                        if global_vars.is_system_stopped:
-                            return
-                        if not item or not item.item_id:
+                servers.append(mediaserver)
+            # 汇总统计
+            total_count = 0
+            # 有变化或无法判断是否变化的条目
+            sync_items = []
+            # 媒体服务器端未变化的条目
+            unchanged = set()
+            # 有媒体服务器未获取到数据时不删除本地数据
+            incomplete = False
+            if servers:
+                with ThreadPoolExecutor(max_workers=len(servers), thread_name_prefix="mediaserver-sync") as executor:
+                    futures = [executor.submit(self.__sync_server, mediaserver, sync_dates) for mediaserver in servers]
+                    for future in as_completed(futures):
+                        result = future.result()
+                        if result is None:
+                            incomplete = True
                             continue
-                        logger.debug(f"正在同步 {item.title} ...")
-                        # 计数
-                        library_count += 1
-                        seasoninfo = {}
-                        # 类型
-                        item_type = "电视剧" if item.item_type in ["Series", "show"] else "电影"
-                        if item_type == "电视剧":
-                            # 查询剧集信息
-                            espisodes_info = self.episodes(server_name, item.item_id) or []
-                            for episode in espisodes_info:
-                                seasoninfo[episode.season] = episode.episodes
-                        # 插入数据
-                        item_dict = item.dict()
-                        item_dict["seasoninfo"] = seasoninfo
-                        item_dict["item_type"] = item_type
-                        self.dboper.add(**item_dict)
-                    logger.info(f"{server_name} 媒体库 {library.name} 同步完成，共同步数量：{library_count}")
-                    # 总数累加
-                    total_count += library_count
-                logger.info(f"媒体服务器 {server_name} 数据同步完成，总同步数量：{total_count}")
+                        server_items, server_unchanged, server_count = result
+                        sync_items.extend(server_items)
+                        unchanged.update(server_unchanged)
+                        total_count += server_count
+            if global_vars.is_system_stopped:
+                return
+            if incomplete:
+                logger.warn("部分媒体服务器未获取到数据，本次同步不删除本地数据")
+            # 统一写入数据库
+            inserted, updated, deleted = self.dboper.sync(items=sync_items, unchanged=unchanged,
+                                                          delete_vanished=not incomplete)
+            logger.info(f"媒体库数据写入完成，总同步数量：{total_count}，新增 {inserted} 条，更新 {updated} 条，"
+                        f"删除 {deleted} 条，未变化 {total_count - inserted - updated} 条")
+
+    def __sync_server(self, mediaserver: MediaServerConf,
+                      sync_dates: Dict[str, Optional[str]]) -> Optional[Tuple[List[dict], Set[str], int]]:
+        """
+        同步一个媒体服务器的数据，媒体库和剧集信息在同一线程池中并发获取，对该服务器的并发请求不超过 MEDIASERVER_SYNC_WORKERS
+        :param mediaserver: 媒体服务器配置
+        :param sync_dates: 已同步条目的最后变化时间
+        :return: 有变化的条目、未变化的item_id、同步数量，未获取到媒体库时返回None
+        """
+        server_name = mediaserver.name
+        sync_libraries = mediaserver.sync_libraries or []
+        logger.info(f"开始同步媒体服务器 {server_name} 的数据 ...")
+        start_time = time.monotonic()
+        libraries = self.librarys(server_name)
+        if not libraries:
+            logger.info(f"没有获取到媒体服务器 {server_name} 的媒体库，跳过")
+            return None
+        sync_libraries = [library for library in libraries
+                          if not sync_libraries
+                          or "all" in sync_libraries
+                          or str(library.id) in sync_libraries]
+        for library in libraries:
+            if library not in sync_libraries:
+                logger.info(f"{library.name} 未在 {server_name} 同步媒体库列表中，跳过")
+        if not sync_libraries:
+            return [], set(), 0
+
+        # 单个服务器的并发数
+        workers = max(settings.MEDIASERVER_SYNC_WORKERS, 1)
+        # 待写入的条目及其剧集信息任务
+        pending: List[Tuple[dict, Optional[Future]]] = []
+        unchanged = set()
+        total_count = 0
+
+        def __sync_library(_library: MediaServerLibrary) -> int:
+            """
+            遍历媒体库条目，剧集信息提交到同一线程池获取
+            """
+            logger.info(f"正在同步 {server_name} 媒体库 {_library.name} ...")
+            _count = 0
+            for item in self.items(server=server_name, library_id=_library.id):
+                if global_vars.is_system_stopped:
+                    break
+                if not item or not item.item_id:
+                    continue
+                logger.debug(f"正在同步 {item.title} ...")
+                # 计数
+                _count += 1
+                if item.lst_mod_date and sync_dates.get(item.item_id) == item.lst_mod_date:
+                    # 媒体服务器端未变化，保留原有数据
+                    unchanged.add(item.item_id)
+                    continue
+                # 类型
+                item_type = "电视剧" if item.item_type in ["Series", "show"] else "电影"
+                # 待写入数据
+                item_dict = item.dict()
+                item_dict["item_type"] = item_type
+                # 查询剧集信息
+                pending.append((item_dict, executor.submit(self.episodes, server_name, item.item_id)
+                                if item_type == "电视剧" else None))
+            logger.info(f"{server_name} 媒体库 {_library.name} 同步完成，共同步数量：{_count}")
+            return _count
+
+        # 媒体库遍历只提交剧集任务而不等待其结果，共用线程池不会死锁
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix=f"mediaserver-{server_name}") as executor:
+            for library_future in as_completed([executor.submit(__sync_library, library)
+                                                for library in sync_libraries]):
+                total_count += library_future.result()
+            items = []
+            for item_dict, episode_future in pending:
+                if global_vars.is_system_stopped:
+                    executor.shutdown(wait=False, cancel_futures=True)
+                    return None
+                seasoninfo = {}
+                if episode_future:
+                    for episode in episode_future.result() or []:
+                        seasoninfo[episode.season] = episode.episodes
+                item_dict["seasoninfo"] = seasoninfo
+                items.append(item_dict)
+
+        seconds = time.monotonic() - start_time
+        logger.info(f"媒体服务器 {server_name} 数据同步完成，总同步数量：{total_count}，"
+                    f"耗时 {seconds:.1f} 秒，速度 {total_count / seconds if seconds else 0:.1f} 条/秒")
+        return items, unchanged, total_count
+
+    @staticmethod
+    def __get_webhook_item_id(event_info: WebhookEventInfo) -> Optional[str]:
+        """
+        获取Webhook事件对应条目的item_id，剧集事件取整部剧，格式与同步时保存的item_id一致
+        """
+        message = event_info.json_object or {}
+        item = message.get("Item") or message.get("Metadata") or message
+        if event_info.channel == "plex":
+            # Plex 同步时保存的是条目的 key：/library/metadata/{ratingKey}
+            item_id = item.get("grandparentRatingKey") or item.get("ratingKey") \
+                or item.get("grandparentKey") or item.get("key") or event_info.item_id
+            match = re.match(r"^(?:/library/metadata/)?(\d+)", str(item_id or ""))
+            return f"/library/metadata/{match.group(1)}" if match else None
+        item_id = item.get("SeriesId") or item.get("ItemId") or item.get("Id") or event_info.item_id
+        return str(item_id) if item_id else None
+
+    @eventmanager.register(EventType.WebhookMessage)
+    def update_by_webhook(self, event: Event):
+        """
+        媒体服务器入库或删除事件发生时，更新对应条目的本地数据和内存索引
+        """
+        if not event:
+            return
+        event_info: WebhookEventInfo = event.event_data
+        if not event_info or event_info.event not in self._library_events:
+            return
+        item_id = self.__get_webhook_item_id(event_info)
+        if not item_id:
+            return
+        server_name = event_info.server_name
+        if not server_name:
+            # 未指定来源时按媒体服务器类型匹配
+            server_name = next((conf.name for conf in ServiceConfigHelper.get_mediaserver_configs()
+                                if conf and conf.enabled and conf.type == event_info.channel), None)
+        if not server_name:
+            return
+        iteminfo = self.iteminfo(server=server_name, item_id=item_id)
+        if not iteminfo:
+            if event_info.event in self._delete_events:
+                # 媒体服务器中已不存在
+                self.dboper.delete_by_itemid(str(item_id))
+                logger.info(f"媒体服务器 {server_name} 条目 {item_id} 已删除，已更新本地数据")
+            return
+        item_type = "电视剧" if iteminfo.item_type in ["Series", "show"] else "电影"
+        seasoninfo = {}
+        if item_type == "电视剧":
+            for episode in self.episodes(server_name, iteminfo.item_id) or []:
+                seasoninfo[episode.season] = episode.episodes
+        item_dict = iteminfo.dict()
+        item_dict["seasoninfo"] = seasoninfo
+        item_dict["item_type"] = item_type
+        if self.dboper.sync_item(item_dict):
+            logger.info(f"媒体服务器 {server_name} 条目 {iteminfo.title} 已变化，已更新本地数据")
@@ -1,16 +1,20 @@
+import copy
 import pickle
+import time
 import traceback
-from concurrent.futures import ThreadPoolExecutor, as_completed
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
 from datetime import datetime
-from typing import Dict
+from typing import Dict, Generator, Tuple
 from typing import List, Optional
 
 from app.chain import ChainBase
-from app.core.config import global_vars
+from app.core.config import global_vars, settings
 from app.core.context import Context
 from app.core.context import MediaInfo, TorrentInfo
 from app.core.event import eventmanager, Event
+from app.core.meta import MetaBase
 from app.core.metainfo import MetaInfo
+from app.db.site_oper import SiteOper
 from app.db.systemconfig_oper import SystemConfigOper
 from app.helper.progress import ProgressHelper
 from app.helper.sites import SitesHelper
@@ -18,6 +22,10 @@ from app.helper.torrent import TorrentHelper
 from app.log import logger
 from app.schemas import NotExistMediaInfo
 from app.schemas.types import MediaType, ProgressKey, SystemConfigKey, EventType
+from app.utils.string import StringUtils
+
+# 站点搜索共享线程池
+_search_executor = ThreadPoolExecutor(max_workers=settings.SEARCH_MAX_WORKERS, thread_name_prefix="search")
 
 
 class SearchChain(ChainBase):
@@ -64,6 +72,29 @@ class SearchChain(ChainBase):
             self.save_cache(pickle.dumps(results), self.__result_temp_file)
         return results
 
+    def search_by_id_stream(self, tmdbid: Optional[int] = None, doubanid: Optional[str] = None,
+                            mtype: MediaType = None, area: Optional[str] = "title", season: Optional[int] = None,
+                            sites: List[int] = None, cache_local: bool = False) -> Generator[dict, None, None]:
+        """
+        根据TMDBID/豆瓣ID流式搜索资源，参数同search_by_id，按站点完成顺序逐步返回排序后的资源
+        """
+        mediainfo = self.recognize_media(tmdbid=tmdbid, doubanid=doubanid, mtype=mtype)
+        if not mediainfo:
+            logger.error(f'{tmdbid} 媒体信息识别失败！')
+            return
+        no_exists = None
+        if season:
+            no_exists = {
+                tmdbid or doubanid: {
+                    season: NotExistMediaInfo(episodes=[])
+                }
+            }
+        for event in self.process_stream(mediainfo=mediainfo, sites=sites, area=area, no_exists=no_exists):
+            # 保存到本地文件
+            if cache_local and event.get("event") == "final":
+                self.save_cache(pickle.dumps(event.get("contexts")), self.__result_temp_file)
+            yield event
+
     def search_by_title(self, title: str, page: Optional[int] = 0,
                         sites: List[int] = None, cache_local: Optional[bool] = False) -> List[Context]:
         """
@@ -123,15 +154,123 @@ class SearchChain(ChainBase):
         :param custom_words: 自定义识别词列表
         :param filter_params: 过滤参数
         """
+        prepared = self.__prepare_process(mediainfo=mediainfo, keyword=keyword, no_exists=no_exists)
+        if not prepared:
+            return []
+        mediainfo, season_episodes, keywords = prepared
 
-        def __do_filter(torrent_list: List[TorrentInfo]) -> List[TorrentInfo]:
-            """
-            执行优先级过滤
-            """
-            return self.filter_torrents(rule_groups=rule_groups,
-                                        torrent_list=torrent_list,
-                                        mediainfo=mediainfo) or []
+        # 执行搜索
+        torrents: List[TorrentInfo] = self.__search_all_sites(
+            mediainfo=mediainfo,
+            keywords=keywords,
+            sites=sites,
+            area=area
+        )
+        if not torrents:
+            logger.warn(f'{keyword or mediainfo.title} 未搜索到资源')
+            return []
+
+        # 开始新进度
+        self.progress.start(ProgressKey.Search)
+
+        # 过滤并匹配
+        _match_torrents = self.__filter_and_match(torrents=torrents,
+                                                  mediainfo=mediainfo,
+                                                  keyword=keyword,
+                                                  season_episodes=season_episodes,
+                                                  rule_groups=rule_groups,
+                                                  custom_words=custom_words,
+                                                  filter_params=filter_params,
+                                                  progress=True)
+
+        # 去掉mediainfo中多余的数据
+        mediainfo.clear()
+
+        # 组装上下文
+        contexts = [Context(torrent_info=t[0],
+                            media_info=mediainfo,
+                            meta_info=t[1]) for t in _match_torrents]
+
+        # 排序
+        self.progress.update(value=99,
+                             text=f'正在对 {len(contexts)} 个资源进行排序，请稍候...',
+                             key=ProgressKey.Search)
+        contexts = self.torrenthelper.sort_torrents(contexts)
 
+        # 结束进度
+        logger.info(f'搜索完成，共 {len(contexts)} 个资源')
+        self.progress.update(value=100,
+                             text=f'搜索完成，共 {len(contexts)} 个资源',
+                             key=ProgressKey.Search)
+        self.progress.end(ProgressKey.Search)
+
+        # 返回
+        return contexts
+
+    def process_stream(self, mediainfo: MediaInfo,
+                       keyword: Optional[str] = None,
+                       no_exists: Dict[int, Dict[int, NotExistMediaInfo]] = None,
+                       sites: List[int] = None,
+                       rule_groups: List[str] = None,
+                       area: Optional[str] = "title",
+                       custom_words: List[str] = None,
+                       filter_params: Dict[str, str] = None) -> Generator[dict, None, None]:
+        """
+        流式搜索种子资源，每个站点搜索完成后立即过滤、匹配并输出该站点排序后的资源，全部站点完成后输出整体重新排序的结果
+        参数同process
+        :return: 事件生成器，partial事件包含站点名称、进度和该站点的资源，final事件包含全部资源
+        """
+        prepared = self.__prepare_process(mediainfo=mediainfo, keyword=keyword, no_exists=no_exists)
+        if not prepared:
+            return
+        mediainfo, season_episodes, keywords = prepared
+        # 上下文使用精简后的媒体信息，匹配时仍使用完整的媒体信息
+        context_mediainfo = copy.deepcopy(mediainfo)
+        context_mediainfo.clear()
+        # 所有站点的匹配结果
+        all_contexts: List[Context] = []
+        for site_name, finished, total, torrents in self.__search_sites(mediainfo=mediainfo,
+                                                                         keywords=keywords,
+                                                                         sites=sites,
+                                                                         area=area):
+            if global_vars.is_system_stopped:
+                return
+            _match_torrents = self.__filter_and_match(torrents=torrents,
+                                                      mediainfo=mediainfo,
+                                                      keyword=keyword,
+                                                      season_episodes=season_episodes,
+                                                      rule_groups=rule_groups,
+                                                      custom_words=custom_words,
+                                                      filter_params=filter_params,
+                                                      progress=False) if torrents else []
+            contexts = self.torrenthelper.sort_torrents([Context(torrent_info=t[0],
+                                                                 media_info=context_mediainfo,
+                                                                 meta_info=t[1]) for t in _match_torrents])
+            all_contexts.extend(contexts)
+            logger.info(f"站点 {site_name} 流式搜索完成，匹配到 {len(contexts)} 个资源，进度：{finished} / {total}")
+            yield {
+                "event": "partial",
+                "site": site_name,
+                "finished": finished,
+                "total": total,
+                "contexts": contexts
+            }
+        # 全部站点完成后整体重新排序
+        all_contexts = self.torrenthelper.sort_torrents(all_contexts)
+        logger.info(f'流式搜索完成，共 {len(all_contexts)} 个资源')
+        yield {
+            "event": "final",
+            "contexts": all_contexts
+        }
+
+    def __prepare_process(self, mediainfo: MediaInfo,
+                          keyword: Optional[str] = None,
+                          no_exists: Dict[int, Dict[int, NotExistMediaInfo]] = None
+                          ) -> Optional[Tuple[MediaInfo, Optional[Dict[int, list]], List[str]]]:
+        """
+        补充媒体信息，计算需要的季集和搜索关键词
+        :return: 媒体信息、需要的季集、搜索关键词，媒体信息识别失败时返回None
+        """
         # 豆瓣标题处理
         if not mediainfo.tmdb_id:
             meta = MetaInfo(title=mediainfo.title)
@@ -146,7 +285,7 @@ class SearchChain(ChainBase):
                                                         doubanid=mediainfo.douban_id)
             if not mediainfo:
                 logger.error(f'媒体信息识别失败！')
-                return []
+                return None
 
         # 缺失的季集
         mediakey = mediainfo.tmdb_id or mediainfo.douban_id
@@ -171,24 +310,28 @@ class SearchChain(ChainBase):
                                                        mediainfo.hk_title,
                                                        mediainfo.tw_title,
                                                        mediainfo.sg_title] if k]))
+        return mediainfo, season_episodes, keywords
+
+    def __filter_and_match(self, torrents: List[TorrentInfo],
+                           mediainfo: MediaInfo,
+                           keyword: Optional[str] = None,
+                           season_episodes: Optional[Dict[int, list]] = None,
+                           rule_groups: List[str] = None,
+                           custom_words: List[str] = None,
+                           filter_params: Dict[str, str] = None,
+                           progress: bool = True) -> List[Tuple[TorrentInfo, MetaBase]]:
+        """
+        对搜索结果应用附加参数和过滤规则，并与媒体信息匹配
+        :param progress: 是否更新搜索进度
+        :return: 匹配成功的种子及其元数据
+        """
 
-        # 执行搜索
-        torrents: List[TorrentInfo] = self.__search_all_sites(
-            mediainfo=mediainfo,
-            keywords=keywords,
-            sites=sites,
-            area=area
-        )
-        if not torrents:
-            logger.warn(f'{keyword or mediainfo.title} 未搜索到资源')
-            return []
-
-        # 开始新进度
-        self.progress.start(ProgressKey.Search)
+        def __update_progress(value: float, text: str):
+            if progress:
+                self.progress.update(value=value, text=text, key=ProgressKey.Search)
 
         # 开始过滤
-        self.progress.update(value=0, text=f'开始过滤，总 {len(torrents)} 个资源，请稍候...',
-                             key=ProgressKey.Search)
+        __update_progress(value=0, text=f'开始过滤，总 {len(torrents)} 个资源，请稍候...')
         # 匹配订阅附加参数
         if filter_params:
             logger.info(f'开始附加参数过滤，附加参数：{filter_params} ...')
@@ -199,14 +342,16 @@ class SearchChain(ChainBase):
             rule_groups: List[str] = self.systemconfig.get(SystemConfigKey.SearchFilterRuleGroups)
         if rule_groups:
             logger.info(f'开始过滤规则/剧集过滤，使用规则组：{rule_groups} ...')
-            torrents = __do_filter(torrents)
+            torrents = self.filter_torrents(rule_groups=rule_groups,
+                                            torrent_list=torrents,
+                                            mediainfo=mediainfo) or []
             if not torrents:
                 logger.warn(f'{keyword or mediainfo.title} 没有符合过滤规则的资源')
                 return []
             logger.info(f"过滤规则/剧集过滤完成，剩余 {len(torrents)} 个资源")
 
         # 过滤完成
-        self.progress.update(value=50, text=f'过滤完成，剩余 {len(torrents)} 个资源', key=ProgressKey.Search)
+        __update_progress(value=50, text=f'过滤完成，剩余 {len(torrents)} 个资源')
 
         # 开始匹配
         _match_torrents = []
@@ -218,14 +363,13 @@ class SearchChain(ChainBase):
         if mediainfo:
             # 英文标题应该在别名/原标题中，不需要再匹配
             logger.info(f"开始匹配结果 标题：{mediainfo.title}，原标题：{mediainfo.original_title}，别名：{mediainfo.names}")
-            self.progress.update(value=51, text=f'开始匹配，总 {_total} 个资源 ...', key=ProgressKey.Search)
+            __update_progress(value=51, text=f'开始匹配，总 {_total} 个资源 ...')
             for torrent in torrents:
                 if global_vars.is_system_stopped:
                     break
                 _count += 1
-                self.progress.update(value=(_count / _total) * 96,
-                                     text=f'正在匹配 {torrent.site_name}，已完成 {_count} / {_total} ...',
-                                     key=ProgressKey.Search)
+                __update_progress(value=(_count / _total) * 96,
+                                  text=f'正在匹配 {torrent.site_name}，已完成 {_count} / {_total} ...')
                 if not torrent.title:
                     continue
 
@@ -258,35 +402,11 @@ class SearchChain(ChainBase):
                     continue
             # 匹配完成
             logger.info(f"匹配完成，共匹配到 {len(_match_torrents)} 个资源")
-            self.progress.update(value=97,
-                                 text=f'匹配完成，共匹配到 {len(_match_torrents)} 个资源',
-                                 key=ProgressKey.Search)
+            __update_progress(value=97, text=f'匹配完成，共匹配到 {len(_match_torrents)} 个资源')
         else:
             _match_torrents = [(t, MetaInfo(title=t.title, subtitle=t.description)) for t in torrents]
 
-        # 去掉mediainfo中多余的数据
-        mediainfo.clear()
-
-        # 组装上下文
-        contexts = [Context(torrent_info=t[0],
-                            media_info=mediainfo,
-                            meta_info=t[1]) for t in _match_torrents]
-
-        # 排序
-        self.progress.update(value=99,
-                             text=f'正在对 {len(contexts)} 个资源进行排序，请稍候...',
-                             key=ProgressKey.Search)
-        contexts = self.torrenthelper.sort_torrents(contexts)
-
-        # 结束进度
-        logger.info(f'搜索完成，共 {len(contexts)} 个资源')
-        self.progress.update(value=100,
-                             text=f'搜索完成，共 {len(contexts)} 个资源',
-                             key=ProgressKey.Search)
-        self.progress.end(ProgressKey.Search)
-
-        # 返回
-        return contexts
+        return _match_torrents
 
     def __search_all_sites(self, keywords: List[str],
                            mediainfo: Optional[MediaInfo] = None,
@@ -302,60 +422,19 @@ class SearchChain(ChainBase):
         :param area:  搜索区域 title or imdbid
         :reutrn: 资源列表
         """
-        # 未开启的站点不搜索
-        indexer_sites = []
-
-        # 配置的索引站点
-        if not sites:
-            sites = self.systemconfig.get(SystemConfigKey.IndexerSites) or []
-
-        for indexer in self.siteshelper.get_indexers():
-            # 检查站点索引开关
-            if not sites or indexer.get("id") in sites:
-                indexer_sites.append(indexer)
-        if not indexer_sites:
-            logger.warn('未开启任何有效站点，无法搜索资源')
-            return []
-
         # 开始进度
         self.progress.start(ProgressKey.Search)
         # 开始计时
         start_time = datetime.now()
-        # 总数
-        total_num = len(indexer_sites)
-        # 完成数
-        finish_count = 0
-        # 更新进度
-        self.progress.update(value=0,
-                             text=f"开始搜索，共 {total_num} 个站点 ...",
-                             key=ProgressKey.Search)
-        # 多线程
-        executor = ThreadPoolExecutor(max_workers=len(indexer_sites))
-        all_task = []
-        for site in indexer_sites:
-            if area == "imdbid":
-                # 搜索IMDBID
-                task = executor.submit(self.search_torrents, site=site,
-                                       keywords=[mediainfo.imdb_id] if mediainfo else None,
-                                       mtype=mediainfo.type if mediainfo else None,
-                                       page=page)
-            else:
-                # 搜索标题
-                task = executor.submit(self.search_torrents, site=site,
-                                       keywords=keywords,
-                                       mtype=mediainfo.type if mediainfo else None,
-                                       page=page)
-            all_task.append(task)
         # 结果集
         results = []
-        for future in as_completed(all_task):
-            if global_vars.is_system_stopped:
-                break
-            finish_count += 1
-            result = future.result()
+        for _, finish_count, total_num, result in self.__search_sites(keywords=keywords,
+                                                                      mediainfo=mediainfo,
+                                                                      sites=sites,
+                                                                      page=page,
+                                                                      area=area):
             if result:
                 results.extend(result)
-            logger.info(f"站点搜索进度：{finish_count} / {total_num}")
             self.progress.update(value=finish_count / total_num * 100,
                                  text=f"正在搜索{keywords or ''}，已完成 {finish_count} / {total_num} 个站点 ...",
                                  key=ProgressKey.Search)
@@ -371,6 +450,130 @@ class SearchChain(ChainBase):
         # 返回
         return results
 
+    def __search_sites(self, keywords: List[str],
+                       mediainfo: Optional[MediaInfo] = None,
+                       sites: List[int] = None,
+                       page: Optional[int] = 0,
+                       area: Optional[str] = "title"
+                       ) -> Generator[Tuple[str, int, int, List[TorrentInfo]], None, None]:
+        """
+        使用共享线程池搜索多个站点，按站点完成顺序逐个返回结果，超过总时限或站点时限的站点不再等待
+        :param mediainfo:  识别的媒体信息
+        :param keywords:  搜索关键词列表
+        :param sites:  指定站点ID列表，如有则只搜索指定站点，否则搜索所有站点
+        :param page:  搜索页码
+        :param area:  搜索区域 title or imdbid
+        :return: 站点名称、已完成站点数、站点总数、该站点的资源列表
+        """
+        # 未开启的站点不搜索
+        indexer_sites = []
+
+        # 配置的索引站点
+        if not sites:
+            sites = self.systemconfig.get(SystemConfigKey.IndexerSites) or []
+
+        for indexer in self.siteshelper.get_indexers():
+            # 检查站点索引开关
+            if not sites or indexer.get("id") in sites:
+                indexer_sites.append(indexer)
+        if not indexer_sites:
+            logger.warn('未开启任何有效站点，无法搜索资源')
+            return
+
+        # 总数
+        total_num = len(indexer_sites)
+        # 完成数
+        finish_count = 0
+        # 各站点开始搜索的时间
+        start_times: Dict[int, float] = {}
+
+        def __search_site(_site: dict) -> List[TorrentInfo]:
+            """
+            搜索单个站点，记录开始时间用于计算站点时限
+            """
+            start_times[_site.get("id")] = time.monotonic()
+            if area == "imdbid":
+                # 搜索IMDBID
+                return self.search_torrents(site=_site,
+                                            keywords=[mediainfo.imdb_id] if mediainfo else None,
+                                            mtype=mediainfo.type if mediainfo else None,
+                                            page=page)
+            # 搜索标题
+            return self.search_torrents(site=_site,
+                                        keywords=keywords,
+                                        mtype=mediainfo.type if mediainfo else None,
+                                        page=page)
+
+        # 单次请求的超时时间不超过搜索时限，避免无响应的站点长时间占用共享线程池
+        request_timeout = min([timeout for timeout in (settings.SEARCH_SITE_TIMEOUT, settings.SEARCH_TIMEOUT)
+                               if timeout > 0] or [0])
+        search_sites = []
+        for site in indexer_sites:
+            # 每次搜索使用站点配置的副本，search_token 用于与索引器约定由谁记录站点访问统计
+            search_site = {**site, "search_token": {}}
+            if request_timeout:
+                search_site["timeout"] = min(site.get("timeout") or request_timeout, request_timeout)
+            search_sites.append(search_site)
+        # 提交到共享线程池
+        all_task = {_search_executor.submit(__search_site, site): site for site in search_sites}
+        pending = set(all_task)
+        # 总时限
+        deadline = time.monotonic() + settings.SEARCH_TIMEOUT if settings.SEARCH_TIMEOUT > 0 else None
+        site_timeout = settings.SEARCH_SITE_TIMEOUT if settings.SEARCH_SITE_TIMEOUT > 0 else None
+        # 超时的站点
+        late_tasks = []
+        try:
+            while pending and not global_vars.is_system_stopped:
+                now = time.monotonic()
+                if deadline and now >= deadline:
+                    # 到达总时限，放弃所有未完成的站点
+                    late_tasks.extend(pending)
+                    pending.clear()
+                    break
+                # 下次检查的等待时间，排队中的站点开始时间未知，最多等待1秒
+                wait_seconds = [1.0]
+                if deadline:
+                    wait_seconds.append(deadline - now)
+                if site_timeout:
+                    for future in list(pending):
+                        start_time = start_times.get(all_task[future].get("id"))
+                        if not start_time:
+                            continue
+                        if now - start_time >= site_timeout:
+                            # 超过站点时限，不再等待该站点
+                            late_tasks.append(future)
+                            pending.discard(future)
+                        else:
+                            wait_seconds.append(start_time + site_timeout - now)
+                    if not pending:
+                        break
+                done, _ = wait(pending, timeout=max(min(wait_seconds), 0), return_when=FIRST_COMPLETED)
+                for future in done:
+                    pending.discard(future)
+                    finish_count += 1
+                    logger.info(f"站点搜索进度：{finish_count} / {total_num}")
+                    try:
+                        result = future.result() or []
+                    except Exception as err:
+                        logger.error(f"{all_task[future].get('name')} 搜索出错：{str(err)}")
+                        result = []
+                    yield all_task[future].get("name"), finish_count, total_num, result
+        finally:
+            # 调用方提前结束时不再等待未完成的站点
+            for future in pending:
+                future.cancel()
+            if late_tasks:
+                # 未开始的站点不再搜索；已开始的站点记录为访问失败，后台完成时索引器不再重复记录
+                siteoper = SiteOper()
+                for future in late_tasks:
+                    if future.cancel():
+                        continue
+                    site = all_task[future]
+                    if site["search_token"].setdefault("state", "timeout") == "timeout":
+                        siteoper.fail(StringUtils.get_url_domain(site.get("domain")))
+                logger.warn(f"站点搜索超时，已返回 {finish_count} / {total_num} 个站点的结果，"
+                            f"未完成的站点：{', '.join([all_task[future].get('name') for future in late_tasks])}")
+
     @eventmanager.register(EventType.SiteDeleted)
     def remove_site(self, event: Event):
         """
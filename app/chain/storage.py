@@ -108,11 +108,18 @@ class StorageChain(ChainBase):
         """
         return self.run_module("get_parent_item", fileitem=fileitem)
 
-    def snapshot_storage(self, storage: str, path: Path) -> Optional[Dict[str, float]]:
+    def snapshot_storage(self, storage: str, path: Path, dirs: Optional[Dict[str, dict]] = None,
+                         full: bool = False, hot_seconds: float = 0) -> Optional[Dict[str, float]]:
         """
         快照存储
-        """
-        return self.run_module("snapshot_storage", storage=storage, path=path)
+        :param storage: 存储类型
+        :param path: 快照的根目录
+        :param dirs: 上次快照的目录记录，没有子目录且修改时间未变化的目录直接复用，快照完成后原地更新
+        :param full: 是否忽略目录记录，重新遍历所有目录
+        :param hot_seconds: 最近该时间（秒）内发生过变化的目录总是重新遍历
+        """
+        return self.run_module("snapshot_storage", storage=storage, path=path, dirs=dirs,
+                               full=full, hot_seconds=hot_seconds)
 
     def storage_usage(self, storage: str) -> Optional[schemas.StorageUsage]:
         """
@@ -12,7 +12,7 @@ from app.chain.download import DownloadChain
 from app.chain.media import MediaChain
 from app.chain.search import SearchChain
 from app.chain.tmdb import TmdbChain
-from app.chain.torrents import TorrentsChain
+from app.chain.torrents import TorrentsChain, TorrentsIndex
 from app.core.config import settings, global_vars
 from app.core.context import TorrentInfo, Context, MediaInfo
 from app.core.event import eventmanager, Event, EventManager
@@ -350,12 +350,7 @@ class SubscribeChain(ChainBase, metaclass=Singleton):
                     sites = self.get_sub_sites(subscribe)
 
                     # 优先级过滤规则
-                    if subscribe.best_version:
-                        rule_groups = subscribe.filter_groups \
-                                      or self.systemconfig.get(SystemConfigKey.BestVersionFilterRuleGroups) or []
-                    else:
-                        rule_groups = subscribe.filter_groups \
-                                      or self.systemconfig.get(SystemConfigKey.SubscribeFilterRuleGroups) or []
+                    rule_groups = self.__get_rule_groups(subscribe)
 
                     # 搜索，同时电视剧会过滤掉不需要的剧集
                     contexts = self.searchchain.process(mediainfo=mediainfo,
@@ -564,6 +559,10 @@ class SubscribeChain(ChainBase, metaclass=Singleton):
             logger.debug(f"match lock acquired at {datetime.now()}")
             # 所有订阅
             subscribes = self.subscribeoper.list(self.get_states_for_search('R'))
+            # 缓存种子索引
+            torrents_index = self.torrentschain.get_torrents_index(torrents)
+            # 一次性计算所有订阅候选种子在各规则组组合下的优先级，不同订阅共用
+            verdicts = self.__filter_candidates(subscribes=subscribes, torrents_index=torrents_index)
             # 遍历订阅
             for subscribe in subscribes:
                 if global_vars.is_system_stopped:
@@ -607,157 +606,158 @@ class SubscribeChain(ChainBase, metaclass=Singleton):
                 else:
                     custom_words_list = None
 
-                # 遍历缓存种子
+                # 遍历缓存种子，有自定义识别词时可能重新识别，需要遍历全部种子，否则只遍历索引命中的种子
+                if custom_words_list:
+                    candidates = torrents_index.all()
+                else:
+                    candidates = torrents_index.candidates(mediainfo=mediainfo, season=meta.begin_season)
+                logger.debug(f'开始匹配缓存种子，共 {len(candidates)} 个候选种子...')
+                # 订阅站点范围
+                sub_sites = self.get_sub_sites(subscribe)
                 _match_context = []
-                for domain, contexts in torrents.items():
+                for domain, context in candidates:
                     if global_vars.is_system_stopped:
                         break
                     if domains and domain not in domains:
                         continue
-                    logger.debug(f'开始匹配站点：{domain}，共缓存了 {len(contexts)} 个种子...')
-                    for context in contexts:
-                        # 提取信息
-                        _context = copy.deepcopy(context)
-                        torrent_meta = _context.meta_info
-                        torrent_mediainfo = _context.media_info
-                        torrent_info = _context.torrent_info
-
-                        # 不在订阅站点范围的不处理
-                        sub_sites = self.get_sub_sites(subscribe)
-                        if sub_sites and torrent_info.site not in sub_sites:
-                            logger.debug(f"{torrent_info.site_name} - {torrent_info.title} 不符合订阅站点要求")
-                            continue
+                    # 提取信息，匹配成功后才复制上下文
+                    torrent_meta = context.meta_info
+                    torrent_mediainfo = context.media_info
+                    torrent_info = context.torrent_info
+
+                    # 不在订阅站点范围的不处理
+                    if sub_sites and torrent_info.site not in sub_sites:
+                        logger.debug(f"{torrent_info.site_name} - {torrent_info.title} 不符合订阅站点要求")
+                        continue
 
-                        # 有自定义识别词时，需要判断是否需要重新识别
-                        if custom_words_list:
-                            # 使用org_string，应用一次后理论上不能再次应用
-                            _, apply_words = WordsMatcher().prepare(torrent_meta.org_string,
-                                                                    custom_words=custom_words_list)
-                            if apply_words:
+                    # 有自定义识别词时，需要判断是否需要重新识别
+                    if custom_words_list:
+                        # 使用org_string，应用一次后理论上不能再次应用
+                        _, apply_words = WordsMatcher().prepare(torrent_meta.org_string,
+                                                                custom_words=custom_words_list)
+                        if apply_words:
+                            logger.info(
+                                f'{torrent_info.site_name} - {torrent_info.title} 因订阅存在自定义识别词，重新识别元数据...')
+                            # 重新识别元数据
+                            torrent_meta = MetaInfo(title=torrent_info.title, subtitle=torrent_info.description,
+                                                    custom_words=custom_words_list)
+                            # 更新元数据缓存
+                            context.meta_info = torrent_meta
+                            # 媒体信息需要重新识别
+                            torrent_mediainfo = None
+
+                    # 先判断是否有没识别的种子，否则重新识别
+                    if not torrent_mediainfo \
+                            or (not torrent_mediainfo.tmdb_id and not torrent_mediainfo.douban_id):
+                        # 重新识别媒体信息
+                        torrent_mediainfo = self.recognize_media(meta=torrent_meta,
+                                                                 episode_group=subscribe.episode_group)
+                        if torrent_mediainfo:
+                            # 更新种子缓存
+                            context.media_info = torrent_mediainfo
+                            torrents_index.update(context)
+                        else:
+                            # 通过标题匹配兜底
+                            logger.warn(
+                                f'{torrent_info.site_name} - {torrent_info.title} 重新识别失败，尝试通过标题匹配...')
+                            if self.torrenthelper.match_torrent(mediainfo=mediainfo,
+                                                                torrent_meta=torrent_meta,
+                                                                torrent=torrent_info):
+                                # 匹配成功
                                 logger.info(
-                                    f'{torrent_info.site_name} - {torrent_info.title} 因订阅存在自定义识别词，重新识别元数据...')
-                                # 重新识别元数据
-                                torrent_meta = MetaInfo(title=torrent_info.title, subtitle=torrent_info.description,
-                                                        custom_words=custom_words_list)
-                                # 更新元数据缓存
-                                context.meta_info = torrent_meta
-                                # 媒体信息需要重新识别
-                                torrent_mediainfo = None
-
-                        # 先判断是否有没识别的种子，否则重新识别
-                        if not torrent_mediainfo \
-                                or (not torrent_mediainfo.tmdb_id and not torrent_mediainfo.douban_id):
-                            # 重新识别媒体信息
-                            torrent_mediainfo = self.recognize_media(meta=torrent_meta,
-                                                                     episode_group=subscribe.episode_group)
-                            if torrent_mediainfo:
-                                # 更新种子缓存
+                                    f'{mediainfo.title_year} 通过标题匹配到可选资源：{torrent_info.site_name} - {torrent_info.title}')
+                                torrent_mediainfo = mediainfo
                                 context.media_info = torrent_mediainfo
+                                torrents_index.update(context)
                             else:
-                                # 通过标题匹配兜底
-                                logger.warn(
-                                    f'{torrent_info.site_name} - {torrent_info.title} 重新识别失败，尝试通过标题匹配...')
-                                if self.torrenthelper.match_torrent(mediainfo=mediainfo,
-                                                                    torrent_meta=torrent_meta,
-                                                                    torrent=torrent_info):
-                                    # 匹配成功
-                                    logger.info(
-                                        f'{mediainfo.title_year} 通过标题匹配到可选资源：{torrent_info.site_name} - {torrent_info.title}')
-                                    torrent_mediainfo = mediainfo
-                                    context.media_info = torrent_mediainfo
-                                else:
-                                    continue
-
-                        # 直接比对媒体信息
-                        if torrent_mediainfo and (torrent_mediainfo.tmdb_id or torrent_mediainfo.douban_id):
-                            if torrent_mediainfo.type != mediainfo.type:
-                                continue
-                            if torrent_mediainfo.tmdb_id \
-                                    and torrent_mediainfo.tmdb_id != mediainfo.tmdb_id:
                                 continue
-                            if torrent_mediainfo.douban_id \
-                                    and torrent_mediainfo.douban_id != mediainfo.douban_id:
-                                continue
-                            logger.info(
-                                f'{mediainfo.title_year} 通过媒体信ID匹配到可选资源：{torrent_info.site_name} - {torrent_info.title}')
-                        else:
+
+                    # 直接比对媒体信息
+                    if torrent_mediainfo and (torrent_mediainfo.tmdb_id or torrent_mediainfo.douban_id):
+                        if torrent_mediainfo.type != mediainfo.type:
+                            continue
+                        if torrent_mediainfo.tmdb_id \
+                                and torrent_mediainfo.tmdb_id != mediainfo.tmdb_id:
+                            continue
+                        if torrent_mediainfo.douban_id \
+                                and torrent_mediainfo.douban_id != mediainfo.douban_id:
                             continue
+                        logger.info(
+                            f'{mediainfo.title_year} 通过媒体信ID匹配到可选资源：{torrent_info.site_name} - {torrent_info.title}')
+                    else:
+                        continue
 
-                        # 如果是电视剧
-                        if torrent_mediainfo.type == MediaType.TV:
-                            # 有多季的不要
-                            if len(torrent_meta.season_list) > 1:
-                                logger.debug(f'{torrent_info.title} 有多季，不处理')
-                                continue
-                            # 比对季
-                            if torrent_meta.begin_season:
-                                if meta.begin_season != torrent_meta.begin_season:
-                                    logger.debug(f'{torrent_info.title} 季不匹配')
-                                    continue
-                            elif meta.begin_season != 1:
+                    # 如果是电视剧
+                    if torrent_mediainfo.type == MediaType.TV:
+                        # 有多季的不要
+                        if len(torrent_meta.season_list) > 1:
+                            logger.debug(f'{torrent_info.title} 有多季，不处理')
+                            continue
+                        # 比对季
+                        if torrent_meta.begin_season:
+                            if meta.begin_season != torrent_meta.begin_season:
                                 logger.debug(f'{torrent_info.title} 季不匹配')
                                 continue
-                            # 非洗版
-                            if not subscribe.best_version:
-                                # 不是缺失的剧集不要
-                                if no_exists and no_exists.get(mediakey):
-                                    # 缺失集
-                                    no_exists_info = no_exists.get(mediakey).get(subscribe.season)
-                                    if no_exists_info:
-                                        # 是否有交集
-                                        if no_exists_info.episodes and \
-                                                torrent_meta.episode_list and \
-                                                not set(no_exists_info.episodes).intersection(
-                                                    set(torrent_meta.episode_list)
-                                                ):
-                                            logger.debug(
-                                                f'{torrent_info.title} 对应剧集 {torrent_meta.episode_list} 未包含缺失的剧集'
-                                            )
-                                            continue
-                            else:
-                                # 洗版时，非整季不要
-                                if meta.type == MediaType.TV:
-                                    if torrent_meta.episode_list:
-                                        logger.debug(f'{subscribe.name} 正在洗版，{torrent_info.title} 不是整季')
+                        elif meta.begin_season != 1:
+                            logger.debug(f'{torrent_info.title} 季不匹配')
+                            continue
+                        # 非洗版
+                        if not subscribe.best_version:
+                            # 不是缺失的剧集不要
+                            if no_exists and no_exists.get(mediakey):
+                                # 缺失集
+                                no_exists_info = no_exists.get(mediakey).get(subscribe.season)
+                                if no_exists_info:
+                                    # 是否有交集
+                                    if no_exists_info.episodes and \
+                                            torrent_meta.episode_list and \
+                                            not set(no_exists_info.episodes).intersection(
+                                                set(torrent_meta.episode_list)
+                                            ):
+                                        logger.debug(
+                                            f'{torrent_info.title} 对应剧集 {torrent_meta.episode_list} 未包含缺失的剧集'
+                                        )
                                         continue
+                        else:
+                            # 洗版时，非整季不要
+                            if meta.type == MediaType.TV:
+                                if torrent_meta.episode_list:
+                                    logger.debug(f'{subscribe.name} 正在洗版，{torrent_info.title} 不是整季')
+                                    continue
 
-                        # 匹配订阅附加参数
-                        if not self.torrenthelper.filter_torrent(torrent_info=torrent_info,
-                                                                 filter_params=self.get_params(subscribe)):
-                            continue
+                    # 匹配订阅附加参数
+                    if not self.torrenthelper.filter_torrent(torrent_info=torrent_info,
+                                                             filter_params=self.get_params(subscribe)):
+                        continue
 
-                        # 优先级过滤规则
-                        if subscribe.best_version:
-                            rule_groups = subscribe.filter_groups \
-                                          or self.systemconfig.get(SystemConfigKey.BestVersionFilterRuleGroups)
-                        else:
-                            rule_groups = subscribe.filter_groups \
-                                          or self.systemconfig.get(SystemConfigKey.SubscribeFilterRuleGroups)
-                        result: List[TorrentInfo] = self.filter_torrents(
-                            rule_groups=rule_groups,
-                            torrent_list=[torrent_info],
-                            mediainfo=torrent_mediainfo)
-                        if result is not None and not result:
-                            # 不符合过滤规则
-                            logger.debug(f"{torrent_info.title} 不匹配过滤规则")
-                            continue
+                    # 优先级过滤规则
+                    pri_order = self.__get_pri_order(verdicts=verdicts,
+                                                     rule_groups=self.__get_rule_groups(subscribe),
+                                                     torrent_info=torrent_info,
+                                                     torrent_mediainfo=torrent_mediainfo)
+                    if pri_order is None:
+                        # 不符合过滤规则
+                        logger.debug(f"{torrent_info.title} 不匹配过滤规则")
+                        continue
 
-                        # 洗版时，优先级小于已下载优先级的不要
-                        if subscribe.best_version:
-                            if subscribe.current_priority \
-                                    and torrent_info.pri_order <= subscribe.current_priority:
-                                logger.info(
-                                    f'{subscribe.name} 正在洗版，{torrent_info.title} 优先级低于或等于已下载优先级')
-                                continue
+                    # 洗版时，优先级小于已下载优先级的不要
+                    if subscribe.best_version:
+                        if subscribe.current_priority \
+                                and pri_order <= subscribe.current_priority:
+                            logger.info(
+                                f'{subscribe.name} 正在洗版，{torrent_info.title} 优先级低于或等于已下载优先级')
+                            continue
 
-                        # 匹配成功
-                        logger.info(f'{mediainfo.title_year} 匹配成功：{torrent_info.title}')
-                        # 自定义属性
-                        if subscribe.media_category:
-                            torrent_mediainfo.category = subscribe.media_category
-                        if subscribe.episode_group:
-                            torrent_mediainfo.episode_group = subscribe.episode_group
-                        _match_context.append(_context)
+                    # 匹配成功
+                    logger.info(f'{mediainfo.title_year} 匹配成功：{torrent_info.title}')
+                    _context = copy.deepcopy(context)
+                    _context.torrent_info.pri_order = pri_order
+                    # 自定义属性
+                    if subscribe.media_category:
+                        _context.media_info.category = subscribe.media_category
+                    if subscribe.episode_group:
+                        _context.media_info.episode_group = subscribe.episode_group
+                    _match_context.append(_context)
 
                 if not _match_context:
                     # 未匹配到资源
@@ -786,6 +786,88 @@ class SubscribeChain(ChainBase, metaclass=Singleton):
                                                  downloads=downloads, lefts=lefts)
             logger.debug(f"match Lock released at {datetime.now()}")
 
+    def __get_rule_groups(self, subscribe: Subscribe) -> List[str]:
+        """
+        获取订阅的优先级过滤规则组
+        """
+        if subscribe.best_version:
+            return subscribe.filter_groups \
+                or self.systemconfig.get(SystemConfigKey.BestVersionFilterRuleGroups) or []
+        return subscribe.filter_groups \
+            or self.systemconfig.get(SystemConfigKey.SubscribeFilterRuleGroups) or []
+
+    @staticmethod
+    def __get_media_signature(mediainfo: Optional[MediaInfo]) -> Optional[tuple]:
+        """
+        获取影响过滤结果的媒体信息特征，用于判断缓存的过滤结果是否仍然有效
+        """
+        if not mediainfo:
+            return None
+        return mediainfo.tmdb_id, mediainfo.douban_id, mediainfo.type, mediainfo.category
+
+    def __filter_candidates(self, subscribes: List[Subscribe],
+                            torrents_index: TorrentsIndex) -> Dict[Tuple[int, tuple], Tuple[tuple, Optional[int]]]:
+        """
+        按订阅的媒体ID和季汇总候选种子，批量计算候选种子在所有订阅规则组组合下的优先级，自定义规则和规则组只解析一次
+        有自定义识别词的订阅匹配时可能重新识别，不参与预先计算
+        :return: (种子ID, 规则组组合) -> (媒体信息特征, 优先级)，优先级为None表示不符合过滤规则
+        """
+        rule_groups_list = []
+        contexts: Dict[int, Context] = {}
+        for subscribe in subscribes:
+            groups_key = tuple(self.__get_rule_groups(subscribe))
+            if groups_key not in rule_groups_list:
+                rule_groups_list.append(groups_key)
+            if subscribe.custom_words or not (subscribe.tmdbid or subscribe.doubanid):
+                continue
+            try:
+                mtype = MediaType(subscribe.type)
+            except ValueError:
+                continue
+            mediainfo = MediaInfo()
+            mediainfo.type = mtype
+            mediainfo.tmdb_id = subscribe.tmdbid
+            mediainfo.douban_id = subscribe.doubanid
+            for _, context in torrents_index.candidates(mediainfo=mediainfo, season=subscribe.season or None):
+                contexts[id(context.torrent_info)] = context
+        if not contexts or not rule_groups_list:
+            return {}
+        contexts_list = list(contexts.values())
+        matrix = self.filter_torrents_batch(rule_groups_list=[list(groups) for groups in rule_groups_list],
+                                            torrent_list=[context.torrent_info for context in contexts_list],
+                                            mediainfos=[context.media_info for context in contexts_list])
+        if not matrix:
+            return {}
+        verdicts = {}
+        for groups_key, orders in matrix.items():
+            for context, order in zip(contexts_list, orders):
+                verdicts[(id(context.torrent_info), groups_key)] = (self.__get_media_signature(context.media_info),
+                                                                    order)
+        return verdicts
+
+    def __get_pri_order(self, verdicts: Dict[Tuple[int, tuple], Tuple[tuple, Optional[int]]],
+                        rule_groups: List[str], torrent_info: TorrentInfo,
+                        torrent_mediainfo: Optional[MediaInfo]) -> Optional[int]:
+        """
+        获取种子在规则组组合下的优先级，优先使用批量计算的结果，未计算或媒体信息已变化时单独计算并缓存，不修改种子本身
+        :param verdicts: 计算结果缓存，(种子ID, 规则组组合) -> (媒体信息特征, 优先级)
+        :param rule_groups: 规则组组合
+        :param torrent_info: 种子信息
+        :param torrent_mediainfo: 种子的媒体信息
+        :return: 优先级，None表示不符合过滤规则
+        """
+        groups_key = tuple(rule_groups)
+        signature = self.__get_media_signature(torrent_mediainfo)
+        verdict = verdicts.get((id(torrent_info), groups_key))
+        if verdict and verdict[0] == signature:
+            return verdict[1]
+        orders = self.filter_torrents_batch(rule_groups_list=[rule_groups],
+                                            torrent_list=[torrent_info],
+                                            mediainfos=[torrent_mediainfo])
+        pri_order = orders[groups_key][0] if orders else torrent_info.pri_order
+        verdicts[(id(torrent_info), groups_key)] = (signature, pri_order)
+        return pri_order
+
     def check(self):
         """
         定时检查订阅，更新订阅信息
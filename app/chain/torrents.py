@@ -1,6 +1,10 @@
+import copy
 import re
+import threading
+import time
 import traceback
-from typing import Dict, List, Union, Optional
+from concurrent.futures import Future, ThreadPoolExecutor, wait, FIRST_COMPLETED
+from typing import Any, Dict, List, Union, Optional, Set, Tuple
 
 from cachetools import cached, TTLCache
 
@@ -14,6 +18,7 @@ from app.db.systemconfig_oper import SystemConfigOper
 from app.helper.rss import RssHelper
 from app.helper.sites import SitesHelper
 from app.helper.torrent import TorrentHelper
+from app.helper.torrentstore import TorrentsCacheStore
 from app.log import logger
 from app.schemas import Notification
 from app.schemas.types import SystemConfigKey, MessageChannel, NotificationType, MediaType
@@ -21,6 +26,159 @@ from app.utils.singleton import Singleton
 from app.utils.string import StringUtils
 
 
+class TorrentsIndex:
+    """
+    缓存种子的倒排索引，按媒体ID和季查找种子上下文，未识别媒体信息的种子单独存放
+    """
+
+    def __init__(self, torrents: Dict[str, List[Context]]):
+        # 建立索引的缓存种子
+        self.torrents = torrents
+        # (媒体类型, TMDBID, 季) -> [(序号, 站点域名, 上下文)]
+        self._tmdb_index: Dict[tuple, List[Tuple[int, str, Context]]] = {}
+        # (媒体类型, 豆瓣ID, 季) -> [(序号, 站点域名, 上下文)]
+        self._douban_index: Dict[tuple, List[Tuple[int, str, Context]]] = {}
+        # 未识别媒体信息的种子
+        self._unrecognized: List[Tuple[int, str, Context]] = []
+        # 上下文ID -> (序号, 站点域名)，序号用于保持缓存中的原始顺序
+        self._positions: Dict[int, Tuple[int, str]] = {}
+        for domain, contexts in torrents.items():
+            for context in contexts:
+                self._positions[id(context)] = (len(self._positions), domain)
+                self.__add(context)
+
+    @staticmethod
+    def __get_season(context: Context) -> Optional[Union[int, str]]:
+        """
+        获取种子的索引季号，电视剧未识别季时按第1季处理，多季的种子不参与订阅匹配
+        """
+        if context.media_info.type != MediaType.TV:
+            return None
+        if len(context.meta_info.season_list) > 1:
+            return "multi"
+        return context.meta_info.begin_season or 1
+
+    def __add(self, context: Context):
+        """
+        按上下文当前的媒体信息加入索引
+        """
+        position, domain = self._positions[id(context)]
+        entry = (position, domain, context)
+        mediainfo = context.media_info
+        if not mediainfo or (not mediainfo.tmdb_id and not mediainfo.douban_id):
+            self._unrecognized.append(entry)
+            return
+        season = self.__get_season(context)
+        if mediainfo.tmdb_id:
+            self._tmdb_index.setdefault((mediainfo.type, mediainfo.tmdb_id, season), []).append(entry)
+        if mediainfo.douban_id:
+            self._douban_index.setdefault((mediainfo.type, mediainfo.douban_id, season), []).append(entry)
+
+    def update(self, context: Context):
+        """
+        上下文的元数据或媒体信息变化后重新加入索引，旧索引项由调用方比对媒体信息时排除
+        """
+        if id(context) in self._positions:
+            self.__add(context)
+
+    def all(self) -> List[Tuple[str, Context]]:
+        """
+        按缓存顺序返回所有种子
+        """
+        return [(domain, context) for domain, contexts in self.torrents.items() for context in contexts]
+
+    def candidates(self, mediainfo: MediaInfo, season: Optional[int] = None) -> List[Tuple[str, Context]]:
+        """
+        按缓存顺序返回可能匹配媒体信息的种子：媒体ID及季命中的种子和未识别媒体信息的种子
+        """
+        season = season if mediainfo.type == MediaType.TV else None
+        entries = {}
+        if mediainfo.tmdb_id:
+            for entry in self._tmdb_index.get((mediainfo.type, mediainfo.tmdb_id, season)) or []:
+                entries[entry[0]] = entry
+        if mediainfo.douban_id:
+            for entry in self._douban_index.get((mediainfo.type, mediainfo.douban_id, season)) or []:
+                entries[entry[0]] = entry
+        for entry in self._unrecognized:
+            entries[entry[0]] = entry
+        return [(entries[position][1], entries[position][2]) for position in sorted(entries)]
+
+
+class TorrentsFingerprints:
+    """
+    缓存种子的指纹，按站点维护 标题+描述 和下载链接的计数，随缓存种子的加入和移除同步更新，
+    用于常数时间判断种子是否已处理以及定位无效种子
+    """
+
+    def __init__(self, torrents: Dict[str, List[Context]]):
+        # 站点域名 -> (标题, 描述) -> 数量
+        self._keys: Dict[str, Dict[Tuple[str, str], int]] = {}
+        # 站点域名 -> 下载链接 -> 数量
+        self._enclosures: Dict[str, Dict[str, int]] = {}
+        for domain, contexts in torrents.items():
+            for context in contexts:
+                self.add(domain, context)
+
+    @staticmethod
+    def key(torrent: TorrentInfo) -> Tuple[str, str]:
+        """
+        种子去重指纹
+        """
+        return torrent.title, torrent.description
+
+    @staticmethod
+    def __increase(counter: Dict, key: Any):
+        counter[key] = counter.get(key, 0) + 1
+
+    @staticmethod
+    def __decrease(counter: Dict, key: Any):
+        count = counter.get(key, 0) - 1
+        if count > 0:
+            counter[key] = count
+        else:
+            counter.pop(key, None)
+
+    def contains(self, domain: str, torrent: TorrentInfo) -> bool:
+        """
+        站点缓存中是否已有相同标题和描述的种子
+        """
+        return self.key(torrent) in self._keys.get(domain, {})
+
+    def add(self, domain: str, context: Context):
+        """
+        种子加入缓存时记录指纹
+        """
+        self.__increase(self._keys.setdefault(domain, {}), self.key(context.torrent_info))
+        if context.torrent_info.enclosure:
+            self.__increase(self._enclosures.setdefault(domain, {}), context.torrent_info.enclosure)
+
+    def remove(self, domain: str, context: Context):
+        """
+        种子移出缓存时删除指纹
+        """
+        self.__decrease(self._keys.get(domain, {}), self.key(context.torrent_info))
+        if context.torrent_info.enclosure:
+            self.__decrease(self._enclosures.get(domain, {}), context.torrent_info.enclosure)
+
+    def invalid(self, invalid_urls: Set[str]) -> Dict[str, Set[str]]:
+        """
+        查找缓存中的无效种子
+        :param invalid_urls: 无效种子的下载链接
+        :return: 站点域名 -> 缓存中无效的下载链接
+        """
+        if not invalid_urls:
+            return {}
+        result = {}
+        for domain, enclosures in self._enclosures.items():
+            if len(invalid_urls) < len(enclosures):
+                urls = {url for url in invalid_urls if url in enclosures}
+            else:
+                urls = {url for url in enclosures if url in invalid_urls}
+            if urls:
+                result[domain] = urls
+        return result
+
+
 class TorrentsChain(ChainBase, metaclass=Singleton):
     """
     站点首页或RSS种子处理链，服务于订阅、刷流等
@@ -31,6 +189,15 @@ class TorrentsChain(ChainBase, metaclass=Singleton):
 
     def __init__(self):
         super().__init__()
+        # 最近一次刷新结果的索引
+        self._torrents_index: Optional[TorrentsIndex] = None
+        # 缓存类型 -> 种子缓存存储
+        self._stores: Dict[str, TorrentsCacheStore] = {}
+        self._stores_lock = threading.Lock()
+        # 缓存类型 -> (缓存写入版本, 指纹覆盖的站点域名（None为全部站点）, 缓存种子指纹)，缓存未被其它途径修改时跨刷新复用
+        self._fingerprints: Dict[str, Tuple[int, Optional[frozenset], TorrentsFingerprints]] = {}
+        # 缓存类型 -> (缓存写入版本, 已加载的站点域名（None为全部站点）, 已加载的缓存种子)，缓存未修改时不重复读取
+        self._loaded: Dict[str, Tuple[int, Optional[frozenset], Dict[str, List[Context]]]] = {}
         self.siteshelper = SitesHelper()
         self.siteoper = SiteOper()
         self.rsshelper = RssHelper()
@@ -48,31 +215,80 @@ class TorrentsChain(ChainBase, metaclass=Singleton):
         self.post_message(Notification(channel=channel,
                                        title=f"种子刷新完成！", userid=userid))
 
-    def get_torrents(self, stype: Optional[str] = None) -> Dict[str, List[Context]]:
+    def __get_store(self, stype: str) -> TorrentsCacheStore:
+        """
+        获取种子缓存存储，首次打开时导入旧版本的缓存文件
+        :param stype: 缓存类型，spider:爬虫缓存，rss:rss缓存
+        """
+        store = self._stores.get(stype)
+        if store:
+            return store
+        with self._stores_lock:
+            store = self._stores.get(stype)
+            if store:
+                return store
+            cache_file = self._spider_file if stype == "spider" else self._rss_file
+            store = TorrentsCacheStore(settings.TEMP_PATH / f"{cache_file}.db")
+            # 旧版本的缓存文件
+            legacy_cache: Dict[str, List[Context]] = self.load_cache(cache_file)
+            if legacy_cache:
+                logger.info(f"导入旧版本种子缓存 {cache_file} ...")
+                for domain, contexts in legacy_cache.items():
+                    store.append(domain, contexts)
+            self.remove_cache(cache_file)
+            self._stores[stype] = store
+            return store
+
+    def get_torrents(self, stype: Optional[str] = None, domains: List[str] = None) -> Dict[str, List[Context]]:
         """
         获取当前缓存的种子
         :param stype: 强制指定缓存类型，spider:爬虫缓存，rss:rss缓存
+        :param domains: 只获取指定站点域名的种子，为空时获取全部
         """
 
         if not stype:
             stype = settings.SUBSCRIBE_MODE
 
-        # 读取缓存
-        if stype == 'spider':
-            return self.load_cache(self._spider_file) or {}
-        else:
-            return self.load_cache(self._rss_file) or {}
+        store = self.__get_store(stype)
+        # 先取版本再读取，读取期间缓存被修改时下次重新读取
+        version = store.version
+        domains = frozenset(domains) if domains is not None else None
+        loaded_version, covered, torrents = self._loaded.get(stype) or (None, None, None)
+        if torrents is None or loaded_version != version \
+                or (covered is not None and (domains is None or not domains <= covered)):
+            # 读取缓存
+            torrents = store.load(domains)
+            self._loaded[stype] = (version, domains, torrents)
+        # 返回副本，调用方修改种子上下文不影响已加载的缓存
+        return {
+            domain: [Context(meta_info=copy.copy(context.meta_info),
+                             media_info=copy.copy(context.media_info),
+                             torrent_info=copy.copy(context.torrent_info)) for context in contexts]
+            for domain, contexts in torrents.items() if domains is None or domain in domains
+        }
+
+    def get_torrents_index(self, torrents: Dict[str, List[Context]]) -> TorrentsIndex:
+        """
+        获取缓存种子的索引，优先使用刷新时建立的索引
+        :param torrents: 缓存种子
+        """
+        torrents_index = self._torrents_index
+        if torrents_index and torrents_index.torrents is torrents:
+            return torrents_index
+        return TorrentsIndex(torrents)
 
     def clear_torrents(self):
         """
         清理种子缓存数据
         """
         logger.info(f'开始清理种子缓存数据 ...')
-        self.remove_cache(self._spider_file)
-        self.remove_cache(self._rss_file)
+        for stype in ("spider", "rss"):
+            self.__get_store(stype).clear()
+        self._fingerprints.clear()
+        self._loaded.clear()
         logger.info(f'种子缓存数据清理完成')
 
-    @cached(cache=TTLCache(maxsize=128, ttl=595))
+    @cached(cache=TTLCache(maxsize=128, ttl=595), lock=threading.Lock())
     def browse(self, domain: str, keyword: Optional[str] = None, cat: Optional[str] = None,
                page: Optional[int] = 0) -> List[TorrentInfo]:
         """
@@ -89,7 +305,7 @@ class TorrentsChain(ChainBase, metaclass=Singleton):
             return []
         return self.refresh_torrents(site=site, keyword=keyword, cat=cat, page=page)
 
-    @cached(cache=TTLCache(maxsize=128, ttl=295))
+    @cached(cache=TTLCache(maxsize=128, ttl=295), lock=threading.Lock())
     def rss(self, domain: str) -> List[TorrentInfo]:
         """
         获取站点RSS内容，返回种子清单，TTL缓存5分钟
@@ -149,94 +365,208 @@ class TorrentsChain(ChainBase, metaclass=Singleton):
         if not sites:
             sites = self.systemconfig.get(SystemConfigKey.RssSites) or []
 
-        # 读取缓存
-        torrents_cache = self.get_torrents()
+        # 需要刷新的站点
+        indexers = [indexer for indexer in self.siteshelper.get_indexers()
+                    if not sites or indexer.get("id") in sites]
+        # 需要刷新的站点domain
+        domains = [StringUtils.get_url_domain(indexer.get("domain")) for indexer in indexers]
 
-        # 缓存过滤掉无效种子
-        for _domain, _torrents in torrents_cache.items():
-            torrents_cache[_domain] = [_torrent for _torrent in _torrents
-                                       if not self.torrenthelper.is_invalid(_torrent.torrent_info.enclosure)]
+        # 读取缓存，指定站点时只读取这些站点的缓存
+        store = self.__get_store(stype)
+        torrents_cache = self.get_torrents(stype, domains=domains if sites else None)
+        fingerprints, covered = self.__get_fingerprints(stype=stype, torrents_cache=torrents_cache,
+                                                        domains=frozenset(domains) if sites else None)
 
-        # 所有站点索引
-        indexers = self.siteshelper.get_indexers()
-        # 需要刷新的站点domain
-        domains = []
-        # 遍历站点缓存资源
-        for indexer in indexers:
-            if global_vars.is_system_stopped:
-                break
-            # 未开启的站点不刷新
-            if sites and indexer.get("id") not in sites:
+        # 缓存过滤掉无效种子
+        for _domain, _enclosures in fingerprints.invalid(self.torrenthelper.get_invalid_torrents()).items():
+            if _domain not in torrents_cache:
                 continue
-            domain = StringUtils.get_url_domain(indexer.get("domain"))
-            domains.append(domain)
-            if stype == "spider":
-                # 刷新首页种子
-                torrents: List[TorrentInfo] = self.browse(domain=domain)
-            else:
-                # 刷新RSS种子
-                torrents: List[TorrentInfo] = self.rss(domain=domain)
-            # 按pubdate降序排列
-            torrents.sort(key=lambda x: x.pubdate or '', reverse=True)
-            # 取前N条
-            torrents = torrents[:settings.CACHE_CONF["refresh"]]
-            if torrents:
-                # 过滤出没有处理过的种子
-                torrents = [torrent for torrent in torrents
-                            if f'{torrent.title}{torrent.description}'
-                            not in [f'{t.torrent_info.title}{t.torrent_info.description}'
-                                    for t in torrents_cache.get(domain) or []]]
-                if torrents:
-                    logger.info(f'{indexer.get("name")} 有 {len(torrents)} 个新种子')
+            _torrents = []
+            for _torrent in torrents_cache.get(_domain) or []:
+                if _torrent.torrent_info.enclosure in _enclosures:
+                    fingerprints.remove(_domain, _torrent)
                 else:
-                    logger.info(f'{indexer.get("name")} 没有新种子')
-                    continue
-                for torrent in torrents:
-                    if global_vars.is_system_stopped:
-                        break
-                    logger.info(f'处理资源：{torrent.title} ...')
-                    # 识别
-                    meta = MetaInfo(title=torrent.title, subtitle=torrent.description)
-                    if torrent.title != meta.org_string:
-                        logger.info(f'种子名称应用识别词后发生改变：{torrent.title} => {meta.org_string}')
-                    # 使用站点种子分类，校正类型识别
-                    if meta.type != MediaType.TV \
-                            and torrent.category == MediaType.TV.value:
-                        meta.type = MediaType.TV
-                    # 识别媒体信息
-                    mediainfo: MediaInfo = self.mediachain.recognize_by_meta(meta)
-                    if not mediainfo:
-                        logger.warn(f'{torrent.title} 未识别到媒体信息')
-                        # 存储空的媒体信息
-                        mediainfo = MediaInfo()
-                    # 清理多余数据
-                    mediainfo.clear()
-                    # 上下文
-                    context = Context(meta_info=meta, media_info=mediainfo, torrent_info=torrent)
-                    # 添加到缓存
-                    if not torrents_cache.get(domain):
-                        torrents_cache[domain] = [context]
-                    else:
-                        torrents_cache[domain].append(context)
-                    # 如果超过了限制条数则移除掉前面的
-                    if len(torrents_cache[domain]) > settings.CACHE_CONF["torrents"]:
-                        torrents_cache[domain] = torrents_cache[domain][-settings.CACHE_CONF["torrents"]:]
-                # 回收资源
-                del torrents
-            else:
-                logger.info(f'{indexer.get("name")} 没有获取到种子')
+                    _torrents.append(_torrent)
+            torrents_cache[_domain] = _torrents
+            store.delete_enclosures(_domain, _enclosures)
 
-        # 保存缓存到本地
-        if stype == "spider":
-            self.save_cache(torrents_cache, self._spider_file)
+        if not indexers:
+            logger.info('没有需要刷新的站点')
         else:
-            self.save_cache(torrents_cache, self._rss_file)
+            self.__refresh_sites(stype=stype, indexers=indexers, torrents_cache=torrents_cache,
+                                 fingerprints=fingerprints, store=store)
+
+        # 清理不再引用的媒体信息
+        store.prune()
+        self._fingerprints[stype] = (store.version, covered, fingerprints)
 
         # 去除不在站点范围内的缓存种子
         if sites and torrents_cache:
             torrents_cache = {k: v for k, v in torrents_cache.items() if k in domains}
+        # 建立索引
+        self._torrents_index = TorrentsIndex(torrents_cache)
         return torrents_cache
 
+    def __get_fingerprints(self, stype: str, torrents_cache: Dict[str, List[Context]],
+                           domains: Optional[frozenset] = None) -> Tuple[TorrentsFingerprints, Optional[frozenset]]:
+        """
+        获取缓存种子指纹，缓存与上次保存指纹时一致且指纹覆盖所需站点则直接复用，否则按缓存重建
+        :param stype: 缓存类型
+        :param torrents_cache: 缓存种子
+        :param domains: 缓存种子包含的站点域名，None为全部站点
+        :return: 缓存种子指纹, 指纹覆盖的站点域名
+        """
+        version, covered, fingerprints = self._fingerprints.pop(stype, None) or (None, None, None)
+        if fingerprints and version == self.__get_store(stype).version \
+                and (covered is None or (domains is not None and domains <= covered)):
+            return fingerprints, covered
+        return TorrentsFingerprints(torrents_cache), domains
+
+    def __refresh_sites(self, stype: str, indexers: List[dict], torrents_cache: Dict[str, List[Context]],
+                        fingerprints: TorrentsFingerprints, store: TorrentsCacheStore):
+        """
+        流水线刷新站点资源：并发获取各站点种子，新种子交由独立的识别线程池识别，每个站点识别完成后合并到缓存
+        :param stype: 缓存类型，spider:爬虫缓存，rss:rss缓存
+        :param indexers: 需要刷新的站点
+        :param torrents_cache: 种子缓存，按站点合并结果
+        :param fingerprints: 缓存种子指纹，随缓存同步更新
+        :param store: 种子缓存存储，新种子追加写入，超出限制的旧种子删除
+        """
+
+        def __fetch(_domain: str) -> Tuple[List[TorrentInfo], float]:
+            """
+            获取站点种子，返回种子及耗时
+            """
+            _start = time.monotonic()
+            if stype == "spider":
+                # 刷新首页种子
+                _torrents: List[TorrentInfo] = self.browse(domain=_domain)
+            else:
+                # 刷新RSS种子
+                _torrents: List[TorrentInfo] = self.rss(domain=_domain)
+            return _torrents, time.monotonic() - _start
+
+        def __recognize(_torrent: TorrentInfo) -> Context:
+            """
+            识别种子媒体信息
+            """
+            logger.info(f'处理资源：{_torrent.title} ...')
+            # 识别
+            meta = MetaInfo(title=_torrent.title, subtitle=_torrent.description)
+            if _torrent.title != meta.org_string:
+                logger.info(f'种子名称应用识别词后发生改变：{_torrent.title} => {meta.org_string}')
+            # 使用站点种子分类，校正类型识别
+            if meta.type != MediaType.TV \
+                    and _torrent.category == MediaType.TV.value:
+                meta.type = MediaType.TV
+            # 识别媒体信息
+            mediainfo: MediaInfo = self.mediachain.recognize_by_meta(meta)
+            if not mediainfo:
+                logger.warn(f'{_torrent.title} 未识别到媒体信息')
+                # 存储空的媒体信息
+                mediainfo = MediaInfo()
+            # 清理多余数据
+            mediainfo.clear()
+            # 上下文
+            return Context(meta_info=meta, media_info=mediainfo, torrent_info=_torrent)
+
+        def __merge(_domain: str, _contexts: List[Context]):
+            """
+            合并站点识别结果到缓存，超过限制条数则移除掉前面的
+            """
+            _contexts = [_context for _context in _contexts if _context]
+            if not _contexts:
+                return
+            for _context in _contexts:
+                fingerprints.add(_domain, _context)
+            torrents_cache[_domain] = (torrents_cache.get(_domain) or []) + _contexts
+            store.append(_domain, _contexts)
+            _overflow = len(torrents_cache[_domain]) - settings.CACHE_CONF["torrents"]
+            if _overflow > 0:
+                for _context in torrents_cache[_domain][:_overflow]:
+                    fingerprints.remove(_domain, _context)
+                torrents_cache[_domain] = torrents_cache[_domain][_overflow:]
+                store.trim(_domain, _overflow)
+
+        start_time = time.monotonic()
+        # 各阶段累计耗时
+        fetch_seconds, recognize_count = 0.0, 0
+        # 站点识别状态：domain -> {name, contexts, pending, start}
+        site_states: Dict[str, dict] = {}
+        # 未完成的任务：future -> (阶段, domain, 序号)
+        tasks: Dict[Future, Tuple[str, str, int]] = {}
+        fetch_executor = ThreadPoolExecutor(max_workers=min(len(indexers), max(settings.SUBSCRIBE_REFRESH_WORKERS, 1)),
+                                            thread_name_prefix="torrents-fetch")
+        recognize_executor = ThreadPoolExecutor(max_workers=max(settings.SUBSCRIBE_RECOGNIZE_WORKERS, 1),
+                                                thread_name_prefix="torrents-recognize")
+        try:
+            for indexer in indexers:
+                domain = StringUtils.get_url_domain(indexer.get("domain"))
+                site_states[domain] = {"name": indexer.get("name")}
+                tasks[fetch_executor.submit(__fetch, domain)] = ("fetch", domain, 0)
+            while tasks and not global_vars.is_system_stopped:
+                done, _ = wait(tasks, return_when=FIRST_COMPLETED)
+                for future in done:
+                    stage, domain, index = tasks.pop(future)
+                    state = site_states[domain]
+                    if stage == "fetch":
+                        try:
+                            torrents, seconds = future.result()
+                        except Exception as err:
+                            logger.error(f'{state["name"]} 获取种子出错：{str(err)} - {traceback.format_exc()}')
+                            continue
+                        fetch_seconds = max(fetch_seconds, time.monotonic() - start_time)
+                        if not torrents:
+                            logger.info(f'{state["name"]} 没有获取到种子，耗时 {seconds:.2f} 秒')
+                            continue
+                        # 按pubdate降序排列
+                        torrents.sort(key=lambda x: x.pubdate or '', reverse=True)
+                        # 取前N条
+                        torrents = torrents[:settings.CACHE_CONF["refresh"]]
+                        # 过滤出没有处理过的种子，同批次中重复的种子只处理一次
+                        new_keys = set()
+                        new_torrents = []
+                        for torrent in torrents:
+                            key = fingerprints.key(torrent)
+                            if key in new_keys or fingerprints.contains(domain, torrent):
+                                continue
+                            new_keys.add(key)
+                            new_torrents.append(torrent)
+                        torrents = new_torrents
+                        if not torrents:
+                            logger.info(f'{state["name"]} 没有新种子，获取耗时 {seconds:.2f} 秒')
+                            continue
+                        logger.info(f'{state["name"]} 有 {len(torrents)} 个新种子，获取耗时 {seconds:.2f} 秒')
+                        # 进入识别阶段
+                        state.update({
+                            "contexts": [None] * len(torrents),
+                            "pending": len(torrents),
+                            "start": time.monotonic()
+                        })
+                        for i, torrent in enumerate(torrents):
+                            tasks[recognize_executor.submit(__recognize, torrent)] = ("recognize", domain, i)
+                    else:
+                        try:
+                            state["contexts"][index] = future.result()
+                        except Exception as err:
+                            logger.error(f'{state["name"]} 识别种子出错：{str(err)} - {traceback.format_exc()}')
+                        state["pending"] -= 1
+                        if state["pending"]:
+                            continue
+                        # 站点识别完成，合并到缓存
+                        __merge(domain, state["contexts"])
+                        recognize_count += len([context for context in state["contexts"] if context])
+                        logger.info(f'{state["name"]} 识别 {len(state["contexts"])} 个新种子，'
+                                    f'耗时 {time.monotonic() - state["start"]:.2f} 秒')
+        finally:
+            # 系统停止时不再处理排队中的任务
+            for future in tasks:
+                future.cancel()
+            fetch_executor.shutdown(wait=False)
+            recognize_executor.shutdown(wait=False)
+        logger.info(f'站点资源刷新完成，共 {len(indexers)} 个站点，获取阶段耗时 {fetch_seconds:.2f} 秒，'
+                    f'识别 {recognize_count} 个新种子，总耗时 {time.monotonic() - start_time:.2f} 秒')
+
     def __renew_rss_url(self, domain: str, site: dict):
         """
         保留原配置生成新的rss地址
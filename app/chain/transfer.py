@@ -5,8 +5,7 @@ import traceback
 from copy import deepcopy
 from pathlib import Path
 from queue import Queue
-from time import sleep
-from typing import List, Optional, Tuple, Union, Dict, Callable
+from typing import List, Optional, Tuple, Union, Dict, Callable, Set
 
 from app import schemas
 from app.chain import ChainBase
@@ -350,6 +349,73 @@ class JobManager:
             return self._season_episodes.get(__mediaid__) or []
 
 
+class StorageLimiter:
+    """
+    存储并发控制，按存储限制同时进行的整理任务数，等待中的同步整理任务优先于队列任务获得名额
+    """
+
+    def __init__(self):
+        # 各存储正在进行的整理任务数
+        self._running: Dict[str, int] = {}
+        # 各存储等待名额的同步整理任务数
+        self._waiting: Dict[str, int] = {}
+        self._condition = threading.Condition()
+
+    @staticmethod
+    def get_limit(storage: str) -> int:
+        """
+        获取存储的并发上限
+        """
+        limit = settings.TRANSFER_STORAGE_LIMITS.get(storage)
+        if limit is None:
+            limit = settings.TRANSFER_THREADS if storage == "local" else 1
+        return max(int(limit), 1)
+
+    def is_available(self, storages: Set[str], priority: bool = False) -> bool:
+        """
+        检查存储是否都有空闲名额
+        :param storages: 存储类型
+        :param priority: 是否为同步整理任务，否则有同步整理任务等待的存储视为没有空闲名额
+        """
+        return all(self._running.get(storage, 0) < self.get_limit(storage)
+                   and (priority or not self._waiting.get(storage))
+                   for storage in storages)
+
+    def acquire(self, storages: Set[str], wait: bool = True) -> bool:
+        """
+        占用存储名额
+        :param storages: 存储类型
+        :param wait: 名额不足时是否等待，同步整理任务一直等待直到获得名额；不等待时直接返回False
+        :return: 是否占用成功
+        """
+        with self._condition:
+            if not wait:
+                if not self.is_available(storages):
+                    return False
+            else:
+                for storage in storages:
+                    self._waiting[storage] = self._waiting.get(storage, 0) + 1
+                try:
+                    self._condition.wait_for(lambda: self.is_available(storages, priority=True))
+                finally:
+                    for storage in storages:
+                        self._waiting[storage] -= 1
+                        if not self._waiting[storage]:
+                            self._waiting.pop(storage)
+            for storage in storages:
+                self._running[storage] = self._running.get(storage, 0) + 1
+            return True
+
+    def release(self, storages: Set[str]):
+        """
+        释放存储名额
+        """
+        with self._condition:
+            for storage in storages:
+                self._running[storage] = max(self._running.get(storage, 0) - 1, 0)
+            self._condition.notify_all()
+
+
 class TransferChain(ChainBase, metaclass=Singleton):
     """
     文件整理处理链
@@ -362,7 +428,7 @@ class TransferChain(ChainBase, metaclass=Singleton):
     _queue = Queue()
 
     # 文件整理线程
-    _transfer_thread = None
+    _transfer_threads = []
 
     # 队列间隔时间（秒）
     _transfer_interval = 15
@@ -378,6 +444,12 @@ class TransferChain(ChainBase, metaclass=Singleton):
         self.systemconfig = SystemConfigOper()
         self.directoryhelper = DirectoryHelper()
         self.jobview = JobManager()
+        self.limiter = StorageLimiter()
+        # 因存储名额不足延后处理的队列任务
+        self._deferred: List[TransferQueue] = []
+        # 队列处理统计
+        self._queue_lock = threading.Lock()
+        self._queue_stat = {"started": False, "total": 0, "processed": 0, "failed": 0, "running": 0}
 
         # 启动整理任务
         self.__init()
@@ -387,8 +459,11 @@ class TransferChain(ChainBase, metaclass=Singleton):
         初始化
         """
         # 启动文件整理线程
-        self._transfer_thread = threading.Thread(target=self.__start_transfer, daemon=True)
-        self._transfer_thread.start()
+        self._transfer_threads = []
+        for i in range(max(settings.TRANSFER_THREADS, 1)):
+            thread = threading.Thread(target=self.__start_transfer, name=f"transfer-{i}", daemon=True)
+            thread.start()
+            self._transfer_threads.append(thread)
 
     def __default_callback(self, task: TransferTask,
                            transferinfo: TransferInfo, /) -> Tuple[bool, str]:
@@ -528,87 +603,141 @@ class TransferChain(ChainBase, metaclass=Singleton):
             return
         self.jobview.remove_task(fileitem)
 
-    def __start_transfer(self):
+    @staticmethod
+    def __get_transfer_storages(task: TransferTask) -> Set[str]:
+        """
+        获取整理任务涉及的源存储和目标存储
+        """
+        target_storage = task.target_storage
+        if not target_storage and task.target_directory:
+            target_storage = task.target_directory.library_storage
+        return {task.fileitem.storage or "local", target_storage or task.fileitem.storage or "local"}
+
+    def __get_queue_item(self) -> Tuple[Optional[TransferQueue], bool]:
+        """
+        获取下一个待整理的任务，优先处理存储名额已空闲的延后任务，取出的任务计入处理中
+        :return: 队列任务，是否为延后的任务
+        """
+        with self._queue_lock:
+            for item in self._deferred:
+                if self.limiter.is_available(self.__get_transfer_storages(item.task)):
+                    self._deferred.remove(item)
+                    self._queue_stat["running"] += 1
+                    return item, True
+            has_deferred = bool(self._deferred)
+        try:
+            # 有延后任务时缩短等待，以便存储名额空闲后尽快处理
+            item = self._queue.get(timeout=1 if has_deferred else self._transfer_interval)
+        except queue.Empty:
+            return None, False
+        with self._queue_lock:
+            self._queue_stat["running"] += 1
+        # 计入处理中后再标记队列任务完成，结束队列时通过未完成任务数判断是否有刚取出的任务
+        self._queue.task_done()
+        return item, False
+
+    def __start_queue(self):
+        """
+        开始新的队列处理，启动进度
+        """
+        with self._queue_lock:
+            if self._queue_stat["started"]:
+                return
+            logger.info("开始整理队列处理...")
+            # 启动进度
+            self.progress.start(ProgressKey.FileTransfer)
+            # 重置计数
+            self._queue_stat.update(started=True, total=self.jobview.total(), processed=0, failed=0)
+            __process_msg = f"开始整理队列处理，当前共 {self._queue_stat['total']} 个文件 ..."
+            logger.info(__process_msg)
+            self.progress.update(value=0,
+                                 text=__process_msg,
+                                 key=ProgressKey.FileTransfer)
+
+    def __end_queue(self):
+        """
+        队列中没有待处理和处理中的任务时，结束进度
+        """
+        with self._queue_lock:
+            if not self._queue_stat["started"] or self._queue_stat["running"] \
+                    or self._deferred or self._queue.unfinished_tasks:
+                return
+            # 结束进度
+            __end_msg = f"整理队列处理完成，共整理 {self._queue_stat['processed']} 个文件，" \
+                        f"失败 {self._queue_stat['failed']} 个"
+            logger.info(__end_msg)
+            self.progress.update(value=100,
+                                 text=__end_msg,
+                                 key=ProgressKey.FileTransfer)
+            self.progress.end(ProgressKey.FileTransfer)
+            # 重置计数，标记为新队列
+            self._queue_stat.update(started=False, processed=0, failed=0)
+
+    def __update_queue_progress(self, text: str):
         """
-        处理队列
+        更新队列处理进度
         """
-        # 队列开始标识
-        __queue_start = True
-        # 任务总数
-        total_num = 0
-        # 已处理总数
-        processed_num = 0
-        # 失败数量
-        fail_num = 0
+        total = max(self._queue_stat["total"], self._queue_stat["processed"], 1)
+        self.progress.update(value=self._queue_stat["processed"] / total * 100,
+                             text=text,
+                             key=ProgressKey.FileTransfer)
 
+    def __start_transfer(self):
+        """
+        处理队列，多个整理线程同时运行，按存储名额并发整理
+        """
         while not global_vars.is_system_stopped:
             try:
-                item: TransferQueue = self._queue.get(block=False)
-                if item:
-                    task = item.task
-                    if not task:
-                        continue
-                    # 文件信息
-                    fileitem = task.fileitem
-                    # 开始新队列
-                    if __queue_start:
-                        logger.info("开始整理队列处理...")
-                        # 启动进度
-                        self.progress.start(ProgressKey.FileTransfer)
-                        # 重置计数
-                        processed_num = 0
-                        fail_num = 0
-                        total_num = self.jobview.total()
-                        __process_msg = f"开始整理队列处理，当前共 {total_num} 个文件 ..."
+                item, deferred = self.__get_queue_item()
+                if not item:
+                    self.__end_queue()
+                    continue
+                task = item.task
+                if not task:
+                    with self._queue_lock:
+                        self._queue_stat["running"] -= 1
+                    continue
+                # 文件信息
+                fileitem = task.fileitem
+                # 开始新队列
+                self.__start_queue()
+                with self._queue_lock:
+                    if not deferred:
+                        # 更新进度
+                        __process_msg = f"正在整理 {fileitem.name} ..."
                         logger.info(__process_msg)
-                        self.progress.update(value=0,
-                                             text=__process_msg,
-                                             key=ProgressKey.FileTransfer)
-                        # 队列已开始
-                        __queue_start = False
-                    # 更新进度
-                    __process_msg = f"正在整理 {fileitem.name} ..."
-                    logger.info(__process_msg)
-                    self.progress.update(value=processed_num / total_num * 100,
-                                         text=__process_msg,
-                                         key=ProgressKey.FileTransfer)
-                    # 整理
-                    state, err_msg = self.__handle_transfer(task=task, callback=item.callback)
+                        self.__update_queue_progress(__process_msg)
+                try:
+                    # 整理，存储名额不足时不等待
+                    result = self.__handle_transfer(task=task, callback=item.callback, wait=False)
+                except Exception as e:
+                    logger.error(f"{fileitem.name} 整理出现错误：{e} - {traceback.format_exc()}")
+                    result = False, str(e)
+                with self._queue_lock:
+                    self._queue_stat["running"] -= 1
+                    if result is None:
+                        # 存储名额不足，延后处理
+                        self._deferred.append(item)
+                        continue
+                    state, err_msg = result
                     if not state:
                         # 任务失败
-                        fail_num += 1
+                        self._queue_stat["failed"] += 1
                     # 更新进度
-                    processed_num += 1
+                    self._queue_stat["processed"] += 1
                     __process_msg = f"{fileitem.name} 整理完成"
                     logger.info(__process_msg)
-                    self.progress.update(value=processed_num / total_num * 100,
-                                         text=__process_msg,
-                                         key=ProgressKey.FileTransfer)
-            except queue.Empty:
-                if not __queue_start:
-                    # 结束进度
-                    __end_msg = f"整理队列处理完成，共整理 {processed_num} 个文件，失败 {fail_num} 个"
-                    logger.info(__end_msg)
-                    self.progress.update(value=100,
-                                         text=__end_msg,
-                                         key=ProgressKey.FileTransfer)
-                    self.progress.end(ProgressKey.FileTransfer)
-                    # 重置计数
-                    processed_num = 0
-                    fail_num = 0
-                    # 标记为新队列
-                    __queue_start = True
-
-                # 等待一定时间，以让其他任务加入队列
-                sleep(self._transfer_interval)
-                continue
+                    self.__update_queue_progress(__process_msg)
             except Exception as e:
                 logger.error(f"整理队列处理出现错误：{e} - {traceback.format_exc()}")
 
     def __handle_transfer(self, task: TransferTask,
-                          callback: Optional[Callable] = None) -> Optional[Tuple[bool, str]]:
+                          callback: Optional[Callable] = None, wait: bool = True) -> Optional[Tuple[bool, str]]:
         """
         处理整理任务
+        :param task: 整理任务
+        :param callback: 整理完成后的回调
+        :param wait: 存储名额不足时是否等待，同步整理任务等待且优先获得名额；不等待时返回None，识别结果和目标目录已保存在任务中
         """
         try:
             # 识别
@@ -667,8 +796,9 @@ class TransferChain(ChainBase, metaclass=Singleton):
                 # 更新任务信息
                 task.mediainfo = mediainfo
                 # 更新队列任务
-                curr_task = self.jobview.remove_task(task.fileitem)
-                self.jobview.add_task(task, state=curr_task.state if curr_task else "waiting")
+                with task_lock:
+                    curr_task = self.jobview.remove_task(task.fileitem)
+                    self.jobview.add_task(task, state=curr_task.state if curr_task else "waiting")
 
             # 获取集数据
             if task.mediainfo.type == MediaType.TV and not task.episodes_info:
@@ -700,21 +830,29 @@ class TransferChain(ChainBase, metaclass=Singleton):
                                                                          src_path=Path(task.fileitem.path),
                                                                          target_storage=task.target_storage)
 
-            # 正在处理
-            self.jobview.running_task(task)
-
-            # 执行整理
-            transferinfo: TransferInfo = self.transfer(fileitem=task.fileitem,
-                                                       meta=task.meta,
-                                                       mediainfo=task.mediainfo,
-                                                       target_directory=task.target_directory,
-                                                       target_storage=task.target_storage,
-                                                       target_path=task.target_path,
-                                                       transfer_type=task.transfer_type,
-                                                       episodes_info=task.episodes_info,
-                                                       scrape=task.scrape,
-                                                       library_type_folder=task.library_type_folder,
-                                                       library_category_folder=task.library_category_folder)
+            # 占用源存储和目标存储的名额
+            storages = self.__get_transfer_storages(task)
+            if not self.limiter.acquire(storages, wait=wait):
+                return None
+
+            try:
+                # 正在处理
+                self.jobview.running_task(task)
+
+                # 执行整理
+                transferinfo: TransferInfo = self.transfer(fileitem=task.fileitem,
+                                                           meta=task.meta,
+                                                           mediainfo=task.mediainfo,
+                                                           target_directory=task.target_directory,
+                                                           target_storage=task.target_storage,
+                                                           target_path=task.target_path,
+                                                           transfer_type=task.transfer_type,
+                                                           episodes_info=task.episodes_info,
+                                                           scrape=task.scrape,
+                                                           library_type_folder=task.library_type_folder,
+                                                           library_category_folder=task.library_category_folder)
+            finally:
+                self.limiter.release(storages)
             if not transferinfo:
                 logger.error("文件整理模块运行失败")
                 return False, "文件整理模块运行失败"
@@ -998,6 +1136,19 @@ class TransferChain(ChainBase, metaclass=Singleton):
 
         logger.info(f"正在计划整理 {len(file_items)} 个文件...")
 
+        # 批量预加载整理记录、下载文件记录和下载记录，避免逐个文件查询数据库
+        transfer_histories: Dict[Tuple[str, str], TransferHistory] = {}
+        if not force:
+            for storage in {f[0].storage for f in file_items}:
+                histories = self.transferhis.get_by_srcs([f[0].path for f in file_items if f[0].storage == storage],
+                                                         storage=storage)
+                for src, history in histories.items():
+                    transfer_histories[(storage, src)] = history
+        download_files = self.downloadhis.get_files_by_fullpaths([str(Path(f[0].path))
+                                                                  for f in file_items if not f[1]])
+        download_histories = self.downloadhis.get_by_hashes([f.download_hash for f in download_files.values()
+                                                             if f.download_hash])
+
         # 整理所有文件
         transfer_tasks: List[TransferTask] = []
         for file_item, bluray_dir in file_items:
@@ -1029,7 +1180,7 @@ class TransferChain(ChainBase, metaclass=Singleton):
 
             # 整理成功的不再处理
             if not force:
-                transferd = self.transferhis.get_by_src(file_item.path, storage=file_item.storage)
+                transferd = transfer_histories.get((file_item.storage, file_item.path))
                 if transferd:
                     if not transferd.status:
                         all_success = False
@@ -1070,9 +1221,9 @@ class TransferChain(ChainBase, metaclass=Singleton):
                 download_history = self.downloadhis.get_by_path(str(file_path))
             else:
                 # 按文件全路径查询
-                download_file = self.downloadhis.get_file_by_fullpath(str(file_path))
+                download_file = download_files.get(str(file_path))
                 if download_file:
-                    download_history = self.downloadhis.get_by_hash(download_file.download_hash)
+                    download_history = download_histories.get(download_file.download_hash)
 
             # 获取下载Hash
             if download_history and (not downloader or not download_hash):
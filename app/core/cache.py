@@ -2,8 +2,10 @@ import inspect
 import json
 import pickle
 import threading
+import time
+import uuid
 from abc import ABC, abstractmethod
-from functools import wraps
+from functools import lru_cache, wraps
 from typing import Any, Dict, Optional
 from urllib.parse import quote
 
@@ -19,6 +21,9 @@ DEFAULT_CACHE_REGION = "DEFAULT"
 
 lock = threading.Lock()
 
+# 缓存未命中标识
+_MISSING = object()
+
 
 class CacheBackend(ABC):
     """
@@ -102,20 +107,99 @@ class CacheBackend(ABC):
         :param kwargs: 关键字参数
         :return: 缓存键
         """
-        signature = inspect.signature(func)
-        # 绑定传入的参数并应用默认值
-        bound = signature.bind(*args, **kwargs)
-        bound.apply_defaults()
+        return get_cache_key_maker(func)(args, kwargs)
+
+
+class CacheKeyMaker:
+    """
+    缓存键生成器，装饰时解析一次函数签名，调用时按签名顺序直接组装参数值生成缓存键，
+    只有位置和关键字参数（及 **kwargs）的函数走快速路径，其余签名使用预先解析的签名绑定参数
+    """
+
+    def __init__(self, func):
+        self.prefix = func.__name__
+        self.signature = inspect.signature(func)
+        parameters = list(self.signature.parameters.values())
         # 忽略第一个参数，如果它是实例(self)或类(cls)
-        parameters = list(signature.parameters.keys())
-        if parameters and parameters[0] in ("self", "cls"):
-            bound.arguments.pop(parameters[0], None)
-        # 按照函数签名顺序提取参数值列表
-        keys = [
-            bound.arguments[param] for param in signature.parameters if param in bound.arguments
-        ]
+        self.skip_first = bool(parameters) and parameters[0].name in ("self", "cls")
+        self.var_keyword = bool(parameters) and parameters[-1].kind == inspect.Parameter.VAR_KEYWORD
+        named = parameters[:-1] if self.var_keyword else parameters
+        self.simple = all(param.kind == inspect.Parameter.POSITIONAL_OR_KEYWORD for param in named)
+        self.names = tuple(param.name for param in named)
+        self.defaults = tuple(param.default for param in named)
+
+    def __call__(self, args, kwargs) -> str:
+        """
+        生成缓存键，与按签名绑定参数并应用默认值后的结果一致
+        :param args: 位置参数
+        :param kwargs: 关键字参数
+        :return: 缓存键
+        """
+        keys = self.__fast_keys(args, kwargs) if self.simple else None
+        if keys is None:
+            keys = self.__bind_keys(args, kwargs)
+        elif self.skip_first:
+            keys = keys[1:]
         # 使用有序参数生成缓存键
-        return f"{func.__name__}_{hashkey(*keys)}"
+        return f"{self.prefix}_{hashkey(*keys)}"
+
+    def __fast_keys(self, args, kwargs) -> Optional[tuple]:
+        """
+        按签名顺序组装参数值，参数不合法时返回 None 交由签名绑定处理
+        """
+        nargs = len(args)
+        if nargs > len(self.names):
+            return None
+        if not kwargs:
+            if nargs == len(self.names):
+                return args + ({},) if self.var_keyword else args
+            keys = list(args)
+            for default in self.defaults[nargs:]:
+                if default is inspect.Parameter.empty:
+                    return None
+                keys.append(default)
+            if self.var_keyword:
+                keys.append({})
+            return tuple(keys)
+        keys = list(args)
+        used = 0
+        for name, default in zip(self.names[nargs:], self.defaults[nargs:]):
+            if name in kwargs:
+                keys.append(kwargs[name])
+                used += 1
+            elif default is inspect.Parameter.empty:
+                return None
+            else:
+                keys.append(default)
+        if self.var_keyword:
+            extra = {k: v for k, v in kwargs.items() if k not in self.names}
+            if used + len(extra) != len(kwargs):
+                # 关键字参数与位置参数重复
+                return None
+            keys.append(extra)
+        elif used != len(kwargs):
+            return None
+        return tuple(keys)
+
+    def __bind_keys(self, args, kwargs) -> list:
+        """
+        通过签名绑定参数并应用默认值，按签名顺序提取参数值列表
+        """
+        bound = self.signature.bind(*args, **kwargs)
+        bound.apply_defaults()
+        parameters = list(self.signature.parameters.keys())
+        if self.skip_first:
+            bound.arguments.pop(parameters[0], None)
+        return [bound.arguments[param] for param in parameters if param in bound.arguments]
+
+
+@lru_cache(maxsize=1024)
+def get_cache_key_maker(func) -> CacheKeyMaker:
+    """
+    获取函数的缓存键生成器
+    :param func: 被装饰的函数
+    """
+    return CacheKeyMaker(func)
 
 
 class CacheToolsBackend(CacheBackend):
@@ -368,13 +452,28 @@ class RedisBackend(CacheBackend):
         :param region: 缓存的区
         :param kwargs: kwargs
         """
+        try:
+            # 对值进行序列化
+            self.set_raw(key, self.serialize(value), ttl=ttl, region=region, **kwargs)
+        except Exception as e:
+            logger.error(f"Failed to set key: {key} in region: {region}, error: {e}")
+
+    def set_raw(self, key: str, data: bytes, ttl: Optional[int] = None,
+                region: Optional[str] = DEFAULT_CACHE_REGION, **kwargs) -> None:
+        """
+        设置已序列化的缓存值
+
+        :param key: 缓存的键
+        :param data: 序列化后的值
+        :param ttl: 缓存的存活时间，单位秒如果未传入则使用默认值
+        :param region: 缓存的区
+        :param kwargs: kwargs
+        """
         try:
             ttl = ttl or self.ttl
             redis_key = self.get_redis_key(region, key)
-            # 对值进行序列化
-            serialized_value = self.serialize(value)
             kwargs.pop("maxsize", None)
-            self.client.set(redis_key, serialized_value, ex=ttl, **kwargs)
+            self.client.set(redis_key, data, ex=ttl, **kwargs)
         except Exception as e:
             logger.error(f"Failed to set key: {key} in region: {region}, error: {e}")
 
@@ -402,8 +501,7 @@ class RedisBackend(CacheBackend):
         :return: 返回缓存的值，如果缓存不存在返回 None
         """
         try:
-            redis_key = self.get_redis_key(region, key)
-            value = self.client.get(redis_key)
+            value = self.get_raw(key, region=region)
             if value is not None:
                 return self.deserialize(value)  # noqa
             return None
@@ -411,6 +509,21 @@ class RedisBackend(CacheBackend):
             logger.error(f"Failed to get key: {key} in region: {region}, error: {e}")
             return None
 
+    def get_raw(self, key: str, region: Optional[str] = DEFAULT_CACHE_REGION) -> Optional[bytes]:
+        """
+        获取序列化的缓存值，不进行反序列化
+
+        :param key: 缓存的键
+        :param region: 缓存的区
+        :return: 序列化后的值，如果缓存不存在返回 None
+        """
+        try:
+            redis_key = self.get_redis_key(region, key)
+            return self.client.get(redis_key)
+        except Exception as e:
+            logger.error(f"Failed to get key: {key} in region: {region}, error: {e}")
+            return None
+
     def delete(self, key: str, region: Optional[str] = DEFAULT_CACHE_REGION) -> None:
         """
         删除缓存
@@ -454,6 +567,248 @@ class RedisBackend(CacheBackend):
             self.client.close()
 
 
+class TieredBackend(CacheBackend):
+    """
+    两级缓存后端，进程内 `TTLCache` 作为一级缓存，Redis 作为二级缓存
+
+    特性：
+    - 一级缓存按区域（region）划分，条目数较少且存活时间较短，命中时无需网络往返
+    - 一级缓存保存序列化后的数据，命中时反序列化出新的对象，调用方修改返回值不影响缓存
+    - 写入、删除和清理同时作用于两级缓存，一级缓存未命中时读取 Redis 并回填
+    - 可选通过 Redis 发布订阅通知其它实例失效一级缓存，保证多实例间的一致性
+    - 按区域统计两级缓存的命中、未命中次数和读取耗时
+
+    限制：
+    - 未开启失效通知时，其它实例写入的数据最长在一级缓存存活时间后才可见
+    """
+
+    # 失效通知频道
+    invalidation_channel = "moviepilot:cache:invalidation"
+
+    def __init__(self, backend: RedisBackend, maxsize: Optional[int] = 256, ttl: Optional[int] = 60,
+                 invalidation: Optional[bool] = False):
+        """
+        初始化两级缓存实例
+
+        :param backend: 二级缓存（Redis）后端
+        :param maxsize: 一级缓存每个区域的最大条目数
+        :param ttl: 一级缓存的存活时间，单位秒
+        :param invalidation: 是否开启多实例失效通知
+        """
+        self.backend = backend
+        self.maxsize = maxsize
+        self.ttl = ttl
+        # 存储各个 region 的一级缓存实例，region -> TTLCache
+        self._region_caches: Dict[str, TTLCache] = {}
+        self._lock = threading.Lock()
+        # 各 region 的统计数据
+        self._stats: Dict[str, Dict[str, float]] = {}
+        self._stats_lock = threading.Lock()
+        # 实例标识，用于忽略自身发出的失效通知
+        self._instance_id = uuid.uuid4().hex
+        self._pubsub = None
+        self._pubsub_thread = None
+        if invalidation:
+            self.__start_invalidation()
+
+    def __start_invalidation(self):
+        """
+        订阅失效通知频道，在后台线程中处理其它实例发出的失效通知
+        """
+        try:
+            self._pubsub = self.backend.client.pubsub(ignore_subscribe_messages=True)
+            self._pubsub.subscribe(**{self.invalidation_channel: self.__on_invalidation})
+            self._pubsub_thread = self._pubsub.run_in_thread(sleep_time=1, daemon=True)
+            logger.debug("Subscribed to cache invalidation channel")
+        except Exception as e:
+            logger.error(f"Failed to subscribe cache invalidation channel: {e}")
+
+    def __on_invalidation(self, message: dict):
+        """
+        处理失效通知，清理一级缓存中对应的键或区域
+        """
+        try:
+            data = json.loads(message.get("data"))
+            if data.get("origin") == self._instance_id:
+                return
+            self.__invalidate_local(key=data.get("key"), region=data.get("region"))
+        except Exception as e:
+            logger.error(f"Failed to handle cache invalidation message: {message}, error: {e}")
+
+    def __publish_invalidation(self, key: Optional[str] = None, region: Optional[str] = None):
+        """
+        发布失效通知，key 为空时表示清理整个区域，region 也为空时表示清理全部缓存
+        """
+        if not self._pubsub:
+            return
+        try:
+            self.backend.client.publish(self.invalidation_channel, json.dumps({
+                "origin": self._instance_id,
+                "region": region,
+                "key": key
+            }))
+        except Exception as e:
+            logger.error(f"Failed to publish cache invalidation, key: {key}, region: {region}, error: {e}")
+
+    def __invalidate_local(self, key: Optional[str] = None, region: Optional[str] = None):
+        """
+        清理一级缓存
+        """
+        with self._lock:
+            if region is None:
+                for region_cache in self._region_caches.values():
+                    region_cache.clear()
+                return
+            region_cache = self._region_caches.get(self.get_region(region))
+            if region_cache is None:
+                return
+            if key is None:
+                region_cache.clear()
+            else:
+                region_cache.pop(key, None)
+
+    def __record(self, region: str, tier: str, hit: bool, elapsed: float):
+        """
+        记录指定区域某一级缓存的读取结果和耗时
+        """
+        with self._stats_lock:
+            stats = self._stats.setdefault(region, {
+                "l1_hits": 0, "l1_misses": 0, "l1_time": 0.0,
+                "l2_hits": 0, "l2_misses": 0, "l2_time": 0.0
+            })
+            stats[f"{tier}_hits" if hit else f"{tier}_misses"] += 1
+            stats[f"{tier}_time"] += elapsed
+
+    def get_stats(self) -> Dict[str, Dict[str, Any]]:
+        """
+        获取各区域两级缓存的命中、未命中次数和平均读取耗时（毫秒）
+        """
+        with self._stats_lock:
+            stats = {region: dict(item) for region, item in self._stats.items()}
+        result = {}
+        for region, item in stats.items():
+            region_stats = {}
+            for tier in ("l1", "l2"):
+                count = item[f"{tier}_hits"] + item[f"{tier}_misses"]
+                region_stats.update({
+                    f"{tier}_hits": item[f"{tier}_hits"],
+                    f"{tier}_misses": item[f"{tier}_misses"],
+                    f"{tier}_avg_ms": round(item[f"{tier}_time"] / count * 1000, 3) if count else 0
+                })
+            result[region] = region_stats
+        return result
+
+    def __local_set(self, key: str, data: bytes, region: str, ttl: Optional[int] = None,
+                    maxsize: Optional[int] = None):
+        """
+        写入序列化后的数据到一级缓存，条目数和存活时间不超过一级缓存的配置
+        """
+        region = self.get_region(region)
+        with self._lock:
+            region_cache = self._region_caches.get(region)
+            if region_cache is None:
+                region_cache = self._region_caches[region] = TTLCache(
+                    maxsize=min(maxsize or self.maxsize, self.maxsize),
+                    ttl=min(ttl or self.ttl, self.ttl)
+                )
+            region_cache[key] = data
+
+    def set(self, key: str, value: Any, ttl: Optional[int] = None,
+            region: Optional[str] = DEFAULT_CACHE_REGION, **kwargs) -> None:
+        """
+        设置缓存，同时写入两级缓存
+
+        :param key: 缓存的键
+        :param value: 缓存的值
+        :param ttl: 缓存的存活时间，单位秒如果未传入则使用默认值
+        :param region: 缓存的区
+        :param kwargs: maxsize: 一级缓存的最大条目数，不超过一级缓存的配置
+        """
+        try:
+            data = self.backend.serialize(value)
+        except Exception as e:
+            logger.error(f"Failed to serialize key: {key} in region: {region}, error: {e}")
+            return
+        self.backend.set_raw(key, data, ttl=ttl, region=region, **kwargs)
+        self.__local_set(key, data, region=region, ttl=ttl, maxsize=kwargs.get("maxsize"))
+        self.__publish_invalidation(key=key, region=region)
+
+    def exists(self, key: str, region: Optional[str] = DEFAULT_CACHE_REGION) -> bool:
+        """
+        判断缓存键是否存在
+
+        :param key: 缓存的键
+        :param region: 缓存的区
+        :return: 存在返回 True，否则返回 False
+        """
+        with self._lock:
+            region_cache = self._region_caches.get(self.get_region(region))
+            if region_cache is not None and key in region_cache:
+                return True
+        return self.backend.exists(key, region=region)
+
+    def get(self, key: str, region: Optional[str] = DEFAULT_CACHE_REGION) -> Any:
+        """
+        获取缓存的值，一级缓存未命中时读取 Redis 并回填一级缓存
+
+        :param key: 缓存的键
+        :param region: 缓存的区
+        :return: 返回缓存的值，如果缓存不存在返回 None
+        """
+        start = time.perf_counter()
+        with self._lock:
+            region_cache = self._region_caches.get(self.get_region(region))
+            data = region_cache.get(key, _MISSING) if region_cache is not None else _MISSING
+        if data is not _MISSING:
+            # 每次命中都反序列化出新的对象，避免调用方修改共享的缓存对象
+            value = self.backend.deserialize(data)
+            self.__record(region, "l1", True, time.perf_counter() - start)
+            return value
+        self.__record(region, "l1", False, time.perf_counter() - start)
+        start = time.perf_counter()
+        data = self.backend.get_raw(key, region=region)
+        try:
+            value = self.backend.deserialize(data) if data is not None else None
+        except Exception as e:
+            logger.error(f"Failed to deserialize key: {key} in region: {region}, error: {e}")
+            data = value = None
+        self.__record(region, "l2", data is not None, time.perf_counter() - start)
+        if data is not None:
+            self.__local_set(key, data, region=region)
+        return value
+
+    def delete(self, key: str, region: Optional[str] = DEFAULT_CACHE_REGION) -> None:
+        """
+        删除缓存
+
+        :param key: 缓存的键
+        :param region: 缓存的区
+        """
+        self.backend.delete(key, region=region)
+        self.__invalidate_local(key=key, region=region)
+        self.__publish_invalidation(key=key, region=region)
+
+    def clear(self, region: Optional[str] = None) -> None:
+        """
+        清除指定区域的缓存或全部缓存
+
+        :param region: 缓存的区
+        """
+        self.backend.clear(region=region)
+        self.__invalidate_local(region=region)
+        self.__publish_invalidation(region=region)
+
+    def close(self) -> None:
+        """
+        停止失效通知订阅并关闭 Redis 连接
+        """
+        if self._pubsub_thread:
+            self._pubsub_thread.stop()
+        if self._pubsub:
+            self._pubsub.close()
+        self.backend.close()
+
+
 def get_cache_backend(maxsize: Optional[int] = 1000, ttl: Optional[int] = 1800) -> CacheBackend:
     """
     根据配置获取缓存后端实例
@@ -470,7 +825,13 @@ def get_cache_backend(maxsize: Optional[int] = 1000, ttl: Optional[int] = 1800)
         if redis_url:
             try:
                 logger.debug(f"Attempting to use RedisBackend with URL: {redis_url}, TTL: {ttl}")
-                return RedisBackend(redis_url=redis_url, ttl=ttl)
+                backend = RedisBackend(redis_url=redis_url, ttl=ttl)
+                if settings.CACHE_L1_ENABLE:
+                    logger.debug(f"Using TieredBackend with L1 maxsize: {settings.CACHE_L1_MAXSIZE}, "
+                                 f"TTL: {settings.CACHE_L1_TTL}")
+                    return TieredBackend(backend=backend, maxsize=settings.CACHE_L1_MAXSIZE,
+                                         ttl=settings.CACHE_L1_TTL, invalidation=settings.CACHE_L1_INVALIDATION)
+                return backend
             except RuntimeError:
                 logger.warning("Falling back to CacheToolsBackend due to Redis connection failure.")
         else:
@@ -528,11 +889,13 @@ def cached(region: Optional[str] = None, maxsize: Optional[int] = 1000, ttl: Opt
 
         # 获取缓存区
         cache_region = region if region is not None else f"{func.__module__}.{func.__name__}"
+        # 缓存键生成器
+        key_maker = CacheKeyMaker(func)
 
         @wraps(func)
         def wrapper(*args, **kwargs):
             # 获取缓存键
-            cache_key = cache_backend.get_cache_key(func, args, kwargs)
+            cache_key = key_maker(args, kwargs)
             # 尝试获取缓存
             cached_value = cache_backend.get(cache_key, region=cache_region)
             if should_cache(cached_value) and is_valid_cache_value(cache_key, cached_value, cache_region):
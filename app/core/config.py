@@ -77,6 +77,14 @@ class ConfigModel(BaseModel):
     CACHE_BACKEND_URL: Optional[str] = None
     # Redis 缓存最大内存限制，未配置时，如开启大内存模式时为 "1024mb"，未开启时为 "256mb"
     CACHE_REDIS_MAXMEMORY: Optional[str] = None
+    # 使用 Redis 缓存时是否启用进程内一级缓存
+    CACHE_L1_ENABLE: bool = True
+    # 一级缓存每个缓存区的最大条目数
+    CACHE_L1_MAXSIZE: int = 256
+    # 一级缓存的存活时间（秒）
+    CACHE_L1_TTL: int = 60
+    # 是否通过 Redis 发布订阅通知其它实例失效一级缓存，多个实例共用同一 Redis 时开启
+    CACHE_L1_INVALIDATION: bool = False
     # 配置文件目录
     CONFIG_DIR: Optional[str] = None
     # 超级管理员
@@ -159,12 +167,23 @@ class ConfigModel(BaseModel):
     )
     # 下载器临时文件后缀
     DOWNLOAD_TMPEXT: list = Field(default_factory=lambda: ['.!qb', '.part'])
+    # 文件整理队列的并发线程数
+    TRANSFER_THREADS: int = 4
+    # 按存储限制同时整理的文件数（源存储和目标存储均占用名额），格式：{"u115": 1, "local": 2}
+    # 未配置的存储：本地存储不超过整理线程数，其它存储为1
+    TRANSFER_STORAGE_LIMITS: dict = Field(default_factory=dict)
     # 媒体服务器同步间隔（小时）
     MEDIASERVER_SYNC_INTERVAL: int = 6
+    # 媒体服务器同步时单个服务器的并发请求数
+    MEDIASERVER_SYNC_WORKERS: int = 4
     # 订阅模式
     SUBSCRIBE_MODE: str = "spider"
     # RSS订阅模式刷新时间间隔（分钟）
     SUBSCRIBE_RSS_INTERVAL: int = 30
+    # 站点资源刷新时并发获取的站点数
+    SUBSCRIBE_REFRESH_WORKERS: int = 10
+    # 站点资源刷新时并发识别的种子数，避免超出TMDB请求频率限制
+    SUBSCRIBE_RECOGNIZE_WORKERS: int = 4
     # 订阅数据共享
     SUBSCRIBE_STATISTIC_SHARE: bool = True
     # 订阅搜索开关
@@ -173,6 +192,12 @@ class ConfigModel(BaseModel):
     LOCAL_EXISTS_SEARCH: bool = False
     # 搜索多个名称
     SEARCH_MULTIPLE_NAME: bool = False
+    # 站点搜索总时限（秒），到期后返回已完成站点的结果，0为不限制
+    SEARCH_TIMEOUT: int = 0
+    # 单个站点搜索时限（秒），从站点开始搜索时计算，0为不限制
+    SEARCH_SITE_TIMEOUT: int = 0
+    # 站点搜索最大并发数
+    SEARCH_MAX_WORKERS: int = 20
     # 站点数据刷新间隔（小时）
     SITEDATA_REFRESH_INTERVAL: int = 6
     # 读取和发送站点消息
@@ -236,6 +261,14 @@ class ConfigModel(BaseModel):
     ENCODING_DETECTION_PERFORMANCE_MODE: bool = True
     # 编码探测的最低置信度阈值
     ENCODING_DETECTION_MIN_CONFIDENCE: float = 0.8
+    # EVENT_QUEUE_LIMITS 中未单独设置上限的事件类型允许积压（排队及处理中）的最大数量，0为不限制
+    EVENT_QUEUE_MAX_PENDING: int = 0
+    # 广播事件积压超限时的处理策略：drop 直接丢弃新事件；block 等待处理器消化积压，超时后丢弃
+    EVENT_QUEUE_POLICY: str = "drop"
+    # block 策略的最长等待时间（秒）
+    EVENT_QUEUE_BLOCK_TIMEOUT: int = 5
+    # 需要限制积压的事件类型及其上限和策略，未列出的事件类型不限制，格式：{"notice.message": {"max_pending": 100, "policy": "drop"}}
+    EVENT_QUEUE_LIMITS: dict = Field(default_factory=dict)
     # 允许的图片缓存域名
     SECURITY_IMAGE_DOMAINS: List[str] = Field(
         default_factory=lambda: ["image.tmdb.org",
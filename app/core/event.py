@@ -6,22 +6,25 @@ import threading
 import time
 import traceback
 import uuid
+from collections import deque
 from functools import lru_cache
 from queue import Empty, PriorityQueue
-from typing import Callable, Dict, List, Optional, Union
+from typing import Callable, Dict, List, Optional, Tuple, Union
 
+from app.core.config import settings
 from app.helper.message import MessageHelper
 from app.helper.thread import ThreadHelper
 from app.log import logger
 from app.schemas import ChainEventData
 from app.schemas.types import ChainEventType, EventType
 from app.utils.limit import ExponentialBackoffRateLimiter
-from app.utils.singleton import Singleton
+from app.utils.singleton import Singleton, SingletonClass
 
 DEFAULT_EVENT_PRIORITY = 10  # 事件的默认优先级
 MIN_EVENT_CONSUMER_THREADS = 1  # 最小事件消费者线程数
 INITIAL_EVENT_QUEUE_IDLE_TIMEOUT_SECONDS = 1  # 事件队列空闲时的初始超时时间（秒）
 MAX_EVENT_QUEUE_IDLE_TIMEOUT_SECONDS = 5  # 事件队列空闲时的最大超时时间（秒）
+HANDLER_LATENCY_SAMPLES = 200  # 每个事件处理器保留的最近耗时样本数，用于计算分位数
 
 
 class Event:
@@ -41,6 +44,21 @@ class Event:
         self.event_type = event_type  # 事件类型
         self.event_data = event_data or {}  # 事件数据
         self.priority = priority  # 事件优先级
+        self.created_at = time.monotonic()  # 事件创建时间，用于统计调度延迟
+
+    def copy(self, deep: bool = False) -> "Event":
+        """
+        复制事件供单个处理器使用
+        :param deep: 是否深复制事件数据，为否时事件数据只复制顶层，处理器只能替换顶层字段而不应修改嵌套对象
+        """
+        if deep:
+            return copy.deepcopy(self)
+        event = copy.copy(self)
+        if isinstance(self.event_data, dict):
+            event.event_data = dict(self.event_data)
+        elif hasattr(self.event_data, "copy"):
+            event.event_data = self.event_data.copy()
+        return event
 
     def __repr__(self) -> str:
         """
@@ -84,6 +102,16 @@ class EventManager(metaclass=Singleton):
         self.__disabled_handlers = set()  # 禁用的事件处理器集合
         self.__disabled_classes = set()  # 禁用的事件处理器类集合
         self.__lock = threading.Lock()  # 线程锁
+        self.__class_instances: Dict[str, object] = {}  # 事件处理器所属单例类的实例缓存
+        self.__instance_lock = threading.Lock()  # 实例缓存锁
+        self.__metrics_lock = threading.Lock()  # 统计锁
+        self.__pending_condition = threading.Condition(self.__metrics_lock)  # 积压变化通知，用于 block 策略
+        self.__queue_depths: Dict[EventType, int] = {}  # 各广播事件类型在队列中等待的数量
+        self.__pending: Dict[EventType, int] = {}  # 各广播事件类型的积压数量（排队及处理中）
+        self.__inflight: Dict[str, int] = {}  # 已调度的广播事件尚未完成的处理器数量
+        self.__shed_counts: Dict[EventType, int] = {}  # 各广播事件类型因积压超限被丢弃的数量
+        self.__dispatch_stats: Dict[EventType, Dict[str, float]] = {}  # 各广播事件类型的调度统计
+        self.__handler_stats: Dict[str, dict] = {}  # 各事件处理器的执行统计
 
     def start(self):
         """
@@ -263,6 +291,91 @@ class EventManager(metaclass=Singleton):
                 handler_info.append(handler_dict)
         return handler_info
 
+    def get_dispatch_metrics(self) -> List[Dict]:
+        """
+        获取广播事件的调度统计
+        :return: 统计列表，包含事件类型、队列中等待的数量、积压数量及上限、丢弃数量、已调度数量、平均和最大调度延迟（毫秒）
+        """
+        with self.__metrics_lock:
+            event_types = set(self.__pending.keys()) | set(self.__dispatch_stats.keys()) \
+                          | set(self.__shed_counts.keys())
+            metrics = []
+            for event_type in event_types:
+                max_pending, policy = self.__get_queue_limit(event_type)
+                stats = self.__dispatch_stats.get(event_type) or {}
+                count = int(stats.get("count", 0))
+                metrics.append({
+                    "event_type": event_type.value,
+                    "queue_depth": self.__queue_depths.get(event_type, 0),
+                    "pending": self.__pending.get(event_type, 0),
+                    "max_pending": max_pending,
+                    "policy": policy,
+                    "shed": self.__shed_counts.get(event_type, 0),
+                    "dispatched": count,
+                    "avg_latency_ms": round(stats.get("total", 0) / count * 1000, 2) if count else 0,
+                    "max_latency_ms": round(stats.get("max", 0) * 1000, 2)
+                })
+        return sorted(metrics, key=lambda x: x["event_type"])
+
+    def get_handler_metrics(self) -> List[Dict]:
+        """
+        获取事件处理器的执行统计
+        :return: 统计列表，包含处理器、执行次数、出错次数、最近样本的 p50/p95 耗时及最大耗时（毫秒），按 p95 耗时倒序
+        """
+        with self.__metrics_lock:
+            handler_stats = [(identifier, {**stats, "event_types": sorted(stats["event_types"])},
+                              sorted(stats["latencies"]))
+                             for identifier, stats in self.__handler_stats.items()]
+        metrics = []
+        for identifier, stats, latencies in handler_stats:
+            metrics.append({
+                "handler": identifier,
+                "event_types": stats["event_types"],
+                "count": stats["count"],
+                "errors": stats["errors"],
+                "p50_ms": self.__percentile(latencies, 0.5),
+                "p95_ms": self.__percentile(latencies, 0.95),
+                "max_ms": round(stats["max"] * 1000, 2)
+            })
+        return sorted(metrics, key=lambda x: x["p95_ms"], reverse=True)
+
+    def get_metrics(self, top: Optional[int] = 10) -> Dict:
+        """
+        获取事件总线的统计信息
+        :param top: 最慢处理器的数量
+        :return: 广播事件调度统计、处理器执行统计及最慢的处理器
+        """
+        handlers = self.get_handler_metrics()
+        return {
+            "events": self.get_dispatch_metrics(),
+            "handlers": handlers,
+            "slowest_handlers": handlers[:top]
+        }
+
+    @staticmethod
+    def __percentile(latencies: List[float], percent: float) -> float:
+        """
+        计算已排序耗时样本的分位数（毫秒）
+        """
+        if not latencies:
+            return 0
+        return round(latencies[int(round(percent * (len(latencies) - 1)))] * 1000, 2)
+
+    @staticmethod
+    def __get_queue_limit(event_type: EventType) -> Tuple[int, str]:
+        """
+        获取广播事件类型的积压上限和超限策略，只有 EVENT_QUEUE_LIMITS 中列出的事件类型才限制积压
+        :param event_type: 事件类型
+        :return: (积压上限，0为不限制, 策略)
+        """
+        limits = settings.EVENT_QUEUE_LIMITS or {}
+        if event_type.value not in limits:
+            return 0, settings.EVENT_QUEUE_POLICY
+        limit = limits.get(event_type.value) or {}
+        max_pending = limit.get("max_pending", settings.EVENT_QUEUE_MAX_PENDING) or 0
+        policy = limit.get("policy") or settings.EVENT_QUEUE_POLICY
+        return max_pending, policy
+
     @classmethod
     @lru_cache(maxsize=1000)
     def __get_handler_identifier(cls, target: Union[Callable, type]) -> Optional[str]:
@@ -304,6 +417,28 @@ class EventManager(metaclass=Singleton):
             module_name = module.__name__ if module else "unknown_module"
             return f"{module_name}.{class_name}"
 
+    @staticmethod
+    @lru_cache(maxsize=1000)
+    def __get_handler_target(handler: Callable) -> Tuple[str, str]:
+        """
+        解析处理器所属的类名和方法名
+        :param handler: 处理器
+        :return: (类名, 方法名)
+        """
+        names = handler.__qualname__.split(".")
+        return names[0], names[1]
+
+    @staticmethod
+    @lru_cache(maxsize=1000)
+    def __is_core_handler(handler: Callable) -> bool:
+        """
+        判断处理器是否属于核心程序（不包括插件）
+        :param handler: 处理器
+        :return: 是否为核心程序的处理器
+        """
+        module_name = getattr(handler, "__module__", None) or ""
+        return module_name.startswith("app.") and not module_name.startswith("app.plugins.")
+
     def __is_handler_enabled(self, handler: Callable) -> bool:
         """
         检查处理器是否已启用（没有被禁用）
@@ -332,12 +467,72 @@ class EventManager(metaclass=Singleton):
 
     def __trigger_broadcast_event(self, event: Event):
         """
-        触发广播事件，将事件插入到优先级队列中
+        触发广播事件，将事件插入到优先级队列中；积压超过上限时按策略等待或丢弃
         :param event: 要处理的事件对象
         """
         logger.debug(f"Triggering broadcast event: {event}")
+        event_type = event.event_type
+        max_pending, policy = self.__get_queue_limit(event_type)
+        with self.__pending_condition:
+            if max_pending and self.__pending.get(event_type, 0) >= max_pending and policy == "block":
+                self.__pending_condition.wait_for(lambda: self.__pending.get(event_type, 0) < max_pending,
+                                                  timeout=settings.EVENT_QUEUE_BLOCK_TIMEOUT)
+            shed = bool(max_pending and self.__pending.get(event_type, 0) >= max_pending)
+            if shed:
+                self.__shed_counts[event_type] = self.__shed_counts.get(event_type, 0) + 1
+            else:
+                self.__pending[event_type] = self.__pending.get(event_type, 0) + 1
+                self.__queue_depths[event_type] = self.__queue_depths.get(event_type, 0) + 1
+        if shed:
+            logger.warning(f"广播事件 {event_type.value} 积压已达上限 {max_pending}，丢弃事件：{event}")
+            return
         self.__event_queue.put((event.priority, event))
 
+    def __record_dispatch(self, event: Event, handler_count: int):
+        """
+        记录广播事件出队调度，统计队列中等待的数量和调度延迟
+        :param event: 事件对象
+        :param handler_count: 本次调度的处理器数量
+        """
+        latency = time.monotonic() - event.created_at
+        with self.__metrics_lock:
+            self.__queue_depths[event.event_type] = max(self.__queue_depths.get(event.event_type, 0) - 1, 0)
+            stats = self.__dispatch_stats.setdefault(event.event_type, {"count": 0, "total": 0.0, "max": 0.0})
+            stats["count"] += 1
+            stats["total"] += latency
+            stats["max"] = max(stats["max"], latency)
+            if handler_count:
+                self.__inflight[event.event_id] = handler_count
+        if not handler_count:
+            self.__release_event(event)
+
+    def __release_event(self, event: Event):
+        """
+        广播事件的全部处理器执行完成，减少积压数量并通知等待的生产者
+        """
+        with self.__pending_condition:
+            self.__pending[event.event_type] = max(self.__pending.get(event.event_type, 0) - 1, 0)
+            self.__pending_condition.notify_all()
+
+    def __record_handler(self, handler: Callable, event: Event, elapsed: float, failed: bool):
+        """
+        记录事件处理器的执行耗时和结果
+        """
+        identifier = self.__get_handler_identifier(handler)
+        with self.__metrics_lock:
+            stats = self.__handler_stats.get(identifier)
+            if not stats:
+                stats = self.__handler_stats[identifier] = {
+                    "event_types": set(), "count": 0, "errors": 0, "max": 0.0,
+                    "latencies": deque(maxlen=HANDLER_LATENCY_SAMPLES)
+                }
+            stats["event_types"].add(event.event_type.value)
+            stats["count"] += 1
+            if failed:
+                stats["errors"] += 1
+            stats["max"] = max(stats["max"], elapsed)
+            stats["latencies"].append(elapsed)
+
     def __dispatch_chain_event(self, event: Event) -> bool:
         """
         同步方式调度链式事件，按优先级顺序逐个调用事件处理器，并记录每个处理器的处理时间
@@ -369,19 +564,39 @@ class EventManager(metaclass=Singleton):
 
     def __dispatch_broadcast_event(self, event: Event):
         """
-        异步方式调度广播事件，通过线程池逐个调用事件处理器
+        异步方式调度广播事件，每个启用的处理器在线程池中直接执行一次，并获得独立的事件副本
         :param event: 要调度的事件对象
         """
-        handlers = self.__broadcast_subscribers.get(event.event_type, {})
+        handlers = [handler for handler in list(self.__broadcast_subscribers.get(event.event_type, {}).values())
+                    if self.__is_handler_enabled(handler)]
+        self.__record_dispatch(event, len(handlers))
         if not handlers:
-            logger.debug(f"No handlers found for broadcast event: {event}")
+            logger.debug(f"No enabled handlers found for broadcast event: {event}")
             return
-        for handler_id, handler in handlers.items():
-            self.__executor.submit(self.__safe_invoke_handler, handler, event)
+        for handler in handlers:
+            # 核心程序内的处理器使用浅复制，插件等外部处理器仍使用深复制，避免修改事件数据影响其它处理器
+            self.__executor.submit(self.__invoke_broadcast_handler, handler,
+                                   event.copy(deep=not self.__is_core_handler(handler)))
+
+    def __invoke_broadcast_handler(self, handler: Callable, event: Event):
+        """
+        调用广播事件处理器，最后一个处理器完成时释放事件的积压计数
+        """
+        try:
+            self.__safe_invoke_handler(handler, event)
+        finally:
+            with self.__metrics_lock:
+                remaining = self.__inflight.get(event.event_id, 1) - 1
+                if remaining > 0:
+                    self.__inflight[event.event_id] = remaining
+                else:
+                    self.__inflight.pop(event.event_id, None)
+            if remaining <= 0:
+                self.__release_event(event)
 
     def __safe_invoke_handler(self, handler: Callable, event: Event):
         """
-        调用处理器，处理链式或广播事件
+        在当前线程中调用处理器，处理链式或广播事件，并记录处理耗时
         :param handler: 处理器
         :param event: 事件对象
         """
@@ -389,41 +604,46 @@ class EventManager(metaclass=Singleton):
             logger.debug(f"Handler {self.__get_handler_identifier(handler)} is disabled. Skipping execution")
             return
 
-        # 根据事件类型判断是否需要深复制
-        is_broadcast_event = isinstance(event.event_type, EventType)
-        event_to_process = copy.deepcopy(event) if is_broadcast_event else event
-
-        names = handler.__qualname__.split(".")
-        class_name, method_name = names[0], names[1]
+        class_name, method_name = self.__get_handler_target(handler)
 
+        start_time = time.monotonic()
         try:
             from app.core.plugin import PluginManager
 
             if class_name in PluginManager().get_plugin_ids():
-                # 定义一个插件调用函数
-                def plugin_callable():
-                    PluginManager().run_plugin_method(class_name, method_name, event_to_process)
-
-                if is_broadcast_event:
-                    self.__executor.submit(plugin_callable)
-                else:
-                    plugin_callable()
+                PluginManager().run_plugin_method(class_name, method_name, event)
             else:
                 # 获取全局对象或模块类的实例
                 class_obj = self.__get_class_instance(class_name)
                 if class_obj and hasattr(class_obj, method_name):
-                    method = getattr(class_obj, method_name)
-                    if is_broadcast_event:
-                        self.__executor.submit(method, event_to_process)
-                    else:
-                        method(event_to_process)
+                    getattr(class_obj, method_name)(event)
         except Exception as e:
+            self.__record_handler(handler, event, time.monotonic() - start_time, failed=True)
             self.__handle_event_error(event, handler, e)
+        else:
+            self.__record_handler(handler, event, time.monotonic() - start_time, failed=False)
+
+    def __get_class_instance(self, class_name: str):
+        """
+        根据类名获取类实例，单例类的实例创建后缓存复用，其它类每次调度都创建新实例
+        :param class_name: 类的名称
+        :return: 类的实例
+        """
+        class_obj = self.__class_instances.get(class_name)
+        if class_obj is not None:
+            return class_obj
+        with self.__instance_lock:
+            class_obj = self.__class_instances.get(class_name)
+            if class_obj is None:
+                class_obj = self.__create_class_instance(class_name)
+                if isinstance(type(class_obj), (Singleton, SingletonClass)):
+                    self.__class_instances[class_name] = class_obj
+        return class_obj
 
     @staticmethod
-    def __get_class_instance(class_name: str):
+    def __create_class_instance(class_name: str):
         """
-        根据类名获取类实例，首先检查全局变量中是否存在该类，如果不存在则尝试动态导入模块。
+        根据类名创建类实例，首先检查全局变量中是否存在该类，如果不存在则尝试动态导入模块。
         :param class_name: 类的名称
         :return: 类的实例
         """
@@ -488,8 +708,7 @@ class EventManager(metaclass=Singleton):
         """
         logger.error(f"事件处理出错：{str(e)} - {traceback.format_exc()}")
 
-        names = handler.__qualname__.split(".")
-        class_name, method_name = names[0], names[1]
+        class_name, method_name = self.__get_handler_target(handler)
 
         self.__messagehelper.put(title=f"{event.event_type} 事件处理出错",
                                  message=f"{class_name}.{method_name}：{str(e)}",
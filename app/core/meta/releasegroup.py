@@ -1,3 +1,6 @@
+import threading
+from typing import List, Optional, Dict, Tuple, Union
+
 import regex as re
 
 from app.db.systemconfig_oper import SystemConfigOper
@@ -9,7 +12,6 @@ class ReleaseGroupsMatcher(metaclass=Singleton):
     """
     识别制作组、字幕组
     """
-    __release_groups: str = None
     # 内置组
     RELEASE_GROUPS: dict = {
         "0ff": ['FF(?:(?:A|WE)B|CD|E(?:DU|B)|TV)'],
@@ -80,13 +82,30 @@ class ReleaseGroupsMatcher(metaclass=Singleton):
         "ubits": ['UB(?:its|WEB|TV)'],
     }
 
+    # 编译后的正则缓存最大数量
+    _max_patterns = 256
+    # 制作组前的分隔符及其后的首字符
+    _delimiter_re = re.compile(r"(?<=[-@\[￡【&]).")
+
     def __init__(self):
         self.systemconfig = SystemConfigOper()
+        self._lock = threading.Lock()
         release_groups = []
         for site_groups in self.RELEASE_GROUPS.values():
             for release_group in site_groups:
                 release_groups.append(release_group)
-        self.__release_groups = '|'.join(release_groups)
+        # 内置组列表
+        self._builtin_groups: List[str] = release_groups
+        # 已加载的自定义组
+        self._custom_groups: Optional[List[str]] = None
+        # 内置组及自定义组列表
+        self._groups: List[str] = []
+        # 字面量前缀首字符 -> [(小写字面量前缀, 组序号)]
+        self._prefix_index: Dict[str, List[Tuple[str, int]]] = {}
+        # 没有字面量前缀的组序号，始终参与匹配
+        self._always_groups: List[int] = []
+        # 候选组序号或指定的组 -> 编译后的正则
+        self._patterns: Dict[Union[Tuple[int, ...], str], re.Pattern] = {}
 
     def match(self, title: str = None, groups: str = None):
         """
@@ -96,21 +115,108 @@ class ReleaseGroupsMatcher(metaclass=Singleton):
         """
         if not title:
             return ""
-        if not groups:
-            # 自定义组
-            custom_release_groups = self.systemconfig.get(SystemConfigKey.CustomReleaseGroups)
-            if isinstance(custom_release_groups, list):
-                custom_release_groups = list(filter(None, custom_release_groups))
-            if custom_release_groups:
-                custom_release_groups_str = '|'.join(custom_release_groups)
-                groups = f"{self.__release_groups}|{custom_release_groups_str}"
-            else:
-                groups = self.__release_groups
         title = f"{title} "
-        groups_re = re.compile(r"(?<=[-@\[￡【&])(?:%s)(?=[@.\s\S\]\[】&])" % groups, re.I)
+        if groups:
+            groups_re = self.__get_pattern(groups, groups)
+        else:
+            self.__check_custom_groups()
+            # 通过字面量前缀预筛选可能出现的组，只用候选组构建正则
+            candidates = self.__get_candidates(title)
+            if not candidates:
+                return ""
+            groups_re = self.__get_pattern(candidates, '|'.join(self._groups[index] for index in candidates))
         # 处理一个制作组识别多次的情况，保留顺序
         unique_groups = []
-        for item in re.findall(groups_re, title):
+        for item in groups_re.findall(title):
             if item not in unique_groups:
                 unique_groups.append(item)
         return "@".join(unique_groups)
+
+    def __check_custom_groups(self):
+        """
+        自定义组变化时重建前缀索引并清空正则缓存
+        """
+        custom_release_groups = self.systemconfig.get(SystemConfigKey.CustomReleaseGroups)
+        if isinstance(custom_release_groups, list):
+            custom_release_groups = list(filter(None, custom_release_groups))
+        elif custom_release_groups:
+            custom_release_groups = [custom_release_groups]
+        else:
+            custom_release_groups = []
+        if custom_release_groups == self._custom_groups:
+            return
+        groups = self._builtin_groups + custom_release_groups
+        prefix_index: Dict[str, List[Tuple[str, int]]] = {}
+        always_groups = []
+        for index, group in enumerate(groups):
+            prefix = self.__get_literal_prefix(group)
+            if prefix:
+                prefix_index.setdefault(prefix[0], []).append((prefix, index))
+            else:
+                always_groups.append(index)
+        with self._lock:
+            self._groups = groups
+            self._prefix_index = prefix_index
+            self._always_groups = always_groups
+            self._patterns = {}
+            self._custom_groups = custom_release_groups
+
+    def __get_candidates(self, title: str) -> Tuple[int, ...]:
+        """
+        获取标题中分隔符后出现了字面量前缀的组，以及没有字面量前缀的组，按组的原始顺序返回
+        """
+        lower_title = title.lower()
+        candidates = set(self._always_groups)
+        for match in self._delimiter_re.finditer(lower_title, endpos=len(lower_title) - 1):
+            pos = match.start()
+            for prefix, index in self._prefix_index.get(match.group(), []):
+                if lower_title.startswith(prefix, pos):
+                    candidates.add(index)
+        return tuple(sorted(candidates))
+
+    def __get_pattern(self, key: Union[Tuple[int, ...], str], groups: str) -> re.Pattern:
+        """
+        获取编译后的制作组正则
+        """
+        groups_re = self._patterns.get(key)
+        if groups_re is None:
+            groups_re = re.compile(r"(?<=[-@\[￡【&])(?:%s)(?=[@.\s\S\]\[】&])" % groups, re.I)
+            with self._lock:
+                if len(self._patterns) >= self._max_patterns:
+                    self._patterns.clear()
+                self._patterns[key] = groups_re
+        return groups_re
+
+    @staticmethod
+    def __get_literal_prefix(group: str) -> str:
+        """
+        获取组正则必须以之开头的小写字面量前缀，无法确定时返回空字符串
+        """
+        # 顶层存在分支时无法确定前缀
+        depth = 0
+        escaped = False
+        in_class = False
+        for char in group:
+            if escaped:
+                escaped = False
+            elif char == "\\":
+                escaped = True
+            elif in_class:
+                in_class = char != "]"
+            elif char == "[":
+                in_class = True
+            elif char == "(":
+                depth += 1
+            elif char == ")":
+                depth -= 1
+            elif char == "|" and depth == 0:
+                return ""
+        prefix = ""
+        for pos, char in enumerate(group):
+            if char in ".^$*+?{}[]\\|()":
+                break
+            # 后面跟着量词的字符不一定出现
+            if pos + 1 < len(group) and group[pos + 1] in "?*{":
+                break
+            prefix += char
+        return prefix.lower()
@@ -1,4 +1,5 @@
-from typing import List, Tuple
+import threading
+from typing import List, Tuple, Dict, Optional
 
 import cn2an
 import regex as re
@@ -10,9 +11,14 @@ from app.utils.singleton import Singleton
 
 
 class WordsMatcher(metaclass=Singleton):
+    # 编译后的识别词程序缓存最大数量
+    _max_programs = 64
 
     def __init__(self):
         self.systemconfig = SystemConfigOper()
+        self._lock = threading.Lock()
+        # 识别词列表 -> 编译后的识别词程序
+        self._programs: Dict[Tuple[str, ...], List[tuple]] = {}
 
     def prepare(self, title: str, custom_words: List[str] = None) -> Tuple[str, List[str]]:
         """
@@ -24,6 +30,58 @@ class WordsMatcher(metaclass=Singleton):
         appley_words = []
         # 读取自定义识别词
         words: List[str] = custom_words or self.systemconfig.get(SystemConfigKey.CustomIdentifiers) or []
+        for word, kind, args in self.__get_program(words):
+            try:
+                if kind == "replace_offset":
+                    replaced, replace, front, back, offset_re, offset = args
+                    # 替换词
+                    title, message, state = self.__replace_regex(title, replaced, replace)
+                    if state:
+                        # 替换词成功再进行集偏移
+                        title, message, state = self.__episode_offset(title, front, back, offset_re, offset)
+                elif kind == "replace":
+                    # 替换词、屏蔽词
+                    replaced, replace = args
+                    title, message, state = self.__replace_regex(title, replaced, replace)
+                else:
+                    # 集偏移
+                    front, back, offset_re, offset = args
+                    title, message, state = self.__episode_offset(title, front, back, offset_re, offset)
+
+                if state:
+                    appley_words.append(word)
+
+            except Exception as err:
+                logger.warn(f"自定义识别词 {word} 预处理标题失败：{str(err)} - 标题：{title}")
+
+        return title, appley_words
+
+    def __get_program(self, words: List[str]) -> List[tuple]:
+        """
+        获取识别词列表编译后的程序，同一识别词列表只编译一次，识别词变化后自动重新编译
+        """
+        key = tuple(words)
+        program = self._programs.get(key)
+        if program is None:
+            program = self.__compile(words)
+            with self._lock:
+                if len(self._programs) >= self._max_programs:
+                    self._programs.clear()
+                self._programs[key] = program
+        return program
+
+    @staticmethod
+    def __compile(words: List[str]) -> List[tuple]:
+        """
+        将识别词解析为 (识别词, 类型, 参数) 列表，正则表达式预先编译，无效的识别词会被忽略
+        """
+
+        def __compile_offset(_front: str, _back: str) -> tuple:
+            return (re.compile(r'%s' % _front) if _front else None,
+                    re.compile(r'%s' % _back) if _back else None,
+                    re.compile(r'(?<=%s.*?)[0-9一二三四五六七八九十]+(?=.*?%s)' % (_front, _back)))
+
+        program = []
         for word in words:
             if not word or word.startswith("#"):
                 continue
@@ -39,61 +97,50 @@ class WordsMatcher(metaclass=Singleton):
                     pyh = str(re.findall(r'<>(.*?)\s*>>', word)[0]).strip()
                     # 集偏移
                     offsets = str(re.findall(r'>>\s*(.*?)$', word)[0]).strip()
-                    # 替换词
-                    title, message, state = self.__replace_regex(title, thc, bthc)
-                    if state:
-                        # 替换词成功再进行集偏移
-                        title, message, state = self.__episode_offset(title, pyq, pyh, offsets)
+                    program.append((word, "replace_offset",
+                                    (re.compile(r'%s' % thc), r'%s' % bthc, *__compile_offset(pyq, pyh), offsets)))
                 elif word.count(" => "):
                     # 替换词
                     strings = word.split(" => ")
-                    title, message, state = self.__replace_regex(title, strings[0], strings[1])
+                    program.append((word, "replace", (re.compile(r'%s' % strings[0]), r'%s' % strings[1])))
                 elif word.count(" >> ") and word.count(" <> "):
                     # 集偏移
                     strings = word.split(" <> ")
                     offsets = strings[1].split(" >> ")
-                    strings[1] = offsets[0]
-                    title, message, state = self.__episode_offset(title, strings[0], strings[1], offsets[1])
+                    program.append((word, "offset", (*__compile_offset(strings[0], offsets[0]), offsets[1])))
                 else:
                     # 屏蔽词
                     if not word.strip():
                         continue
-                    title, message, state = self.__replace_regex(title, word, "")
-
-                if state:
-                    appley_words.append(word)
-
+                    program.append((word, "replace", (re.compile(r'%s' % word), "")))
             except Exception as err:
-                logger.warn(f"自定义识别词 {word} 预处理标题失败：{str(err)} - 标题：{title}")
-
-        return title, appley_words
+                logger.warn(f"自定义识别词 {word} 格式错误：{str(err)}")
+        return program
 
     @staticmethod
-    def __replace_regex(title: str, replaced: str, replace: str) -> Tuple[str, str, bool]:
+    def __replace_regex(title: str, replaced: re.Pattern, replace: str) -> Tuple[str, str, bool]:
         """
         正则替换
         """
         try:
-            if not re.findall(r'%s' % replaced, title):
-                return title, "", False
-            else:
-                return re.sub(r'%s' % replaced, r'%s' % replace, title), "", True
+            title, count = replaced.subn(replace, title)
+            return title, "", count > 0
         except Exception as err:
-            logger.warn(f"自定义识别词正则替换失败：{str(err)} - 标题：{title}，被替换词：{replaced}，替换词：{replace}")
+            logger.warn(f"自定义识别词正则替换失败：{str(err)} - 标题：{title}，被替换词：{replaced.pattern}，替换词：{replace}")
             return title, str(err), False
 
     @staticmethod
-    def __episode_offset(title: str, front: str, back: str, offset: str) -> Tuple[str, str, bool]:
+    def __episode_offset(title: str, front: Optional[re.Pattern], back: Optional[re.Pattern],
+                         offset_word_info_re: re.Pattern, offset: str) -> Tuple[str, str, bool]:
         """
         集数偏移
         """
         try:
-            if back and not re.findall(r'%s' % back, title):
+            if back and not back.search(title):
                 return title, "", False
-            if front and not re.findall(r'%s' % front, title):
+            if front and not front.search(title):
                 return title, "", False
-            offset_word_info_re = re.compile(r'(?<=%s.*?)[0-9一二三四五六七八九十]+(?=.*?%s)' % (front, back))
-            episode_nums_str = re.findall(offset_word_info_re, title)
+            episode_nums_str = offset_word_info_re.findall(title)
             if not episode_nums_str:
                 return title, "", False
             episode_nums_offset_str = []
@@ -127,9 +174,11 @@ class WordsMatcher(metaclass=Singleton):
                 episode_nums_list = sorted(episode_nums_dict.items(), key=lambda x: x[1], reverse=True)
             for episode_num in episode_nums_list:
                 episode_offset_re = re.compile(
-                    r'(?<=%s.*?)%s(?=.*?%s)' % (front, episode_num[0], back))
+                    r'(?<=%s.*?)%s(?=.*?%s)' % (front.pattern if front else "", episode_num[0],
+                                                back.pattern if back else ""))
                 title = re.sub(episode_offset_re, r'%s' % episode_num[1], title)
             return title, "", True
         except Exception as err:
-            logger.warn(f"自定义识别词集数偏移失败：{str(err)} - 标题：{title}，前定位词：{front}，后定位词：{back}，偏移量：{offset}")
+            logger.warn(f"自定义识别词集数偏移失败：{str(err)} - 标题：{title}，"
+                        f"前定位词：{front.pattern if front else ''}，后定位词：{back.pattern if back else ''}，偏移量：{offset}")
             return title, str(err), False
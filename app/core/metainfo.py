@@ -1,18 +1,120 @@
+import copy
+import threading
 from pathlib import Path
 from typing import Tuple, List, Optional
 
 import regex as re
+from cachetools import LRUCache
 
 from app.core.config import settings
 from app.core.meta import MetaAnime, MetaVideo, MetaBase
+from app.core.meta.customization import CustomizationMatcher
 from app.core.meta.words import WordsMatcher
+from app.db.systemconfig_oper import SystemConfigOper
 from app.log import logger
-from app.schemas.types import MediaType
+from app.schemas.types import MediaType, SystemConfigKey
+from app.utils.singleton import Singleton
+
+
+class MetaInfoCache(metaclass=Singleton):
+    """
+    元数据识别结果缓存，按 (标题, 副标题, 自定义识别词) 缓存，存取时均复制对象，避免调用方修改缓存内容
+    自定义识别词、自定义制作组或自定义占位符配置变化时清空缓存
+    """
+    # 最大缓存条数
+    _maxsize = 4096
+    # 影响识别结果的系统配置
+    _config_keys = (SystemConfigKey.CustomIdentifiers,
+                    SystemConfigKey.CustomReleaseGroups,
+                    SystemConfigKey.Customization)
+
+    def __init__(self):
+        self.systemconfig = SystemConfigOper()
+        self._lock = threading.Lock()
+        self._cache = LRUCache(maxsize=self._maxsize)
+        # 缓存对应的配置版本
+        self._config_version: Optional[Tuple[int, ...]] = None
+        self._hits = 0
+        self._misses = 0
+
+    def __check_config(self):
+        """
+        配置变化时清空缓存，并重置自定义占位符，只比较配置的修改次数，未变化时不加锁
+        """
+        config_version = tuple(self.systemconfig.version(key) for key in self._config_keys)
+        if config_version == self._config_version:
+            return
+        with self._lock:
+            if config_version == self._config_version:
+                return
+            if self._config_version is not None:
+                logger.info("识别相关配置已变化，清空元数据识别缓存")
+                CustomizationMatcher().customization = None
+            self._cache.clear()
+            self._config_version = config_version
+
+    def get(self, key: tuple) -> Optional[MetaBase]:
+        """
+        获取缓存的元数据副本，未命中时返回None
+        """
+        self.__check_config()
+        with self._lock:
+            meta = self._cache.get(key)
+            if meta is None:
+                self._misses += 1
+                return None
+            self._hits += 1
+        return copy.deepcopy(meta)
+
+    def set(self, key: tuple, meta: MetaBase):
+        """
+        缓存元数据副本
+        """
+        meta = copy.deepcopy(meta)
+        with self._lock:
+            self._cache[key] = meta
+
+    def clear(self):
+        """
+        清空缓存
+        """
+        with self._lock:
+            self._cache.clear()
+
+    def stats(self) -> dict:
+        """
+        缓存统计信息
+        """
+        with self._lock:
+            total = self._hits + self._misses
+            return {
+                "size": len(self._cache),
+                "maxsize": self._maxsize,
+                "hits": self._hits,
+                "misses": self._misses,
+                "hit_rate": round(self._hits / total, 4) if total else 0
+            }
 
 
 def MetaInfo(title: str, subtitle: Optional[str] = None, custom_words: List[str] = None) -> MetaBase:
     """
-    根据标题和副标题识别元数据
+    根据标题和副标题识别元数据，相同参数的识别结果会被缓存
+    :param title: 标题、种子名、文件名
+    :param subtitle: 副标题、描述
+    :param custom_words: 自定义识别词列表
+    :return: MetaAnime、MetaVideo
+    """
+    cache_key = (title, subtitle, tuple(custom_words) if custom_words else None)
+    meta = MetaInfoCache().get(cache_key)
+    if meta is None:
+        meta = parse_metainfo(title=title, subtitle=subtitle, custom_words=custom_words)
+        MetaInfoCache().set(cache_key, meta)
+    return meta
+
+
+def parse_metainfo(title: str, subtitle: Optional[str] = None, custom_words: List[str] = None) -> MetaBase:
+    """
+    根据标题和副标题识别元数据，不使用缓存
     :param title: 标题、种子名、文件名
     :param subtitle: 副标题、描述
     :param custom_words: 自定义识别词列表
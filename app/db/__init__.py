@@ -1,6 +1,8 @@
+import threading
+from contextlib import contextmanager
 from typing import Any, Generator, List, Optional, Self, Tuple
 
-from sqlalchemy import NullPool, QueuePool, and_, create_engine, inspect, text
+from sqlalchemy import NullPool, QueuePool, and_, create_engine, inspect, text, tuple_
 from sqlalchemy.orm import Session, as_declarative, declared_attr, scoped_session, sessionmaker
 
 from app.core.config import settings
@@ -42,6 +44,9 @@ SessionFactory = sessionmaker(bind=Engine)
 # 多线程全局使用的数据库会话
 ScopedSession = scoped_session(SessionFactory)
 
+# 当前线程的批量操作会话
+_batch_local = threading.local()
+
 
 def get_db() -> Generator:
     """
@@ -87,6 +92,38 @@ def close_database():
         print(f"Error while disposing database connections: {e}")
 
 
+def get_batch_db() -> Optional[Session]:
+    """
+    获取当前线程正在进行的批量操作会话
+    """
+    return getattr(_batch_local, "db", None)
+
+
+@contextmanager
+def db_batch() -> Generator[Session, None, None]:
+    """
+    批量操作上下文，上下文内未指定会话的 db_update/db_query 操作共用同一个会话，
+    db_update 不再逐个提交，退出上下文时统一提交一次，出错时全部回滚；嵌套使用时并入最外层的批量操作
+    :return: Session
+    """
+    db = get_batch_db()
+    if db is not None:
+        yield db
+        return
+    # 提交后不过期对象，退出上下文后仍可读取返回的数据
+    db = SessionFactory(expire_on_commit=False)
+    _batch_local.db = db
+    try:
+        yield db
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        _batch_local.db = None
+        db.close()
+
+
 def get_args_db(args: tuple, kwargs: dict) -> Optional[Session]:
     """
     从参数中获取数据库Session对象
@@ -130,12 +167,19 @@ def db_update(func):
         # 从参数中获取数据库会话
         db = get_args_db(args, kwargs)
         if not db:
+            batch_db = get_batch_db()
+            if batch_db is not None:
+                # 批量操作中，由批量操作统一提交
+                args, kwargs = update_args_db(args, kwargs, batch_db)
+                return func(*args, **kwargs)
             # 如果没有获取到数据库会话，创建一个
             db = ScopedSession()
             # 标记需要关闭数据库会话
             _close_db = True
             # 更新参数中的数据库会话
             args, kwargs = update_args_db(args, kwargs, db)
+        elif db is get_batch_db():
+            return func(*args, **kwargs)
         try:
             # 执行函数
             result = func(*args, **kwargs)
@@ -166,6 +210,11 @@ def db_query(func):
         # 从参数中获取数据库会话
         db = get_args_db(args, kwargs)
         if not db:
+            batch_db = get_batch_db()
+            if batch_db is not None:
+                # 批量操作中使用同一会话，可以查询到未提交的数据
+                args, kwargs = update_args_db(args, kwargs, batch_db)
+                return func(*args, **kwargs)
             # 如果没有获取到数据库会话，创建一个
             db = ScopedSession()
             # 标记需要关闭数据库会话
@@ -218,6 +267,44 @@ class Base:
     def truncate(cls, db: Session):
         db.query(cls).delete()
 
+    @classmethod
+    @db_update
+    def bulk_create(cls, db: Session, rows: List[dict]):
+        """
+        批量新增，不逐行构造对象，同一事务中提交
+        """
+        for i in range(0, len(rows), 1000):
+            db.bulk_insert_mappings(cls, rows[i:i + 1000])
+
+    @classmethod
+    @db_update
+    def bulk_upsert(cls, db: Session, rows: List[dict], keys: List[str]) -> Tuple[int, int]:
+        """
+        批量新增或更新，按keys字段匹配已有数据，已存在的更新（同一键有多条时更新第一条），不存在的新增
+        :param rows: 数据
+        :param keys: 用于匹配的字段
+        :return: 新增数量、更新数量
+        """
+        columns = [getattr(cls, key) for key in keys]
+        values = list({tuple(row.get(key) for key in keys) for row in rows})
+        existing = {}
+        for i in range(0, len(values), 500):
+            for row in db.query(cls.id, *columns).filter(tuple_(*columns).in_(values[i:i + 500])) \
+                    .order_by(cls.id).all():
+                existing.setdefault(tuple(row[1:]), row[0])
+        inserts, updates = {}, {}
+        for row in rows:
+            value = tuple(row.get(key) for key in keys)
+            if value in existing:
+                updates[value] = {**row, "id": existing[value]}
+            else:
+                inserts[value] = row
+        if inserts:
+            db.bulk_insert_mappings(cls, list(inserts.values()))
+        if updates:
+            db.bulk_update_mappings(cls, list(updates.values()))
+        return len(inserts), len(updates)
+
     @classmethod
     @db_query
     def list(cls, db: Session) -> List[Self]:
@@ -1,4 +1,4 @@
-from typing import List, Optional
+from typing import List, Optional, Dict
 
 from app.db import DbOper
 from app.db.models.downloadhistory import DownloadHistory, DownloadFiles
@@ -23,6 +23,17 @@ class DownloadHistoryOper(DbOper):
         """
         return DownloadHistory.get_by_hash(self._db, download_hash)
 
+    def get_by_hashes(self, download_hashes: List[str]) -> Dict[str, DownloadHistory]:
+        """
+        按Hash批量查询下载记录，同一Hash有多条记录时与 get_by_hash 一样取最新的一条
+        :param download_hashes: Hash列表
+        :return: Hash -> 下载记录
+        """
+        histories = {}
+        for history in DownloadHistory.list_by_hashes(self._db, list(set(download_hashes))) or []:
+            histories.setdefault(history.download_hash, history)
+        return histories
+
     def get_by_mediaid(self, tmdbid: int, doubanid: str) -> List[DownloadHistory]:
         """
         按媒体ID查询下载记录
@@ -39,11 +50,9 @@ class DownloadHistoryOper(DbOper):
 
     def add_files(self, file_items: List[dict]):
         """
-        新增下载历史文件
+        新增下载历史文件，在同一事务中批量写入
         """
-        for file_item in file_items:
-            downloadfile = DownloadFiles(**file_item)
-            downloadfile.create(self._db)
+        DownloadFiles.bulk_create(self._db, file_items)
 
     def truncate_files(self):
         """
@@ -66,6 +75,17 @@ class DownloadHistoryOper(DbOper):
         """
         return DownloadFiles.get_by_fullpath(self._db, fullpath=fullpath, all_files=False)
 
+    def get_files_by_fullpaths(self, fullpaths: List[str]) -> Dict[str, DownloadFiles]:
+        """
+        按fullpath批量查询下载文件记录，同一路径有多条记录时与 get_file_by_fullpath 一样取最新的一条
+        :param fullpaths: 文件全路径列表
+        :return: 文件全路径 -> 下载文件记录
+        """
+        files = {}
+        for file in DownloadFiles.list_by_fullpaths(self._db, list(set(fullpaths))) or []:
+            files.setdefault(file.fullpath, file)
+        return files
+
     def get_files_by_fullpath(self, fullpath: str) -> List[DownloadFiles]:
         """
         按fullpath查询下载文件记录
@@ -1,9 +1,174 @@
-from typing import Optional
+import threading
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Set, Tuple
 
 from sqlalchemy.orm import Session
 
 from app.db import DbOper
 from app.db.models.mediaserver import MediaServerItem
+from app.log import logger
+from app.utils.singleton import Singleton
+
+
+class MediaServerIndex(metaclass=Singleton):
+    """
+    媒体服务器数据的内存索引，按 TMDBID+类型 和 标题+类型+年份 查找条目，条目的季存为集合
+    首次使用时在后台从数据库加载，加载完成前由调用方回退到数据库查询；同步和Webhook入库事件后更新
+    """
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        # 是否已加载
+        self._loaded = False
+        # 是否正在加载
+        self._loading = False
+        # 修改次数，加载期间索引被修改时重新读取
+        self._version = 0
+        # item_id -> 条目
+        self._items: Dict[str, MediaServerItem] = {}
+        # item_id -> 季号集合
+        self._seasons: Dict[str, Set[int]] = {}
+        # (TMDBID, 类型) -> [item_id]
+        self._tmdb_index: Dict[Tuple[int, str], List[str]] = {}
+        # (标题, 类型, 年份) -> [item_id]
+        self._title_index: Dict[Tuple[str, str, str], List[str]] = {}
+
+    @property
+    def loaded(self) -> bool:
+        return self._loaded
+
+    @staticmethod
+    def __get_seasons(seasoninfo: Optional[dict]) -> Set[int]:
+        """
+        季号集合，数据库中JSON的键为字符串
+        """
+        seasons = set()
+        for season in (seasoninfo or {}).keys():
+            try:
+                seasons.add(int(season))
+            except (TypeError, ValueError):
+                continue
+        return seasons
+
+    @staticmethod
+    def __title_key(title: Optional[str], mtype: Optional[str], year: Any) -> Tuple[str, str, str]:
+        return title, mtype, str(year)
+
+    def load(self):
+        """
+        从数据库重新加载索引，读取期间索引被修改时重新读取，避免用旧数据覆盖期间的修改
+        """
+        for _ in range(3):
+            with self._lock:
+                self._loading = True
+                version = self._version
+            try:
+                rows = MediaServerItem.list_all(None)
+            except Exception as err:
+                logger.error(f"加载媒体服务器数据索引失败：{str(err)}")
+                break
+            with self._lock:
+                if version != self._version:
+                    continue
+                self._items.clear()
+                self._seasons.clear()
+                self._tmdb_index.clear()
+                self._title_index.clear()
+                for row in rows:
+                    self.__add(row)
+                self._loaded = True
+                self._loading = False
+            logger.info(f"媒体服务器数据索引加载完成，共 {len(rows)} 个条目")
+            return
+        else:
+            logger.warn("媒体服务器数据索引加载期间数据持续变化，稍后重新加载")
+        with self._lock:
+            self._loading = False
+
+    def load_async(self):
+        """
+        在后台加载索引，已加载或正在加载时不重复加载
+        """
+        with self._lock:
+            if self._loaded or self._loading:
+                return
+            self._loading = True
+        threading.Thread(target=self.load, daemon=True).start()
+
+    def __add(self, item: MediaServerItem):
+        if not item.item_id or item.item_id in self._items:
+            return
+        self._items[item.item_id] = item
+        self._seasons[item.item_id] = self.__get_seasons(item.seasoninfo)
+        if item.tmdbid:
+            self._tmdb_index.setdefault((item.tmdbid, item.item_type), []).append(item.item_id)
+        if item.title:
+            self._title_index.setdefault(self.__title_key(item.title, item.item_type, item.year),
+                                         []).append(item.item_id)
+
+    def __remove(self, item_id: str):
+        item = self._items.pop(item_id, None)
+        if not item:
+            return
+        self._seasons.pop(item_id, None)
+        for index, key in ((self._tmdb_index, (item.tmdbid, item.item_type)),
+                           (self._title_index, self.__title_key(item.title, item.item_type, item.year))):
+            item_ids = index.get(key)
+            if item_ids and item_id in item_ids:
+                item_ids.remove(item_id)
+                if not item_ids:
+                    index.pop(key, None)
+
+    def update(self, item: MediaServerItem):
+        """
+        新增或更新条目，未加载时忽略，加载时会读取到最新数据
+        """
+        with self._lock:
+            self._version += 1
+            if not self._loaded:
+                return
+            self.__remove(item.item_id)
+            self.__add(item)
+
+    def remove(self, item_id: str):
+        """
+        删除条目
+        """
+        with self._lock:
+            self._version += 1
+            if self._loaded:
+                self.__remove(item_id)
+
+    def clear(self):
+        """
+        清空索引，下次使用时重新加载
+        """
+        with self._lock:
+            self._version += 1
+            self._loaded = False
+            self._items.clear()
+            self._seasons.clear()
+            self._tmdb_index.clear()
+            self._title_index.clear()
+
+    def exists(self, tmdbid: Optional[int] = None, title: Optional[str] = None, mtype: Optional[str] = None,
+               year: Any = None, season: Optional[int] = None) -> Optional[MediaServerItem]:
+        """
+        查找条目，优先按TMDBID查找，否则按标题、类型、年份查找，指定季时季须存在
+        """
+        with self._lock:
+            if tmdbid:
+                item_ids = self._tmdb_index.get((tmdbid, mtype))
+            elif title:
+                item_ids = self._title_index.get(self.__title_key(title, mtype, year))
+            else:
+                return None
+            if not item_ids:
+                return None
+            item_id = item_ids[0]
+            if season and int(season) not in self._seasons.get(item_id, set()):
+                return None
+            return self._items.get(item_id)
 
 
 class MediaServerOper(DbOper):
@@ -18,24 +183,143 @@ class MediaServerOper(DbOper):
         """
         新增媒体服务器数据
         """
+        return self.add_items([kwargs]) > 0
+
+    def add_items(self, items: List[dict]) -> int:
+        """
+        批量新增媒体服务器数据，已存在的item_id不重复新增，一次查询已有条目并在同一事务中写入；
+        没有item_id的数据无法去重和增量同步，不新增
+        :param items: 媒体服务器数据
+        :return: 新增数量
+        """
+        rows = {}
+        for item in items:
+            # MediaServerItem中没有的属性剔除
+            item = {k: v for k, v in item.items() if hasattr(MediaServerItem, k)}
+            if not item.get("item_id"):
+                logger.warn(f"媒体服务器数据缺少item_id，跳过：{item.get('title')}")
+                continue
+            rows.setdefault(item.get("item_id"), item)
+        if not rows:
+            return 0
+        existing = set(MediaServerItem.list_itemids(self._db, list(rows)) or [])
+        inserts = [item for item_id, item in rows.items() if item_id not in existing]
+        if not inserts:
+            return 0
+        MediaServerItem.bulk_create(self._db, inserts)
+        for item in inserts:
+            MediaServerIndex().update(MediaServerItem(**item))
+        return len(inserts)
+
+    @staticmethod
+    def __normalize(value: Any) -> Any:
+        """
+        统一数据库与媒体服务器数据的格式，JSON字段的键在数据库中为字符串
+        """
+        if value is None:
+            return None
+        if isinstance(value, dict):
+            return {str(k): v for k, v in value.items()}
+        if isinstance(value, (list, bool)):
+            return value
+        return str(value)
+
+    def sync(self, items: List[dict], unchanged: Set[str] = None,
+             delete_vanished: bool = True) -> Tuple[int, int, int]:
+        """
+        增量同步媒体服务器数据：按item_id比对，只写入有变化的条目，删除已不存在的条目，所有变更在同一事务中提交
+        :param items: 本次同步获取到的有变化或无法判断是否变化的媒体服务器数据
+        :param unchanged: 本次同步确认未变化的item_id，保留原有数据
+        :param delete_vanished: 是否删除本次未获取到的条目
+        :return: 新增、更新、删除数量
+        """
+        existing: Dict[str, MediaServerItem] = {}
+        # 重复的条目只保留一条
+        deletes = []
+        for row in MediaServerItem.list_all(self._db):
+            if row.item_id in existing:
+                deletes.append(row.id)
+            else:
+                existing[row.item_id] = row
+        seen = set(unchanged or [])
+        inserts, updates = [], []
+        lst_mod_date = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        for item in items:
+            # MediaServerItem中没有的属性剔除
+            item = {k: v for k, v in item.items() if k != "id" and hasattr(MediaServerItem, k)}
+            item_id = item.get("item_id")
+            if not item_id or item_id in seen:
+                continue
+            seen.add(item_id)
+            # 媒体服务器未提供变化时间时不参与比对，写入时记录同步时间
+            if not item.get("lst_mod_date"):
+                item.pop("lst_mod_date", None)
+            row = existing.get(item_id)
+            if not row:
+                inserts.append({"lst_mod_date": lst_mod_date, **item})
+            elif any(self.__normalize(getattr(row, k)) != self.__normalize(v) for k, v in item.items()):
+                updates.append({"lst_mod_date": lst_mod_date, **item, "id": row.id})
+        if delete_vanished:
+            deletes.extend(row.id for item_id, row in existing.items() if item_id not in seen)
+        if inserts or updates or deletes:
+            MediaServerItem.sync(self._db, inserts=inserts, updates=updates, deletes=deletes)
+            # 重建内存索引
+            MediaServerIndex().load()
+        return len(inserts), len(updates), len(deletes)
+
+    def sync_item(self, item: dict) -> bool:
+        """
+        新增或更新单个媒体服务器条目，并更新内存索引
+        :param item: 媒体服务器数据
+        :return: 是否有变化
+        """
         # MediaServerItem中没有的属性剔除
-        kwargs = {k: v for k, v in kwargs.items() if hasattr(MediaServerItem, k)}
-        item = MediaServerItem(**kwargs)
-        if not item.get_by_itemid(self._db, kwargs.get("item_id")):
-            item.create(self._db)
-            return True
-        return False
+        item = {k: v for k, v in item.items() if k != "id" and hasattr(MediaServerItem, k)}
+        if not item.get("item_id"):
+            return False
+        if not item.get("lst_mod_date"):
+            item["lst_mod_date"] = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        row = MediaServerItem.get_by_itemid(self._db, item.get("item_id"))
+        if not row:
+            MediaServerItem(**item).create(self._db)
+        elif any(self.__normalize(getattr(row, k)) != self.__normalize(v)
+                 for k, v in item.items() if k != "lst_mod_date"):
+            row.update(self._db, item)
+        else:
+            return False
+        MediaServerIndex().update(MediaServerItem(**item))
+        return True
+
+    def delete_by_itemid(self, item_id: str):
+        """
+        删除媒体服务器条目，并更新内存索引
+        """
+        MediaServerItem.delete_by_itemid(self._db, item_id)
+        MediaServerIndex().remove(item_id)
+
+    def list_sync_dates(self) -> Dict[str, Optional[str]]:
+        """
+        获取已同步条目的最后变化时间
+        :return: item_id -> lst_mod_date
+        """
+        return dict(MediaServerItem.list_sync_dates(self._db))
 
     def empty(self, server: Optional[str] = None):
         """
         清空媒体服务器数据
         """
         MediaServerItem.empty(self._db, server)
+        MediaServerIndex().clear()
 
     def exists(self, **kwargs) -> Optional[MediaServerItem]:
         """
-        判断媒体服务器数据是否存在
+        判断媒体服务器数据是否存在，内存索引已加载时直接查找索引，否则查询数据库并在后台加载索引
         """
+        index = MediaServerIndex()
+        if index.loaded:
+            return index.exists(tmdbid=kwargs.get("tmdbid"), title=kwargs.get("title"), mtype=kwargs.get("mtype"),
+                                year=kwargs.get("year"), season=kwargs.get("season"))
+        index.load_async()
         if kwargs.get("tmdbid"):
             # 优先按TMDBID查
             item = MediaServerItem.exist_by_tmdbid(self._db, tmdbid=kwargs.get("tmdbid"),
@@ -54,7 +338,8 @@ class MediaServerOper(DbOper):
             if not item.seasoninfo:
                 return None
             seasoninfo = item.seasoninfo or {}
-            if kwargs.get("season") not in seasoninfo.keys():
+            # 数据库中JSON的键为字符串
+            if str(kwargs.get("season")) not in [str(season) for season in seasoninfo.keys()]:
                 return None
         return item
 
@@ -1,5 +1,5 @@
 import time
-from typing import Optional
+from typing import Optional, List
 
 from sqlalchemy import Column, Integer, String, Sequence, JSON
 from sqlalchemy.orm import Session
@@ -62,6 +62,19 @@ class DownloadHistory(Base):
             DownloadHistory.date.desc()
         ).first()
 
+    @staticmethod
+    @db_query
+    def list_by_hashes(db: Session, download_hashes: List[str]):
+        """
+        按Hash批量查询下载记录，按日期降序返回
+        """
+        result = []
+        for i in range(0, len(download_hashes), 500):
+            result.extend(db.query(DownloadHistory).filter(
+                DownloadHistory.download_hash.in_(download_hashes[i:i + 500])
+            ).order_by(DownloadHistory.date.desc()).all())
+        return result
+
     @staticmethod
     @db_query
     def get_by_mediaid(db: Session, tmdbid: int, doubanid: str):
@@ -219,6 +232,19 @@ class DownloadFiles(Base):
             return db.query(DownloadFiles).filter(DownloadFiles.fullpath == fullpath).order_by(
                 DownloadFiles.id.desc()).all()
 
+    @staticmethod
+    @db_query
+    def list_by_fullpaths(db: Session, fullpaths: List[str]):
+        """
+        按fullpath批量查询下载文件记录，按ID降序返回
+        """
+        result = []
+        for i in range(0, len(fullpaths), 500):
+            result.extend(db.query(DownloadFiles).filter(
+                DownloadFiles.fullpath.in_(fullpaths[i:i + 500])
+            ).order_by(DownloadFiles.id.desc()).all())
+        return result
+
     @staticmethod
     @db_query
     def get_by_savepath(db: Session, savepath: str):
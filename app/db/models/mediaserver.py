@@ -1,5 +1,5 @@
 from datetime import datetime
-from typing import Optional
+from typing import List, Optional
 
 from sqlalchemy import Column, Integer, String, Sequence, JSON
 from sqlalchemy.orm import Session
@@ -46,6 +46,24 @@ class MediaServerItem(Base):
     def get_by_itemid(db: Session, item_id: str):
         return db.query(MediaServerItem).filter(MediaServerItem.item_id == item_id).first()
 
+    @staticmethod
+    @db_query
+    def list_itemids(db: Session, item_ids: List[str]):
+        """
+        查询已存在的item_id
+        """
+        result = []
+        for i in range(0, len(item_ids), 500):
+            result.extend(row[0] for row in db.query(MediaServerItem.item_id).filter(
+                MediaServerItem.item_id.in_(item_ids[i:i + 500])
+            ).all())
+        return result
+
+    @staticmethod
+    @db_update
+    def delete_by_itemid(db: Session, item_id: str):
+        db.query(MediaServerItem).filter(MediaServerItem.item_id == item_id).delete()
+
     @staticmethod
     @db_update
     def empty(db: Session, server: Optional[str] = None):
@@ -54,6 +72,31 @@ class MediaServerItem(Base):
         else:
             db.query(MediaServerItem).filter(MediaServerItem.server == server).delete()
 
+    @staticmethod
+    @db_query
+    def list_all(db: Session):
+        return list(db.query(MediaServerItem).order_by(MediaServerItem.id).all())
+
+    @staticmethod
+    @db_query
+    def list_sync_dates(db: Session):
+        return list(db.query(MediaServerItem.item_id, MediaServerItem.lst_mod_date).all())
+
+    @staticmethod
+    @db_update
+    def sync(db: Session, inserts: List[dict], updates: List[dict], deletes: List[int]):
+        """
+        在同一事务中批量新增、更新和删除，提交前查询仍然得到原有数据
+        """
+        if inserts:
+            db.bulk_insert_mappings(MediaServerItem, inserts)
+        if updates:
+            db.bulk_update_mappings(MediaServerItem, updates)
+        for i in range(0, len(deletes), 500):
+            db.query(MediaServerItem).filter(
+                MediaServerItem.id.in_(deletes[i:i + 500])
+            ).delete(synchronize_session=False)
+
     @staticmethod
     @db_query
     def exist_by_tmdbid(db: Session, tmdbid: int, mtype: str):
@@ -1,5 +1,5 @@
 import time
-from typing import Optional
+from typing import Optional, List
 
 from sqlalchemy import Column, Integer, String, Sequence, Boolean, func, or_, JSON
 from sqlalchemy.orm import Session
@@ -107,6 +107,20 @@ class TransferHistory(Base):
         else:
             return db.query(TransferHistory).filter(TransferHistory.src == src).first()
 
+    @staticmethod
+    @db_query
+    def list_by_srcs(db: Session, srcs: List[str], storage: Optional[str] = None):
+        """
+        按源路径批量查询转移记录，按ID升序返回
+        """
+        result = []
+        for i in range(0, len(srcs), 500):
+            query = db.query(TransferHistory).filter(TransferHistory.src.in_(srcs[i:i + 500]))
+            if storage:
+                query = query.filter(TransferHistory.src_storage == storage)
+            result.extend(query.order_by(TransferHistory.id).all())
+        return result
+
     @staticmethod
     @db_query
     def get_by_dest(db: Session, dest: str):
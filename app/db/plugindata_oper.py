@@ -1,6 +1,6 @@
 from typing import Any, Optional
 
-from app.db import DbOper
+from app.db import DbOper, db_batch
 from app.db.models.plugindata import PluginData
 
 
@@ -16,13 +16,14 @@ class PluginDataOper(DbOper):
         :param key: 数据key
         :param value: 数据值
         """
-        plugin = PluginData.get_plugin_data_by_key(self._db, plugin_id, key)
-        if plugin:
-            plugin.update(self._db, {
-                "value": value
-            })
-        else:
-            PluginData(plugin_id=plugin_id, key=key, value=value).create(self._db)
+        with db_batch():
+            plugin = PluginData.get_plugin_data_by_key(self._db, plugin_id, key)
+            if plugin:
+                plugin.update(self._db, {
+                    "value": value
+                })
+            else:
+                PluginData(plugin_id=plugin_id, key=key, value=value).create(self._db)
 
     def get_data(self, plugin_id: str, key: Optional[str] = None) -> Any:
         """
@@ -9,6 +9,8 @@ from app.utils.singleton import Singleton
 class SystemConfigOper(DbOper, metaclass=Singleton):
     # 配置对象
     __SYSTEMCONF: dict = {}
+    # 各配置的修改次数，用于低成本判断配置是否变化
+    __VERSIONS: dict = {}
 
     def __init__(self):
         """
@@ -26,6 +28,7 @@ class SystemConfigOper(DbOper, metaclass=Singleton):
             key = key.value
         # 更新内存
         self.__SYSTEMCONF[key] = value
+        self.__VERSIONS[key] = self.__VERSIONS.get(key, 0) + 1
         conf = SystemConfig.get_by_key(self._db, key)
         if conf:
             if value:
@@ -46,6 +49,14 @@ class SystemConfigOper(DbOper, metaclass=Singleton):
             return self.__SYSTEMCONF
         return self.__SYSTEMCONF.get(key)
 
+    def version(self, key: Union[str, SystemConfigKey]) -> int:
+        """
+        获取系统设置的修改次数，每次设置或删除后变化
+        """
+        if isinstance(key, SystemConfigKey):
+            key = key.value
+        return self.__VERSIONS.get(key, 0)
+
     def all(self):
         """
         获取所有系统设置
@@ -60,6 +71,7 @@ class SystemConfigOper(DbOper, metaclass=Singleton):
             key = key.value
         # 更新内存
         self.__SYSTEMCONF.pop(key, None)
+        self.__VERSIONS[key] = self.__VERSIONS.get(key, 0) + 1
         # 写入数据库
         conf = SystemConfig.get_by_key(self._db, key)
         if conf:
@@ -1,9 +1,9 @@
 import time
-from typing import Any, List, Optional
+from typing import Any, List, Optional, Dict
 
 from app.core.context import MediaInfo
 from app.core.meta import MetaBase
-from app.db import DbOper
+from app.db import DbOper, db_batch
 from app.db.models.transferhistory import TransferHistory
 from app.schemas import TransferInfo, FileItem
 
@@ -35,6 +35,18 @@ class TransferHistoryOper(DbOper):
         """
         return TransferHistory.get_by_src(self._db, src, storage)
 
+    def get_by_srcs(self, srcs: List[str], storage: Optional[str] = None) -> Dict[str, TransferHistory]:
+        """
+        按源批量查询转移记录，同一源有多条记录时与 get_by_src 一样取第一条
+        :param srcs: 源路径列表
+        :param storage: 存储类型
+        :return: 源路径 -> 转移记录
+        """
+        histories = {}
+        for history in TransferHistory.list_by_srcs(self._db, list(set(srcs)), storage) or []:
+            histories.setdefault(history.src, history)
+        return histories
+
     def get_by_dest(self, dest: str) -> TransferHistory:
         """
         按转移路径查询转移记录
@@ -101,17 +113,18 @@ class TransferHistoryOper(DbOper):
 
     def add_force(self, **kwargs) -> TransferHistory:
         """
-        新增转移历史，相同源目录的记录会被删除
-        """
-        if kwargs.get("src"):
-            transferhistory = TransferHistory.get_by_src(self._db, kwargs.get("src"))
-            if transferhistory:
-                transferhistory.delete(self._db, transferhistory.id)
-        kwargs.update({
-            "date": time.strftime("%Y-%m-%d %H:%M:%S", time.localtime())
-        })
-        TransferHistory(**kwargs).create(self._db)
-        return TransferHistory.get_by_src(self._db, kwargs.get("src"))
+        新增转移历史，相同源目录的记录会被删除，删除和新增在同一事务中提交
+        """
+        with db_batch():
+            if kwargs.get("src"):
+                transferhistory = TransferHistory.get_by_src(self._db, kwargs.get("src"))
+                if transferhistory:
+                    transferhistory.delete(self._db, transferhistory.id)
+            kwargs.update({
+                "date": time.strftime("%Y-%m-%d %H:%M:%S", time.localtime())
+            })
+            TransferHistory(**kwargs).create(self._db)
+            return TransferHistory.get_by_src(self._db, kwargs.get("src"))
 
     def update_download_hash(self, historyid, download_hash):
         """
@@ -0,0 +1,122 @@
+import pickle
+import sqlite3
+import threading
+import time
+import traceback
+from pathlib import Path
+from typing import Dict, Iterable, Optional
+
+from app.log import logger
+
+
+class MetaCacheStore:
+    """
+    识别缓存的持久化存储，基于 SQLite 按条目读写，支持按键读取、批量写入和按媒体ID删除
+    """
+
+    def __init__(self, path: Path):
+        """
+        :param path: 数据库文件路径
+        """
+        self._path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(str(path), check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute("CREATE TABLE IF NOT EXISTS meta_cache ("
+                           "key TEXT PRIMARY KEY, mediaid TEXT, expire INTEGER, value BLOB)")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS ix_meta_cache_mediaid ON meta_cache (mediaid)")
+
+    def count(self) -> int:
+        """
+        缓存条目数
+        """
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM meta_cache").fetchone()[0]
+
+    def get(self, key: str) -> Optional[dict]:
+        """
+        读取单个缓存条目
+        """
+        with self._lock:
+            row = self._conn.execute("SELECT value FROM meta_cache WHERE key = ?", (key,)).fetchone()
+        if not row:
+            return None
+        try:
+            return pickle.loads(row[0])
+        except Exception as e:
+            logger.error(f"读取缓存 {key} 失败：{str(e)}")
+            return None
+
+    def save(self, items: Dict[str, dict], deletes: Iterable[str] = None, expire_key: str = None):
+        """
+        在一个事务中批量写入和删除缓存条目
+        :param items: 需要写入的条目，key -> 缓存信息
+        :param deletes: 需要删除的条目key
+        :param expire_key: 缓存信息中过期时间的字段名
+        """
+        rows = [(key, str(info.get("id")), info.get(expire_key) if expire_key else None,
+                 pickle.dumps(info, pickle.HIGHEST_PROTOCOL))
+                for key, info in items.items()]
+        deletes = [(key,) for key in deletes or []]
+        if not rows and not deletes:
+            return
+        with self._lock:
+            try:
+                self._conn.execute("BEGIN")
+                if deletes:
+                    self._conn.executemany("DELETE FROM meta_cache WHERE key = ?", deletes)
+                if rows:
+                    self._conn.executemany("INSERT OR REPLACE INTO meta_cache (key, mediaid, expire, value) "
+                                           "VALUES (?, ?, ?, ?)", rows)
+                self._conn.execute("COMMIT")
+            except Exception as e:
+                self._conn.execute("ROLLBACK")
+                logger.error(f"保存缓存失败：{str(e)} - {traceback.format_exc()}")
+
+    def delete_by_mediaid(self, mediaid) -> None:
+        """
+        删除指定媒体ID的所有缓存条目
+        """
+        with self._lock:
+            self._conn.execute("DELETE FROM meta_cache WHERE mediaid = ?", (str(mediaid),))
+
+    def delete_expired(self) -> int:
+        """
+        删除已过期的缓存条目
+        :return: 删除的条目数
+        """
+        with self._lock:
+            return self._conn.execute("DELETE FROM meta_cache WHERE expire IS NOT NULL AND expire <= ?",
+                                      (int(time.time()),)).rowcount
+
+    def clear(self) -> None:
+        """
+        清空缓存
+        """
+        with self._lock:
+            self._conn.execute("DELETE FROM meta_cache")
+
+    def migrate(self, legacy_path: Path, expire_key: str = None) -> None:
+        """
+        导入旧版本的 pickle 缓存文件，导入成功后删除旧文件
+        :param legacy_path: 旧缓存文件路径
+        :param expire_key: 缓存信息中过期时间的字段名
+        """
+        if not legacy_path.exists():
+            return
+        try:
+            with open(legacy_path, 'rb') as f:
+                data: dict = pickle.load(f)
+            self.save({k: v for k, v in data.items() if v and v.get("id")}, expire_key=expire_key)
+            legacy_path.unlink()
+            logger.info(f"已导入旧缓存文件 {legacy_path.name}，共 {len(data)} 条")
+        except Exception as e:
+            logger.error(f"导入旧缓存文件 {legacy_path} 失败：{str(e)} - {traceback.format_exc()}")
+
+    def close(self) -> None:
+        """
+        关闭数据库连接
+        """
+        with self._lock:
+            self._conn.close()
@@ -0,0 +1,94 @@
+import pickle
+import sqlite3
+import threading
+import traceback
+from pathlib import Path
+from typing import Dict, Iterable
+
+from app.log import logger
+
+
+class SnapshotStore:
+    """
+    远程存储目录快照的持久化存储，基于 SQLite 按目录存储遍历结果，
+    每个目录一行，只写入发生变化的目录，重启后可继续基于上次快照比较
+    """
+
+    def __init__(self, path: Path):
+        """
+        :param path: 数据库文件路径
+        """
+        self._path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(str(path), check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute("CREATE TABLE IF NOT EXISTS snapshot ("
+                           "storage TEXT, root TEXT, path TEXT, value BLOB, "
+                           "PRIMARY KEY (storage, root, path))")
+
+    def load(self, storage: str, root: str) -> Dict[str, dict]:
+        """
+        加载监控目录的快照
+        :param storage: 存储类型
+        :param root: 监控目录
+        :return: 目录路径 -> 目录记录
+        """
+        with self._lock:
+            rows = self._conn.execute("SELECT path, value FROM snapshot WHERE storage = ? AND root = ?",
+                                      (storage, root)).fetchall()
+        dirs = {}
+        for path, value in rows:
+            try:
+                dirs[path] = pickle.loads(value)
+            except Exception as err:
+                logger.error(f"加载目录快照 {path} 出错：{str(err)}")
+        return dirs
+
+    def save(self, storage: str, root: str, items: Dict[str, dict], deletes: Iterable[str] = None) -> None:
+        """
+        在一个事务中写入变化的目录记录并删除已不存在的目录
+        :param storage: 存储类型
+        :param root: 监控目录
+        :param items: 需要写入的目录记录，目录路径 -> 目录记录
+        :param deletes: 需要删除的目录路径
+        """
+        rows = [(storage, root, path, pickle.dumps(record, pickle.HIGHEST_PROTOCOL))
+                for path, record in items.items()]
+        deletes = [(storage, root, path) for path in deletes or []]
+        if not rows and not deletes:
+            return
+        with self._lock:
+            try:
+                self._conn.execute("BEGIN")
+                if deletes:
+                    self._conn.executemany("DELETE FROM snapshot WHERE storage = ? AND root = ? AND path = ?",
+                                           deletes)
+                if rows:
+                    self._conn.executemany("INSERT OR REPLACE INTO snapshot (storage, root, path, value) "
+                                           "VALUES (?, ?, ?, ?)", rows)
+                self._conn.execute("COMMIT")
+            except Exception as err:
+                self._conn.execute("ROLLBACK")
+                logger.error(f"保存目录快照出错：{str(err)} - {traceback.format_exc()}")
+
+    def clear(self, storage: str = None, root: str = None) -> None:
+        """
+        清除快照
+        :param storage: 存储类型，为空时清除全部
+        :param root: 监控目录，为空时清除该存储的全部
+        """
+        with self._lock:
+            if not storage:
+                self._conn.execute("DELETE FROM snapshot")
+            elif not root:
+                self._conn.execute("DELETE FROM snapshot WHERE storage = ?", (storage,))
+            else:
+                self._conn.execute("DELETE FROM snapshot WHERE storage = ? AND root = ?", (storage, root))
+
+    def close(self) -> None:
+        """
+        关闭数据库连接
+        """
+        with self._lock:
+            self._conn.close()
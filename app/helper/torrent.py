@@ -1,7 +1,7 @@
 import datetime
 import re
 from pathlib import Path
-from typing import Tuple, Optional, List, Union, Dict
+from typing import Tuple, Optional, List, Set, Union, Dict
 from urllib.parse import unquote
 
 from requests import Response
@@ -26,7 +26,7 @@ class TorrentHelper(metaclass=Singleton):
     """
 
     # 失败的种子：站点链接
-    _invalid_torrents = []
+    _invalid_torrents: Set[str] = set()
 
     def __init__(self):
         self.system_config = SystemConfigOper()
@@ -307,8 +307,13 @@ class TorrentHelper(metaclass=Singleton):
         """
         添加无效种子
         """
-        if url not in self._invalid_torrents:
-            self._invalid_torrents.append(url)
+        self._invalid_torrents.add(url)
+
+    def get_invalid_torrents(self) -> Set[str]:
+        """
+        获取所有无效种子的站点链接
+        """
+        return self._invalid_torrents
 
     @staticmethod
     def match_torrent(mediainfo: MediaInfo, torrent_meta: MetaInfo, torrent: TorrentInfo) -> bool:
@@ -0,0 +1,173 @@
+import copy
+import hashlib
+import pickle
+import sqlite3
+import threading
+import traceback
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional
+
+from app.core.context import Context
+from app.log import logger
+
+# 存储格式版本，格式变化时递增，版本不一致的缓存直接丢弃重建
+SCHEMA_VERSION = 1
+
+
+class TorrentsCacheStore:
+    """
+    站点种子缓存的持久化存储，基于 SQLite：
+    - 每个种子一行，按站点域名和写入顺序存储识别元数据和种子信息
+    - 媒体信息按内容去重，同一媒体只存储一次，由种子引用
+    - 支持按站点加载、追加新种子以及删除旧种子，无需重写整个缓存
+    """
+
+    def __init__(self, path: Path):
+        """
+        :param path: 数据库文件路径
+        """
+        self._path = path
+        self._lock = threading.Lock()
+        # 写入次数，用于判断缓存是否变化
+        self._version = 0
+        self._conn = sqlite3.connect(str(path), check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self.__init_schema()
+
+    def __init_schema(self):
+        """
+        初始化表结构，版本不一致时丢弃旧数据
+        """
+        version = self._conn.execute("PRAGMA user_version").fetchone()[0]
+        if version and version != SCHEMA_VERSION:
+            logger.info(f"种子缓存格式版本变化：{version} -> {SCHEMA_VERSION}，重建缓存")
+            self._conn.execute("DROP TABLE IF EXISTS torrents")
+            self._conn.execute("DROP TABLE IF EXISTS media")
+        self._conn.execute("CREATE TABLE IF NOT EXISTS media ("
+                           "key TEXT PRIMARY KEY, value BLOB)")
+        self._conn.execute("CREATE TABLE IF NOT EXISTS torrents ("
+                           "id INTEGER PRIMARY KEY AUTOINCREMENT, domain TEXT, enclosure TEXT, "
+                           "media_key TEXT, meta BLOB, torrent BLOB)")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS ix_torrents_domain ON torrents (domain, id)")
+        self._conn.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+
+    @property
+    def version(self) -> int:
+        """
+        缓存写入版本，每次修改缓存后变化
+        """
+        return self._version
+
+    def load(self, domains: Optional[Iterable[str]] = None) -> Dict[str, List[Context]]:
+        """
+        加载缓存种子，相同的媒体信息只反序列化一次，每个种子获得各自的媒体信息副本
+        :param domains: 只加载指定站点，为空时加载全部
+        :return: 站点域名 -> 按写入顺序排列的种子上下文
+        """
+        if domains is not None:
+            domains = list(domains)
+            if not domains:
+                return {}
+            where = f" WHERE domain IN ({','.join('?' * len(domains))})"
+            params = domains
+        else:
+            where, params = "", []
+        with self._lock:
+            rows = self._conn.execute(f"SELECT domain, media_key, meta, torrent FROM torrents{where} "
+                                      f"ORDER BY id", params).fetchall()
+            media_rows = self._conn.execute(f"SELECT key, value FROM media WHERE key IN "
+                                            f"(SELECT media_key FROM torrents{where})", params).fetchall()
+        medias = {}
+        for key, value in media_rows:
+            try:
+                medias[key] = pickle.loads(value)
+            except Exception as err:
+                logger.error(f"加载种子缓存媒体信息出错：{str(err)}")
+        torrents: Dict[str, List[Context]] = {}
+        for domain, media_key, meta, torrent in rows:
+            try:
+                context = Context(meta_info=pickle.loads(meta), media_info=copy.copy(medias.get(media_key)),
+                                  torrent_info=pickle.loads(torrent))
+            except Exception as err:
+                logger.error(f"加载站点 {domain} 种子缓存出错：{str(err)}")
+                continue
+            torrents.setdefault(domain, []).append(context)
+        return torrents
+
+    def append(self, domain: str, contexts: List[Context]) -> None:
+        """
+        追加站点的新种子
+        :param domain: 站点域名
+        :param contexts: 种子上下文
+        """
+        if not contexts:
+            return
+        medias: Dict[int, tuple] = {}
+        rows = []
+        for context in contexts:
+            media = medias.get(id(context.media_info))
+            if not media:
+                value = pickle.dumps(context.media_info, pickle.HIGHEST_PROTOCOL)
+                media = medias[id(context.media_info)] = (hashlib.sha1(value).hexdigest(), value)
+            rows.append((domain, context.torrent_info.enclosure, media[0],
+                         pickle.dumps(context.meta_info, pickle.HIGHEST_PROTOCOL),
+                         pickle.dumps(context.torrent_info, pickle.HIGHEST_PROTOCOL)))
+        self.__execute([
+            ("INSERT OR IGNORE INTO media (key, value) VALUES (?, ?)", list(medias.values())),
+            ("INSERT INTO torrents (domain, enclosure, media_key, meta, torrent) VALUES (?, ?, ?, ?, ?)", rows)
+        ])
+
+    def trim(self, domain: str, count: int) -> None:
+        """
+        删除站点最早写入的种子
+        :param domain: 站点域名
+        :param count: 删除的数量
+        """
+        if count <= 0:
+            return
+        self.__execute([
+            ("DELETE FROM torrents WHERE id IN (SELECT id FROM torrents WHERE domain = ? ORDER BY id LIMIT ?)",
+             [(domain, count)])
+        ])
+
+    def delete_enclosures(self, domain: str, enclosures: Iterable[str]) -> None:
+        """
+        删除站点指定下载链接的种子
+        :param domain: 站点域名
+        :param enclosures: 下载链接
+        """
+        rows = [(domain, enclosure) for enclosure in enclosures]
+        if not rows:
+            return
+        self.__execute([("DELETE FROM torrents WHERE domain = ? AND enclosure = ?", rows)])
+
+    def prune(self) -> None:
+        """
+        删除没有种子引用的媒体信息
+        """
+        self.__execute([("DELETE FROM media WHERE key NOT IN (SELECT DISTINCT media_key FROM torrents)", [()])])
+
+    def clear(self) -> None:
+        """
+        清空缓存
+        """
+        self.__execute([("DELETE FROM torrents", [()]), ("DELETE FROM media", [()])])
+
+    def __execute(self, statements: List[tuple]) -> None:
+        """
+        在一个事务中执行多条语句
+        :param statements: [(SQL, 参数列表)]
+        """
+        with self._lock:
+            try:
+                self._conn.execute("BEGIN")
+                for sql, params in statements:
+                    if params:
+                        self._conn.executemany(sql, params)
+                self._conn.execute("COMMIT")
+            except Exception as err:
+                self._conn.execute("ROLLBACK")
+                logger.error(f"保存种子缓存出错：{str(err)} - {traceback.format_exc()}")
+            finally:
+                self._version += 1
@@ -237,6 +237,9 @@ class LoggerManager:
         :param method: 日志方法
         :param msg: 日志信息
         """
+        # 未启用的日志级别直接返回，避免热点路径上的调用栈遍历开销
+        if getattr(logging, method.upper(), logging.CRITICAL) < self.__get_log_level():
+            return
         # 获取调用者文件名和插件名
         caller_name, plugin_name = self.__get_caller()
         # 区分插件日志
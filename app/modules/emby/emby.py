@@ -628,6 +628,9 @@ class Emby:
                     percentage=item.get("UserData", {}).get("PlayedPercentage"),
                 )
             tmdbid = item.get("ProviderIds", {}).get("Tmdb")
+            # 服务器端的最后变化时间，剧集同时参考最近一次新增媒体的时间
+            mod_dates = [str(date).replace("T", " ")[:19]
+                         for date in (item.get("DateModified"), item.get("DateLastMediaAdded")) if date]
             return schemas.MediaServerItem(
                 server="emby",
                 library=item.get("ParentId"),
@@ -640,6 +643,7 @@ class Emby:
                 imdbid=item.get("ProviderIds", {}).get("Imdb"),
                 tvdbid=item.get("ProviderIds", {}).get("Tvdb"),
                 path=item.get("Path"),
+                lst_mod_date=max(mod_dates) if mod_dates else None,
                 user_state=user_state
 
             )
@@ -685,7 +689,7 @@ class Emby:
         params = {
             "ParentId": parent,
             "api_key": self._apikey,
-            "Fields": "ProviderIds,OriginalTitle,ProductionYear,Path,UserDataPlayCount,UserDataLastPlayedDate,ParentId"
+            "Fields": "ProviderIds,OriginalTitle,ProductionYear,Path,UserDataPlayCount,UserDataLastPlayedDate,ParentId,DateModified,DateLastMediaAdded"
         }
         if limit is not None and limit != -1:
             params.update({
@@ -305,15 +305,21 @@ class FileManagerModule(_ModuleBase):
             return None
         return storage_oper.get_parent(fileitem)
 
-    def snapshot_storage(self, storage: str, path: Path) -> Optional[Dict[str, float]]:
+    def snapshot_storage(self, storage: str, path: Path, dirs: Optional[Dict[str, dict]] = None,
+                         full: bool = False, hot_seconds: float = 0) -> Optional[Dict[str, float]]:
         """
         快照存储
+        :param storage: 存储类型
+        :param path: 快照的根目录
+        :param dirs: 上次快照的目录记录，快照完成后原地更新
+        :param full: 是否忽略目录记录，重新遍历所有目录
+        :param hot_seconds: 最近该时间（秒）内发生过变化的目录总是重新遍历
         """
         storage_oper = self.__get_storage_oper(storage)
         if not storage_oper:
             logger.error(f"不支持 {storage} 的快照处理")
             return None
-        return storage_oper.snapshot(path)
+        return storage_oper.snapshot(path, dirs=dirs, full=full, hot_seconds=hot_seconds)
 
     def storage_usage(self, storage: str) -> Optional[StorageUsage]:
         """
@@ -1,3 +1,4 @@
+import time
 from abc import ABCMeta, abstractmethod
 from pathlib import Path
 from typing import Optional, List, Dict, Tuple
@@ -185,21 +186,57 @@ class StorageBase(metaclass=ABCMeta):
         """
         pass
 
-    def snapshot(self, path: Path) -> Dict[str, float]:
+    def snapshot(self, path: Path, dirs: Optional[Dict[str, dict]] = None,
+                 full: bool = False, hot_seconds: float = 0) -> Dict[str, float]:
         """
         快照文件系统，输出所有层级文件信息（不含目录）
+        :param path: 快照的根目录
+        :param dirs: 上次快照的目录记录，目录路径 -> {item, files, dirs, changed_at}，快照完成后原地更新；
+                     传入时没有子目录且修改时间未变化的目录直接复用记录，不再遍历
+        :param full: 是否忽略目录记录，重新遍历所有目录
+        :param hot_seconds: 最近该时间（秒）内发生过变化的目录，即使修改时间未变化也重新遍历
         """
         files_info = {}
+        if dirs is None:
+            dirs = {}
+        # 本次快照仍存在的目录
+        seen = set()
+        now = time.time()
 
         def __snapshot_file(_fileitm: schemas.FileItem):
             """
             递归获取文件信息
             """
-            if _fileitm.type == "dir":
-                for sub_file in self.list(_fileitm):
-                    __snapshot_file(sub_file)
-            else:
+            if _fileitm.type != "dir":
                 files_info[_fileitm.path] = _fileitm.size
+                return
+            seen.add(_fileitm.path)
+            record = dirs.get(_fileitm.path)
+            # 目录的修改时间只反映直接子项的变化，有子目录的目录总是遍历，以获取子目录最新的修改时间
+            if record and not full and not record["dirs"] and now - record["changed_at"] >= hot_seconds \
+                    and _fileitm.modify_time is not None \
+                    and _fileitm.modify_time == record["item"].get("modify_time"):
+                # 目录未变化，复用上次的遍历结果
+                files_info.update(record["files"])
+                return
+            files, sub_dirs = {}, []
+            for sub_file in self.list(_fileitm):
+                if sub_file.type == "dir":
+                    sub_dirs.append(sub_file.path)
+                    __snapshot_file(sub_file)
+                else:
+                    files[sub_file.path] = sub_file.size
+            files_info.update(files)
+            item = _fileitm.dict()
+            if not record or record["files"] != files or record["dirs"] != sub_dirs \
+                    or record["item"].get("modify_time") != item.get("modify_time"):
+                dirs[_fileitm.path] = {
+                    "item": item,
+                    "files": files,
+                    "dirs": sub_dirs,
+                    # 首次遍历的目录以其修改时间作为变化时间，避免初次快照后所有目录都被视为最近变化
+                    "changed_at": now if record else min(now, _fileitm.modify_time or now)
+                }
 
         fileitem = self.get_item(path)
         if not fileitem:
@@ -207,4 +244,9 @@ class StorageBase(metaclass=ABCMeta):
 
         __snapshot_file(fileitem)
 
+        # 移除已不存在的目录
+        for dir_path in list(dirs.keys()):
+            if dir_path not in seen:
+                dirs.pop(dir_path)
+
         return files_info
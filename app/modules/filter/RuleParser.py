@@ -1,4 +1,5 @@
 import threading
+from typing import Dict, Tuple, Union
 
 from pyparsing import Forward, Literal, Word, alphas, infixNotation, opAssoc, alphanums, Combine, nums, ParseResults
 
@@ -7,6 +8,10 @@ class RuleParser:
 
     _lock = threading.Lock()
     _thread_local = threading.local()
+    # 规则串编译缓存：规则串 -> 各级规则的语法树
+    _compiled: Dict[str, Tuple[tuple, ...]] = {}
+    # 编译缓存最大条目数
+    _max_compiled = 1024
 
     def __init__(self):
         """
@@ -50,6 +55,49 @@ class RuleParser:
         """
         return self.expr.parseString(expression)
 
+    def compile(self, rule_string: str) -> Tuple[tuple, ...]:
+        """
+        将多级规则串（以 > 分隔）编译为各级规则的语法树，同一规则串只解析一次
+
+        语法树节点：
+        ("rule", 规则名称) | ("not", 节点) | ("and", (节点, ...)) | ("or", (节点, ...)) | ("none",)
+
+        参数:
+        rule_string -- 多级规则串
+
+        返回:
+        按优先级从高到低排列的语法树
+        """
+        compiled = self._compiled.get(rule_string)
+        if compiled is not None:
+            return compiled
+        compiled = tuple(self.__build(self.parse(level.strip()).as_list()[0])
+                         for level in rule_string.split('>'))
+        with self._lock:
+            if len(self._compiled) >= self._max_compiled:
+                self._compiled.clear()
+            self._compiled[rule_string] = compiled
+        return compiled
+
+    @classmethod
+    def __build(cls, node: Union[list, str]) -> tuple:
+        """
+        将解析结果转换为语法树节点
+        """
+        if not isinstance(node, list):
+            # 不是列表，说明是规则名称
+            return "rule", node
+        if len(node) == 1:
+            # 只有一个规则项
+            return cls.__build(node[0])
+        if node[0] == "not":
+            # 非操作
+            return "not", cls.__build(node[1:])
+        if node[1] in ("and", "or"):
+            # 与、或操作，同一层级的运算符相同
+            return node[1], tuple(cls.__build(item) for item in node[0::2])
+        return "none",
+
 
 if __name__ == '__main__':
     # 测试代码
@@ -1,4 +1,5 @@
 import re
+import threading
 from typing import List, Tuple, Union, Dict, Optional
 
 from app.core.context import TorrentInfo, MediaInfo
@@ -16,6 +17,14 @@ class FilterModule(_ModuleBase):
     parser: RuleParser = None
     # 媒体信息
     media: MediaInfo = None
+    # 已加载的自定义规则
+    _custom_rules: List[dict] = None
+    # 编译后的规则集，包含和排除项为预编译的正则
+    _compiled_rules: Dict[str, dict] = {}
+    # 种子内容匹配结果缓存：匹配内容 -> {规则名称: 是否命中}
+    _match_cache: Dict[str, Dict[str, bool]] = None
+    # 匹配结果缓存最多保存的内容条数，超出后整体清空
+    _match_cache_size = 20000
 
     # 内置规则集
     rule_set: Dict[str, dict] = {
@@ -142,19 +151,57 @@ class FilterModule(_ModuleBase):
     def __init__(self):
         super().__init__()
         self.rulehelper = RuleHelper()
+        self._lock = threading.Lock()
+        self._match_cache = {}
 
     def init_module(self) -> None:
         self.parser = RuleParser()
+        self._custom_rules = None
         self.__init_custom_rules()
 
     def __init_custom_rules(self):
         """
-        加载用户自定义规则，如跟内置规则冲突，以用户自定义规则为准
+        加载用户自定义规则，如跟内置规则冲突，以用户自定义规则为准，规则有变化时重新编译规则集
         """
-        custom_rules = self.rulehelper.get_custom_rules()
+        custom_rules = [rule.dict() for rule in self.rulehelper.get_custom_rules()]
+        if custom_rules == self._custom_rules:
+            return
         for rule in custom_rules:
-            logger.info(f"加载自定义规则 {rule.id} - {rule.name}")
-            self.rule_set[rule.id] = rule.dict()
+            logger.info(f"加载自定义规则 {rule.get('id')} - {rule.get('name')}")
+            self.rule_set[rule.get("id")] = rule
+        self._custom_rules = custom_rules
+        self.__compile_rules()
+
+    def __compile_rules(self):
+        """
+        预编译规则集中的包含和排除项，并清空匹配结果缓存
+        """
+        compiled_rules = {}
+        for rule_name, rule in self.rule_set.items():
+            compiled = dict(rule)
+            compiled["include"] = self.__compile_patterns(rule_name, rule.get("include"))
+            compiled["exclude"] = self.__compile_patterns(rule_name, rule.get("exclude"))
+            compiled_rules[rule_name] = compiled
+        with self._lock:
+            self._compiled_rules = compiled_rules
+            self._match_cache = {}
+
+    @staticmethod
+    def __compile_patterns(rule_name: str, patterns: Union[list, str, None]) -> List[re.Pattern]:
+        """
+        编译规则项的正则表达式，忽略大小写
+        """
+        if not patterns:
+            return []
+        if not isinstance(patterns, list):
+            patterns = [patterns]
+        compiled = []
+        for pattern in patterns:
+            try:
+                compiled.append(re.compile(r"%s" % pattern, re.IGNORECASE))
+            except re.error as err:
+                logger.error(f"规则 {rule_name} 的正则表达式 {pattern} 无效：{str(err)}")
+        return compiled
 
     @staticmethod
     def get_name() -> str:
@@ -217,6 +264,50 @@ class FilterModule(_ModuleBase):
                     )
         return torrent_list
 
+    def filter_torrents_batch(self, rule_groups_list: List[List[str]],
+                              torrent_list: List[TorrentInfo],
+                              mediainfos: List[Optional[MediaInfo]] = None
+                              ) -> Dict[Tuple[str, ...], List[Optional[int]]]:
+        """
+        批量过滤种子资源，一次性计算多个规则组组合下每个种子的优先级，不修改种子本身
+        :param rule_groups_list:  规则组名称列表的集合，每一项为一种规则组组合
+        :param torrent_list:  资源列表
+        :param mediainfos:  与资源列表一一对应的媒体信息
+        :return: 规则组组合 -> 与资源列表一一对应的优先级，不符合过滤规则时为None
+        """
+        if not mediainfos:
+            mediainfos = [None] * len(torrent_list)
+        # 重新加载自定义规则
+        self.__init_custom_rules()
+        # 规则组查询缓存：(规则组组合, 媒体类型, 媒体类别) -> 规则组详情
+        groups_cache: Dict[tuple, list] = {}
+        result: Dict[Tuple[str, ...], List[Optional[int]]] = {}
+        for rule_groups in rule_groups_list:
+            groups_key = tuple(rule_groups or [])
+            if groups_key in result:
+                continue
+            orders = []
+            for torrent, mediainfo in zip(torrent_list, mediainfos):
+                if not groups_key:
+                    # 没有规则组，不过滤
+                    orders.append(torrent.pri_order)
+                    continue
+                cache_key = (groups_key, mediainfo.type, mediainfo.category) if mediainfo else (groups_key,)
+                groups = groups_cache.get(cache_key)
+                if groups is None:
+                    groups = self.rulehelper.get_rule_group_by_media(media=mediainfo, group_names=list(groups_key))
+                    groups_cache[cache_key] = groups
+                self.media = mediainfo
+                # 多个规则组依次过滤，优先级以最后一个规则组为准
+                order = torrent.pri_order
+                for group in groups:
+                    order = self.__match_order(torrent, group.rule_string)
+                    if order is None:
+                        break
+                orders.append(order)
+            result[groups_key] = orders
+        return result
+
     def __filter_torrents(self, rule_string: str, rule_name: str,
                           torrent_list: List[TorrentInfo]) -> List[TorrentInfo]:
         """
@@ -236,59 +327,56 @@ class FilterModule(_ModuleBase):
 
     def __get_order(self, torrent: TorrentInfo, rule_str: str) -> Optional[TorrentInfo]:
         """
-        获取种子匹配的规则优先级，值越大越优先，未匹配时返回None
+        获取种子匹配的规则优先级并写入种子，未匹配时返回None
+        """
+        res_order = self.__match_order(torrent, rule_str)
+        if res_order is None:
+            return None
+        torrent.pri_order = res_order
+        return torrent
+
+    def __match_order(self, torrent: TorrentInfo, rule_str: str) -> Optional[int]:
+        """
+        计算种子匹配的规则优先级，值越大越优先，未匹配时返回None
         """
-        # 多级规则
-        rule_groups = rule_str.split('>')
         # 优先级
         res_order = 100
-        # 是否匹配
-        matched = False
-
-        for rule_group in rule_groups:
-            # 解析规则组
-            parsed_group = self.parser.parse(rule_group.strip())
-            if self.__match_group(torrent, parsed_group.as_list()[0]):
+        # 多级规则，每一级已编译为语法树
+        for rule_group in self.parser.compile(rule_str):
+            if self.__match_group(torrent, rule_group):
                 # 出现匹配时中断
-                matched = True
                 logger.debug(f"种子 {torrent.site_name} - {torrent.title} 优先级为 {100 - res_order + 1}")
-                torrent.pri_order = res_order
-                break
+                return res_order
             # 优先级降低，继续匹配
             res_order -= 1
+        return None
 
-        return None if not matched else torrent
-
-    def __match_group(self, torrent: TorrentInfo, rule_group: Union[list, str]) -> Optional[bool]:
+    def __match_group(self, torrent: TorrentInfo, rule_group: tuple) -> bool:
         """
-        判断种子是否匹配规则组
+        判断种子是否匹配规则组语法树
         """
-        if not isinstance(rule_group, list):
-            # 不是列表，说明是规则名称
-            return self.__match_rule(torrent, rule_group)
-        elif isinstance(rule_group, list) and len(rule_group) == 1:
-            # 只有一个规则项
-            return self.__match_group(torrent, rule_group[0])
-        elif rule_group[0] == "not":
-            # 非操作
-            return not self.__match_group(torrent, rule_group[1:])
-        elif rule_group[1] == "and":
-            # 与操作
-            return self.__match_group(torrent, rule_group[0]) and self.__match_group(torrent, rule_group[2:])
-        elif rule_group[1] == "or":
-            # 或操作
-            return self.__match_group(torrent, rule_group[0]) or self.__match_group(torrent, rule_group[2:])
+        operator = rule_group[0]
+        if operator == "rule":
+            return self.__match_rule(torrent, rule_group[1])
+        elif operator == "not":
+            return not self.__match_group(torrent, rule_group[1])
+        elif operator == "and":
+            return all(self.__match_group(torrent, item) for item in rule_group[1])
+        elif operator == "or":
+            return any(self.__match_group(torrent, item) for item in rule_group[1])
+        return False
 
     def __match_rule(self, torrent: TorrentInfo, rule_name: str) -> bool:
         """
         判断种子是否匹配规则项
         """
-        if not self.rule_set.get(rule_name):
+        rule = self._compiled_rules.get(rule_name)
+        if not rule:
             # 规则不存在
             logger.debug(f"规则 {rule_name} 不存在")
             return False
         # TMDB规则
-        tmdb = self.rule_set[rule_name].get("tmdb")
+        tmdb = rule.get("tmdb")
         # 符合TMDB规则的直接返回True，即不过滤
         if tmdb and self.__match_tmdb(tmdb):
             logger.debug(f"种子 {torrent.site_name} - {torrent.title} 符合 {rule_name} 的TMDB规则，匹配成功")
@@ -297,7 +385,7 @@ class FilterModule(_ModuleBase):
         content = f"{torrent.title} {torrent.description} {' '.join(torrent.labels or [])}"
         # 只匹配指定关键字
         match_content = []
-        matchs = self.rule_set[rule_name].get("match") or []
+        matchs = rule.get("match") or []
         if matchs:
             for match in matchs:
                 if not hasattr(torrent, match):
@@ -311,31 +399,18 @@ class FilterModule(_ModuleBase):
                     match_content.append(match_value)
         if match_content:
             content = " ".join(match_content)
-        # 包含规则项
-        includes = self.rule_set[rule_name].get("include") or []
-        if not isinstance(includes, list):
-            includes = [includes]
-        # 排除规则项
-        excludes = self.rule_set[rule_name].get("exclude") or []
-        if not isinstance(excludes, list):
-            excludes = [excludes]
         # 大小范围规则项
-        size_range = self.rule_set[rule_name].get("size_range")
+        size_range = rule.get("size_range")
         # 做种人数规则项
-        seeders = self.rule_set[rule_name].get("seeders")
+        seeders = rule.get("seeders")
         # FREE规则
-        downloadvolumefactor = self.rule_set[rule_name].get("downloadvolumefactor")
+        downloadvolumefactor = rule.get("downloadvolumefactor")
         # 发布时间规则
-        pubdate: str = self.rule_set[rule_name].get("publish_time")
-        if includes and not any(re.search(r"%s" % include, content, re.IGNORECASE) for include in includes):
-            # 未发现任何包含项
-            logger.debug(f"种子 {torrent.site_name} - {torrent.title} 不包含任何项 {includes}")
+        pubdate: str = rule.get("publish_time")
+        if not self.__match_content(content, rule_name, rule):
+            # 包含项未命中或命中排除项
+            logger.debug(f"种子 {torrent.site_name} - {torrent.title} 不符合 {rule_name} 的包含/排除项")
             return False
-        for exclude in excludes:
-            if re.search(r"%s" % exclude, content, re.IGNORECASE):
-                # 发现排除项
-                logger.debug(f"种子 {torrent.site_name} - {torrent.title} 包含 {exclude}")
-                return False
         if size_range:
             if not self.__match_size(torrent, size_range):
                 # 大小范围不匹配
@@ -371,6 +446,25 @@ class FilterModule(_ModuleBase):
 
         return True
 
+    def __match_content(self, content: str, rule_name: str, rule: dict) -> bool:
+        """
+        判断匹配内容是否命中规则的包含项且不命中排除项，结果按内容和规则名称缓存
+        """
+        verdicts = self._match_cache.get(content)
+        if verdicts is None:
+            with self._lock:
+                if len(self._match_cache) >= self._match_cache_size:
+                    self._match_cache.clear()
+                verdicts = self._match_cache.setdefault(content, {})
+        matched = verdicts.get(rule_name)
+        if matched is None:
+            includes: List[re.Pattern] = rule.get("include")
+            excludes: List[re.Pattern] = rule.get("exclude")
+            matched = (not includes or any(include.search(content) for include in includes)) \
+                and not any(exclude.search(content) for exclude in excludes)
+            verdicts[rule_name] = matched
+        return matched
+
     def __match_tmdb(self, tmdb: dict) -> bool:
         """
         判断种子是否匹配TMDB规则
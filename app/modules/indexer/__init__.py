@@ -191,9 +191,12 @@ class IndexerModule(_ModuleBase):
         # 索引花费的时间
         seconds = (datetime.now() - start_time).seconds
 
-        # 统计索引情况
+        # 统计索引情况，搜索已超时被放弃时由搜索链记录访问失败，不再重复记录
         domain = StringUtils.get_url_domain(site.get("domain"))
-        if error_flag:
+        search_token = site.get("search_token")
+        if search_token is not None and search_token.setdefault("state", "finished") != "finished":
+            logger.info(f"{site.get('name')} 搜索已超时，耗时 {seconds} 秒")
+        elif error_flag:
             SiteOper().fail(domain)
         else:
             SiteOper().success(domain=domain, seconds=seconds)
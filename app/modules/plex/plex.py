@@ -495,6 +495,12 @@ class Plex:
             play_count=play_count,
             percentage=percentage,
         )
+        # 服务器端的最后变化时间，剧集的 updatedAt 在新增或删除剧集时不一定变化，同时参考剧集数量
+        updated_at = getattr(item, "updatedAt", None)
+        lst_mod_date = updated_at.strftime("%Y-%m-%d %H:%M:%S") if updated_at else None
+        leaf_count = getattr(item, "leafCount", None) if item.type == "show" else None
+        if lst_mod_date and leaf_count is not None:
+            lst_mod_date = f"{lst_mod_date} #{leaf_count}"
 
         return schemas.MediaServerItem(
             server="plex",
@@ -508,6 +514,7 @@ class Plex:
             imdbid=ids.get("imdb_id"),
             tvdbid=ids.get("tvdb_id"),
             path=path,
+            lst_mod_date=lst_mod_date,
             user_state=user_state,
         )
 
@@ -1,6 +1,7 @@
+import threading
 import time
 import traceback
-from typing import Optional, Union, Tuple, List
+from typing import Optional, Union, Tuple, List, Dict
 
 import qbittorrentapi
 from qbittorrentapi import TorrentDictionary, TorrentFilesList
@@ -10,6 +11,22 @@ from qbittorrentapi.transfer import TransferInfoDictionary
 from app.log import logger
 from app.utils.string import StringUtils
 
+# 按状态筛选种子时包含的种子状态，与 qBittorrent 的 status_filter 保持一致
+STATUS_FILTER_STATES = {
+    "downloading": {"downloading", "metaDL", "forcedMetaDL", "stalledDL", "checkingDL",
+                    "pausedDL", "stoppedDL", "queuedDL", "forcedDL"},
+    "seeding": {"uploading", "stalledUP", "checkingUP", "queuedUP", "forcedUP"},
+    "completed": {"uploading", "stalledUP", "checkingUP", "pausedUP", "stoppedUP", "queuedUP", "forcedUP"},
+    "paused": {"pausedDL", "pausedUP", "stoppedDL", "stoppedUP"},
+    "stopped": {"pausedDL", "pausedUP", "stoppedDL", "stoppedUP"},
+    "stalled": {"stalledUP", "stalledDL"},
+    "stalled_uploading": {"stalledUP"},
+    "stalled_downloading": {"stalledDL"},
+    "checking": {"checkingUP", "checkingDL", "checkingResumeData"},
+    "moving": {"moving"},
+    "errored": {"error", "missingFiles"},
+}
+
 
 class Qbittorrent:
     _host: Optional[str] = None
@@ -43,6 +60,11 @@ class Qbittorrent:
         self._sequentail = sequentail
         self._force_resume = force_resume
         self._first_last_piece = first_last_piece
+        # 种子状态镜像，通过 sync/maindata 增量同步，种子Hash -> 种子信息
+        self._torrents: Dict[str, dict] = {}
+        # 增量同步的响应ID，为0时全量同步
+        self._rid = 0
+        self._sync_lock = threading.Lock()
         if self._host and self._port:
             self.qbc = self.__login_qbittorrent()
 
@@ -59,6 +81,7 @@ class Qbittorrent:
         重连
         """
         self.qbc = self.__login_qbittorrent()
+        self.__reset_torrents()
 
     def __login_qbittorrent(self) -> Optional[Client]:
         """
@@ -88,28 +111,75 @@ class Qbittorrent:
             logger.error(f"qbittorrent 连接出错：{str(err)}")
             return None
 
+    def __reset_torrents(self):
+        """
+        清空种子状态镜像，下次同步时全量获取
+        """
+        with self._sync_lock:
+            self._rid = 0
+            self._torrents = {}
+
+    def __sync_torrents(self) -> Optional[Dict[str, dict]]:
+        """
+        通过 sync/maindata 增量同步种子状态镜像，只获取上次同步以来发生变化的种子和字段，
+        响应ID失效（如下载器重启）时下载器返回全量数据并重建镜像
+        :return: 种子Hash -> 种子信息，同步出错时返回None
+        """
+        with self._sync_lock:
+            try:
+                maindata = self.qbc.sync_maindata(rid=self._rid)
+            except Exception as err:
+                logger.error(f"同步种子状态出错：{str(err)}")
+                self._rid = 0
+                self._torrents = {}
+                return None
+            if maindata.get("full_update"):
+                self._torrents = {}
+            for torrent_hash, info in (maindata.get("torrents") or {}).items():
+                # 替换而不是原地修改，已返回的种子信息不受后续同步影响
+                self._torrents[torrent_hash] = {**self._torrents.get(torrent_hash, {"hash": torrent_hash}), **info}
+            for torrent_hash in maindata.get("torrents_removed") or []:
+                self._torrents.pop(torrent_hash, None)
+            self._rid = maindata.get("rid") or 0
+            return dict(self._torrents)
+
+    @staticmethod
+    def __match_tags(torrent: dict, tags: Optional[Union[str, list]]) -> bool:
+        """
+        判断种子是否包含全部标签
+        """
+        if not tags:
+            return True
+        if not isinstance(tags, list):
+            tags = [tags]
+        torrent_tags = [str(tag).strip() for tag in torrent.get("tags").split(',')]
+        return set(tags).issubset(set(torrent_tags))
+
     def get_torrents(self, ids: Optional[Union[str, list]] = None,
                      status: Optional[str] = None,
                      tags: Optional[Union[str, list]] = None) -> Tuple[List[TorrentDictionary], bool]:
         """
-        获取种子列表
+        获取种子列表，优先从增量同步的种子状态镜像中筛选
         return: 种子列表, 是否发生异常
         """
         if not self.qbc:
             return [], True
+        if not status or status == "all" or status in STATUS_FILTER_STATES:
+            torrents = self.__sync_torrents()
+            if torrents is not None:
+                if ids:
+                    hashes = ids.split("|") if isinstance(ids, str) else ids
+                    torrents = [torrents.get(str(torrent_hash).lower()) for torrent_hash in hashes]
+                else:
+                    torrents = list(torrents.values())
+                states = STATUS_FILTER_STATES.get(status)
+                return [TorrentDictionary(dict(torrent), client=self.qbc) for torrent in torrents
+                        if torrent and (not states or torrent.get("state") in states)
+                        and self.__match_tags(torrent, tags)], False
         try:
             torrents = self.qbc.torrents_info(torrent_hashes=ids,
                                               status_filter=status)
-            if tags:
-                results = []
-                if not isinstance(tags, list):
-                    tags = [tags]
-                for torrent in torrents:
-                    torrent_tags = [str(tag).strip() for tag in torrent.get("tags").split(',')]
-                    if set(tags).issubset(set(torrent_tags)):
-                        results.append(torrent)
-                return results, False
-            return torrents or [], False
+            return [torrent for torrent in torrents or [] if self.__match_tags(torrent, tags)], False
         except Exception as err:
             logger.error(f"获取种子列表出错：{str(err)}")
             return [], True
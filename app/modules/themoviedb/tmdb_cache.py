@@ -1,14 +1,11 @@
-import pickle
-import random
 import time
-import traceback
 from pathlib import Path
 from threading import RLock
 from typing import Optional
 
 from app.core.config import settings
 from app.core.meta import MetaBase
-from app.log import logger
+from app.helper.metastore import MetaCacheStore
 from app.utils.singleton import Singleton
 from app.schemas.types import MediaType
 
@@ -28,6 +25,7 @@ class TmdbCache(metaclass=Singleton):
         "type": MediaType
     }
     """
+    # 内存中的缓存条目，按需从存储中加载
     _meta_data: dict = {}
     # 缓存文件路径
     _meta_path: Path = None
@@ -35,8 +33,14 @@ class TmdbCache(metaclass=Singleton):
     _tmdb_cache_expire: bool = True
 
     def __init__(self):
-        self._meta_path = settings.TEMP_PATH / "__tmdb_cache__"
-        self._meta_data = self.__load(self._meta_path)
+        self._meta_path = settings.TEMP_PATH / "__tmdb_cache__.db"
+        self._store = MetaCacheStore(self._meta_path)
+        # 导入旧版本的缓存文件
+        self._store.migrate(settings.TEMP_PATH / "__tmdb_cache__", expire_key=CACHE_EXPIRE_TIMESTAMP_STR)
+        self._meta_data = {}
+        # 待保存和待删除的缓存key
+        self._dirty_keys = set()
+        self._deleted_keys = set()
 
     def clear(self):
         """
@@ -44,6 +48,23 @@ class TmdbCache(metaclass=Singleton):
         """
         with lock:
             self._meta_data = {}
+            self._dirty_keys.clear()
+            self._deleted_keys.clear()
+            self._store.clear()
+
+    def __get_info(self, key: str) -> Optional[dict]:
+        """
+        获取缓存条目，内存中没有时从存储中加载
+        """
+        with lock:
+            if key in self._meta_data:
+                return self._meta_data[key]
+            if key in self._deleted_keys:
+                return None
+            info = self._store.get(key)
+            if info:
+                self._meta_data[key] = info
+            return info
 
     @staticmethod
     def __get_key(meta: MetaBase) -> str:
@@ -58,12 +79,14 @@ class TmdbCache(metaclass=Singleton):
         """
         key = self.__get_key(meta)
         with lock:
-            info: dict = self._meta_data.get(key)
+            info: dict = self.__get_info(key)
             if info:
                 expire = info.get(CACHE_EXPIRE_TIMESTAMP_STR)
                 if not expire or int(time.time()) < expire:
                     info[CACHE_EXPIRE_TIMESTAMP_STR] = int(time.time()) + EXPIRE_TIMESTAMP
-                    self._meta_data[key] = info
+                    # 过期时间延长超过一半时才需要重新保存
+                    if not expire or info[CACHE_EXPIRE_TIMESTAMP_STR] - expire > EXPIRE_TIMESTAMP / 2:
+                        self._dirty_keys.add(key)
                 elif expire and self._tmdb_cache_expire:
                     self.delete(key)
             return info or {}
@@ -75,16 +98,22 @@ class TmdbCache(metaclass=Singleton):
         @return: 被删除的缓存内容
         """
         with lock:
-            return self._meta_data.pop(key, {})
+            info = self.__get_info(key)
+            self._meta_data.pop(key, None)
+            self._dirty_keys.discard(key)
+            self._deleted_keys.add(key)
+            return info or {}
 
     def delete_by_tmdbid(self, tmdbid: int) -> None:
         """
         清空对应TMDBID的所有缓存记录，以强制更新TMDB中最新的数据
         """
-        for key in list(self._meta_data):
-            if self._meta_data.get(key, {}).get("id") == tmdbid:
-                with lock:
+        with lock:
+            for key in list(self._meta_data):
+                if self._meta_data.get(key, {}).get("id") == tmdbid:
                     self._meta_data.pop(key)
+                    self._dirty_keys.discard(key)
+            self._store.delete_by_mediaid(tmdbid)
 
     def delete_unknown(self) -> None:
         """
@@ -103,25 +132,12 @@ class TmdbCache(metaclass=Singleton):
         @return: 被修改后缓存内容
         """
         with lock:
-            if self._meta_data.get(key):
-                self._meta_data[key]['title'] = title
-                self._meta_data[key][CACHE_EXPIRE_TIMESTAMP_STR] = int(time.time()) + EXPIRE_TIMESTAMP
-            return self._meta_data.get(key)
-
-    @staticmethod
-    def __load(path: Path) -> dict:
-        """
-        从文件中加载缓存
-        """
-        try:
-            if path.exists():
-                with open(path, 'rb') as f:
-                    data = pickle.load(f)
-                return data
-            return {}
-        except Exception as e:
-            logger.error(f'加载缓存失败：{str(e)} - {traceback.format_exc()}')
-            return {}
+            info = self.__get_info(key)
+            if info:
+                info['title'] = title
+                info[CACHE_EXPIRE_TIMESTAMP_STR] = int(time.time()) + EXPIRE_TIMESTAMP
+                self._dirty_keys.add(key)
+            return info
 
     def update(self, meta: MetaBase, info: dict) -> None:
         """
@@ -146,66 +162,33 @@ class TmdbCache(metaclass=Singleton):
                     "backdrop_path": info.get("backdrop_path"),
                     CACHE_EXPIRE_TIMESTAMP_STR: int(time.time()) + EXPIRE_TIMESTAMP
                 }
+                self._dirty_keys.add(self.__get_key(meta))
+                self._deleted_keys.discard(self.__get_key(meta))
             elif info is not None:
-                # None时不缓存，此时代表网络错误，允许重复请求
+                # None时不缓存，此时代表网络错误，允许重复请求；未识别的条目不保存
                 self._meta_data[self.__get_key(meta)] = {'id': 0}
+                self._dirty_keys.discard(self.__get_key(meta))
+                self._deleted_keys.add(self.__get_key(meta))
 
     def save(self, force: bool = False) -> None:
         """
-        保存缓存数据到文件
-        """
-
-        meta_data = self.__load(self._meta_path)
-        new_meta_data = {k: v for k, v in self._meta_data.items() if v.get("id")}
-
-        if not force \
-                and not self._random_sample(new_meta_data) \
-                and meta_data.keys() == new_meta_data.keys():
-            return
-
-        with open(self._meta_path, 'wb') as f:
-            pickle.dump(new_meta_data, f, pickle.HIGHEST_PROTOCOL)  # type: ignore
-
-    def _random_sample(self, new_meta_data: dict) -> bool:
-        """
-        采样分析是否需要保存
+        保存变更的缓存条目，并清理存储中已过期的条目
+        :param force: 保存内存中的全部缓存条目
         """
-        ret = False
-        if len(new_meta_data) < 25:
-            keys = list(new_meta_data.keys())
-            for k in keys:
-                info = new_meta_data.get(k)
-                expire = info.get(CACHE_EXPIRE_TIMESTAMP_STR)
-                if not expire:
-                    ret = True
-                    info[CACHE_EXPIRE_TIMESTAMP_STR] = int(time.time()) + EXPIRE_TIMESTAMP
-                elif int(time.time()) >= expire:
-                    ret = True
-                    if self._tmdb_cache_expire:
-                        new_meta_data.pop(k)
-        else:
-            count = 0
-            keys = random.sample(sorted(new_meta_data.keys()), 25)
-            for k in keys:
-                info = new_meta_data.get(k)
-                expire = info.get(CACHE_EXPIRE_TIMESTAMP_STR)
-                if not expire:
-                    ret = True
-                    info[CACHE_EXPIRE_TIMESTAMP_STR] = int(time.time()) + EXPIRE_TIMESTAMP
-                elif int(time.time()) >= expire:
-                    ret = True
-                    if self._tmdb_cache_expire:
-                        new_meta_data.pop(k)
-                        count += 1
-            if count >= 5:
-                ret |= self._random_sample(new_meta_data)
-        return ret
+        with lock:
+            keys = self._meta_data.keys() if force else self._dirty_keys
+            items = {k: self._meta_data[k] for k in keys if self._meta_data.get(k, {}).get("id")}
+            self._store.save(items, deletes=self._deleted_keys, expire_key=CACHE_EXPIRE_TIMESTAMP_STR)
+            self._dirty_keys.clear()
+            self._deleted_keys.clear()
+        if self._tmdb_cache_expire:
+            self._store.delete_expired()
 
     def get_title(self, key: str) -> Optional[str]:
         """
         获取缓存的标题
         """
-        cache_media_info = self._meta_data.get(key)
+        cache_media_info = self.__get_info(key)
         if not cache_media_info or not cache_media_info.get("id"):
             return None
         return cache_media_info.get("title")
@@ -214,7 +197,9 @@ class TmdbCache(metaclass=Singleton):
         """
         重新设置缓存标题
         """
-        cache_media_info = self._meta_data.get(key)
-        if not cache_media_info:
-            return
-        self._meta_data[key]['title'] = cn_title
+        with lock:
+            cache_media_info = self.__get_info(key)
+            if not cache_media_info:
+                return
+            cache_media_info['title'] = cn_title
+            self._dirty_keys.add(key)
@@ -234,7 +234,7 @@ class TransmissionModule(_ModuleBase, _DownloaderBase[Transmission]):
         elif status == TorrentStatus.TRANSFER:
             # 获取已完成且未整理的
             for name, server in servers.items():
-                torrents = server.get_completed_torrents(tags=settings.TORRENT_TAG)
+                torrents = server.get_completed_torrents(tags=settings.TORRENT_TAG, polling=True)
                 for torrent in torrents or []:
                     # 含"已整理"tag的不处理
                     if "已整理" in torrent.labels or []:
@@ -257,7 +257,7 @@ class TransmissionModule(_ModuleBase, _DownloaderBase[Transmission]):
         elif status == TorrentStatus.DOWNLOADING:
             # 获取正在下载的任务
             for name, server in servers.items():
-                torrents = server.get_downloading_torrents(tags=settings.TORRENT_TAG)
+                torrents = server.get_downloading_torrents(tags=settings.TORRENT_TAG, polling=True)
                 for torrent in torrents or []:
                     meta = MetaInfo(torrent.name)
                     dlspeed = torrent.rate_download if hasattr(torrent, "rate_download") else torrent.rateDownload
@@ -1,4 +1,6 @@
-from typing import Optional, Union, Tuple, List, Literal
+import threading
+import time
+from typing import Optional, Union, Tuple, List, Literal, Dict
 
 import transmission_rpc
 from transmission_rpc import Client, Torrent, File
@@ -24,6 +26,16 @@ class Transmission:
               "peersGettingFromUs", "peersSendingToUs", "uploadRatio", "uploadedEver", "downloadedEver", "downloadDir",
               "error", "errorString", "doneDate", "queuePosition", "activityDate", "trackers"]
 
+    # 轮询种子列表时只查询整理和下载列表需要的参数
+    _pollarg = ["id", "hashString", "name", "status", "labels", "totalSize", "percentDone", "leftUntilDone",
+                "rateDownload", "rateUpload", "downloadDir", "error", "errorString"]
+
+    # Transmission 的 recently-active 只返回最近60秒内活动或删除的种子，超过该间隔的轮询需全量同步
+    _recent_interval = 45
+
+    # 轮询种子列表的全量同步间隔（秒）
+    _full_sync_interval = 600
+
     def __init__(self, host: Optional[str] = None, port: Optional[int] = None, 
                  username: Optional[str] = None, password: Optional[str] = None, **kwargs):
         """
@@ -43,6 +55,12 @@ class Transmission:
             return
         self._username = username
         self._password = password
+        # 轮询种子列表的镜像，种子ID -> 种子
+        self._torrents: Dict[int, Torrent] = {}
+        # 上次同步和全量同步的时间
+        self._sync_time = 0
+        self._full_sync_time = 0
+        self._sync_lock = threading.Lock()
         if self._host and self._port:
             self.trc = self.__login_transmission()
 
@@ -78,17 +96,57 @@ class Transmission:
         重连
         """
         self.trc = self.__login_transmission()
+        with self._sync_lock:
+            self._torrents = {}
+            self._sync_time = self._full_sync_time = 0
+
+    def __sync_torrents(self) -> List[Torrent]:
+        """
+        同步轮询种子列表的镜像，只查询 _pollarg 参数；
+        距上次同步不超过 recently-active 的时间窗口时只获取最近活动和删除的种子，否则以及定期全量同步
+        :return: 镜像中的全部种子，同步出错时抛出异常
+        """
+        with self._sync_lock:
+            now = time.time()
+            if self._torrents and now - self._sync_time <= self._recent_interval \
+                    and now - self._full_sync_time < self._full_sync_interval:
+                try:
+                    torrents, removed = self.trc.get_recently_active_torrents(arguments=self._pollarg)
+                except Exception:
+                    self._torrents = {}
+                    raise
+                for torrent in torrents:
+                    self._torrents[torrent.id] = torrent
+                for torrent_id in removed:
+                    self._torrents.pop(torrent_id, None)
+            else:
+                torrents = self.trc.get_torrents(arguments=self._pollarg)
+                self._torrents = {torrent.id: torrent for torrent in torrents}
+                self._full_sync_time = now
+            self._sync_time = now
+            return list(self._torrents.values())
 
     def get_torrents(self, ids: Union[str, list] = None, status: Union[str, list] = None,
-                     tags: Union[str, list] = None) -> Tuple[List[Torrent], bool]:
+                     tags: Union[str, list] = None, polling: bool = False) -> Tuple[List[Torrent], bool]:
         """
         获取种子列表
+        :param ids: 种子Hash或ID
+        :param status: 种子状态
+        :param tags: 种子标签
+        :param polling: 是否从增量同步的镜像中获取，种子只包含整理和下载列表需要的参数
         返回结果 种子列表, 是否有错误
         """
         if not self.trc:
             return [], True
         try:
-            torrents = self.trc.get_torrents(ids=ids, arguments=self._trarg)
+            if polling:
+                torrents = self.__sync_torrents()
+                if ids:
+                    ids = set(str(tid).lower() for tid in (ids if isinstance(ids, list) else [ids]))
+                    torrents = [torrent for torrent in torrents
+                                if torrent.hashString.lower() in ids or str(torrent.id) in ids]
+            else:
+                torrents = self.trc.get_torrents(ids=ids, arguments=self._trarg)
         except Exception as err:
             logger.error(f"获取种子列表出错：{str(err)}")
             return [], True
@@ -110,24 +168,27 @@ class Transmission:
         return ret_torrents, False
 
     def get_completed_torrents(self, ids: Union[str, list] = None,
-                               tags: Union[str, list] = None) -> Optional[List[Torrent]]:
+                               tags: Union[str, list] = None, polling: bool = False) -> Optional[List[Torrent]]:
         """
         获取已完成的种子列表
+        :param polling: 是否从增量同步的镜像中获取
         return 种子列表, 发生错误时返回None
         """
         if not self.trc:
             return None
         try:
-            torrents, error = self.get_torrents(status=["seeding", "seed_pending"], ids=ids, tags=tags)
+            torrents, error = self.get_torrents(status=["seeding", "seed_pending"], ids=ids, tags=tags,
+                                                polling=polling)
             return None if error else torrents or []
         except Exception as err:
             logger.error(f"获取已完成的种子列表出错：{str(err)}")
             return None
 
     def get_downloading_torrents(self, ids: Union[str, list] = None,
-                                 tags: Union[str, list] = None) -> Optional[List[Torrent]]:
+                                 tags: Union[str, list] = None, polling: bool = False) -> Optional[List[Torrent]]:
         """
         获取正在下载的种子列表
+        :param polling: 是否从增量同步的镜像中获取
         return 种子列表, 发生错误时返回None
         """
         if not self.trc:
@@ -135,7 +196,8 @@ class Transmission:
         try:
             torrents, error = self.get_torrents(ids=ids,
                                                 status=["downloading", "download_pending"],
-                                                tags=tags)
+                                                tags=tags,
+                                                polling=polling)
             return None if error else torrents or []
         except Exception as err:
             logger.error(f"获取正在下载的种子列表出错：{str(err)}")
@@ -1,6 +1,7 @@
 import platform
 import re
 import threading
+import time
 import traceback
 from pathlib import Path
 from threading import Lock
@@ -18,6 +19,7 @@ from app.core.config import settings
 from app.db.systemconfig_oper import SystemConfigOper
 from app.helper.directory import DirectoryHelper
 from app.helper.message import MessageHelper
+from app.helper.snapshotstore import SnapshotStore
 from app.log import logger
 from app.schemas import FileItem
 from app.utils.singleton import Singleton
@@ -63,12 +65,21 @@ class Monitor(metaclass=Singleton):
     # 定时服务
     _scheduler = None
 
-    # 存储快照
+    # 存储快照，存储类型:监控目录 -> 目录路径 -> 目录记录
     _storage_snapshot = {}
 
+    # 存储快照上次全量遍历的时间
+    _snapshot_full_time = {}
+
     # 存储过照间隔（分钟）
     _snapshot_interval = 5
 
+    # 存储快照全量遍历间隔（小时），避免存储未及时更新目录修改时间时遗漏变化
+    _snapshot_full_interval = 24
+
+    # 最近发生过变化的目录，在该时长（小时）内每次快照都重新遍历
+    _snapshot_hot_interval = 6
+
     # TTL缓存，10秒钟有效
     _cache = TTLCache(maxsize=1024, ttl=10)
 
@@ -79,6 +90,7 @@ class Monitor(metaclass=Singleton):
         self.directoryhelper = DirectoryHelper()
         self.systemmessage = MessageHelper()
         self.systemconfig = SystemConfigOper()
+        self.snapshotstore = SnapshotStore(settings.TEMP_PATH / "__snapshot__.db")
 
         self.all_exts = settings.RMT_MEDIAEXT
 
@@ -179,23 +191,42 @@ class Monitor(metaclass=Singleton):
 
     def polling_observer(self, storage: str, mon_path: Path):
         """
-        轮询监控
+        轮询监控，目录快照持久化保存，没有子目录且修改时间未变化的目录不再遍历
         """
         with snapshot_lock:
+            key = f"{storage}:{mon_path}"
+            root = mon_path.as_posix()
+            # 上次的快照，重启后从持久化存储中加载
+            old_dirs = self._storage_snapshot.get(key)
+            if old_dirs is None:
+                old_dirs = self.snapshotstore.load(storage=storage, root=root)
+            new_dirs = dict(old_dirs)
+            now = time.time()
+            full = now - self._snapshot_full_time.get(key, 0) >= self._snapshot_full_interval * 3600
             # 快照存储
-            new_snapshot = self.storagechain.snapshot_storage(storage=storage, path=mon_path)
-            if new_snapshot:
-                # 比较快照
-                old_snapshot = self._storage_snapshot.get(storage)
-                if old_snapshot:
-                    # 新增的文件
-                    new_files = new_snapshot.keys() - old_snapshot.keys()
-                    for new_file in new_files:
-                        # 添加到待整理队列
-                        self.__handle_file(storage=storage, event_path=Path(new_file),
-                                           file_size=new_snapshot.get(new_file))
-                # 更新快照
-                self._storage_snapshot[storage] = new_snapshot
+            new_snapshot = self.storagechain.snapshot_storage(storage=storage, path=mon_path, dirs=new_dirs, full=full,
+                                                              hot_seconds=self._snapshot_hot_interval * 3600)
+            if new_snapshot is None:
+                return
+            if full:
+                self._snapshot_full_time[key] = now
+            # 比较快照
+            if old_dirs:
+                old_files = set()
+                for record in old_dirs.values():
+                    old_files.update(record["files"])
+                # 新增的文件
+                new_files = new_snapshot.keys() - old_files
+                for new_file in new_files:
+                    # 添加到待整理队列
+                    self.__handle_file(storage=storage, event_path=Path(new_file),
+                                       file_size=new_snapshot.get(new_file))
+            # 更新快照，只保存发生变化的目录
+            self.snapshotstore.save(storage=storage, root=root,
+                                    items={path: record for path, record in new_dirs.items()
+                                           if old_dirs.get(path) is not record},
+                                    deletes=old_dirs.keys() - new_dirs.keys())
+            self._storage_snapshot[key] = new_dirs
 
     def event_handler(self, event, text: str, event_path: str, file_size: float = None):
         """
@@ -119,7 +119,7 @@ class MediaServerItem(BaseModel):
     seasoninfo: Optional[Dict[int, list]] = None
     # 备注
     note: Optional[Any] = None
-    # 同步时间
+    # 同步时间，媒体服务器提供变化时间时为服务器端的最后变化时间，用于增量同步
     lst_mod_date: Optional[str] = None
     user_state: Optional[MediaServerItemUserState] = None
 
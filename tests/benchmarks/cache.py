@@ -0,0 +1,43 @@
+# -*- coding: utf-8 -*-
+"""
+缓存命中性能测试，不包含在单元测试中，按需手动运行：
+python -m tests.benchmarks.cache
+"""
+import time
+
+from app.core.cache import cache_backend
+from app.modules.douban.apiv2 import DoubanApi
+from app.modules.themoviedb.tmdbv3api.tmdb import TMDb
+from tests.test_cache import legacy_cache_key
+
+
+def main(rounds: int = 20000):
+    """
+    :param rounds: 每个函数的缓存命中次数
+    """
+    tmdb = TMDb()
+    douban = DoubanApi()
+    url = "https://api.themoviedb.org/3/search/multi?api_key=xxx&query=Dune&language=zh"
+    hits = [
+        (TMDb.cached_request, (tmdb, "GET", url, None, None), {}, {"id": 438631}),
+        (DoubanApi._DoubanApi__invoke_search, (douban, "/search/weixin"), {"q": "沙丘", "start": 0, "count": 20},
+         {"items": []}),
+    ]
+    for wrapper, args, kwargs, value in hits:
+        func = wrapper.__wrapped__
+        cache_backend.set(legacy_cache_key(func, args, kwargs), value, region=wrapper.cache_region)
+        start = time.perf_counter()
+        for _ in range(rounds):
+            cache_backend.get(legacy_cache_key(func, args, kwargs), region=wrapper.cache_region)
+        legacy_cost = time.perf_counter() - start
+        start = time.perf_counter()
+        for _ in range(rounds):
+            wrapper(*args, **kwargs)
+        cost = time.perf_counter() - start
+        print(f"{func.__qualname__} 缓存命中 {rounds} 次：每次解析签名 {legacy_cost / rounds * 1e6:.2f}us/次，"
+              f"预解析签名 {cost / rounds * 1e6:.2f}us/次")
+        wrapper.cache_clear()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,63 @@
+# -*- coding: utf-8 -*-
+"""
+数据库批量写入性能测试，不包含在单元测试中，按需手动运行：
+python -m tests.benchmarks.db_batch
+"""
+import tempfile
+import time
+from pathlib import Path
+from unittest.mock import patch
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import scoped_session, sessionmaker
+
+import app.db.models  # noqa
+from app.db import Base, db_batch
+from app.db.downloadhistory_oper import DownloadHistoryOper
+from app.db.models.downloadhistory import DownloadFiles
+
+TEST_HASH = "__benchmark_db_batch__"
+
+
+def rows(start: int, count: int):
+    return [{
+        "download_hash": TEST_HASH,
+        "downloader": "qbittorrent",
+        "fullpath": f"/downloads/{TEST_HASH}/{i}.mkv",
+        "savepath": f"/downloads/{TEST_HASH}",
+        "filepath": f"{i}.mkv",
+        "torrentname": TEST_HASH,
+        "state": 1
+    } for i in range(start, start + count)]
+
+
+def main(total: int = 50000, legacy: int = 5000):
+    """
+    :param total: 批量写入的行数
+    :param legacy: 逐行提交耗时较长，按较少的行数测量后换算
+    """
+    with tempfile.TemporaryDirectory() as tempdir:
+        engine = create_engine(f"sqlite:///{Path(tempdir) / 'benchmark.db'}")
+        Base.metadata.create_all(engine)
+        session_factory = sessionmaker(bind=engine)
+        with patch("app.db.SessionFactory", session_factory), \
+                patch("app.db.ScopedSession", scoped_session(session_factory)):
+            start = time.perf_counter()
+            for row in rows(0, legacy):
+                DownloadFiles(**row).create(None)
+            legacy_cost = (time.perf_counter() - start) / legacy * total
+            start = time.perf_counter()
+            with db_batch():
+                for row in rows(legacy, total):
+                    DownloadFiles(**row).create(None)
+            batch_cost = time.perf_counter() - start
+            start = time.perf_counter()
+            DownloadHistoryOper().add_files(rows(legacy + total, total))
+            bulk_cost = time.perf_counter() - start
+        engine.dispose()
+    print(f"写入 {total} 行：逐行提交约 {legacy_cost:.2f}s，批量操作逐行新增 {batch_cost:.2f}s，"
+          f"批量写入 {bulk_cost:.2f}s")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,37 @@
+# -*- coding: utf-8 -*-
+"""
+种子过滤性能测试，不包含在单元测试中，按需手动运行：
+python -m tests.benchmarks.filter
+"""
+import time
+
+from app.modules.filter import FilterModule
+from app.schemas import FilterRuleGroup
+from tests.test_filter import RULE_STRING, _RuleHelper, build_torrents, naive_order
+
+
+def main(count: int = 10000, samples: int = 200):
+    """
+    :param count: 种子数量
+    :param samples: 逐个解析的方式过慢，按抽样耗时折算
+    """
+    module = FilterModule()
+    module.rulehelper = _RuleHelper([FilterRuleGroup(name="bench", rule_string=RULE_STRING)])
+    module.init_module()
+    torrents = build_torrents(count)
+    start = time.perf_counter()
+    for torrent in torrents[:samples]:
+        naive_order(torrent, RULE_STRING)
+    naive_cost = (time.perf_counter() - start) * len(torrents) / samples
+    start = time.perf_counter()
+    module.filter_torrents(rule_groups=["bench"], torrent_list=torrents)
+    cold_cost = time.perf_counter() - start
+    start = time.perf_counter()
+    module.filter_torrents(rule_groups=["bench"], torrent_list=torrents)
+    warm_cost = time.perf_counter() - start
+    print(f"过滤 {len(torrents)} 个种子：逐个解析（折算）{naive_cost:.3f}s，"
+          f"编译规则 {cold_cost:.3f}s，命中缓存 {warm_cost:.3f}s")
+
+
+if __name__ == '__main__':
+    main()
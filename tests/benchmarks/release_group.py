@@ -0,0 +1,40 @@
+# -*- coding: utf-8 -*-
+"""
+制作组识别性能测试，不包含在单元测试中，按需手动运行：
+python -m tests.benchmarks.release_group
+"""
+import time
+
+from app.core.meta.releasegroup import ReleaseGroupsMatcher
+from tests.cases.groups import release_group_cases
+from tests.test_release_group import legacy_match
+
+
+def main(rounds: int = 3):
+    """
+    :param rounds: 重复识别的轮数
+    """
+    titles = [item.get("title") for info in release_group_cases for item in info.get('groups', [])]
+    titles += ["【喵萌奶茶屋】★04月新番★[葬送的芙莉莲][01][1080p][简日双语]",
+               "Dune.Part.Two.2024.2160p.UHD.BluRay.x265-NoGroup", "Oppenheimer 2023 1080p WEB-DL"]
+    # 预热，不计入编译正则和建立预筛选索引的耗时
+    for title in titles:
+        legacy_match(title)
+        ReleaseGroupsMatcher().match(title)
+    start = time.perf_counter()
+    for _ in range(rounds):
+        for title in titles:
+            legacy_match(title)
+    legacy_cost = time.perf_counter() - start
+    start = time.perf_counter()
+    for _ in range(rounds):
+        for title in titles:
+            ReleaseGroupsMatcher().match(title)
+    prefilter_cost = time.perf_counter() - start
+    count = rounds * len(titles)
+    print(f"识别 {count} 个标题的制作组：全量正则 {count / legacy_cost:.0f} 个/秒，"
+          f"前缀预筛选 {count / prefilter_cost:.0f} 个/秒")
+
+
+if __name__ == '__main__':
+    main()
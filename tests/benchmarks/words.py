@@ -0,0 +1,35 @@
+# -*- coding: utf-8 -*-
+"""
+自定义识别词处理性能测试，不包含在单元测试中，按需手动运行：
+python -m tests.benchmarks.words
+"""
+import time
+
+from app.core.meta.words import WordsMatcher
+from tests.cases.meta import meta_cases
+from tests.test_words import CUSTOM_WORDS, legacy_prepare
+
+
+def main(rounds: int = 5):
+    """
+    :param rounds: 重复处理的轮数
+    """
+    titles = [info.get("title") or info.get("path") for info in meta_cases] \
+        + ["Series7 第05集 1080p", "海贼王 第1000话 1080p", "Friends S01E05.1080p.WEB-DL"]
+    start = time.perf_counter()
+    for _ in range(rounds):
+        for title in titles:
+            legacy_prepare(title, CUSTOM_WORDS)
+    legacy_cost = time.perf_counter() - start
+    start = time.perf_counter()
+    for _ in range(rounds):
+        for title in titles:
+            WordsMatcher().prepare(title, custom_words=CUSTOM_WORDS)
+    compiled_cost = time.perf_counter() - start
+    count = rounds * len(titles)
+    print(f"{len(CUSTOM_WORDS)} 个识别词处理 {count} 个标题：逐个解析 {count / legacy_cost:.0f} 个/秒，"
+          f"预编译 {count / compiled_cost:.0f} 个/秒")
+
+
+if __name__ == '__main__':
+    main()
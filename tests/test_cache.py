@@ -0,0 +1,205 @@
+# -*- coding: utf-8 -*-
+import inspect
+import time
+from unittest import TestCase
+
+from cachetools.keys import hashkey
+
+from app.core.cache import CacheKeyMaker, RedisBackend, TieredBackend, cache_backend
+from app.modules.douban.apiv2 import DoubanApi
+from app.modules.themoviedb.tmdbv3api.tmdb import TMDb
+
+
+def legacy_cache_key(func, args, kwargs) -> str:
+    """
+    每次调用都解析函数签名并绑定参数的参考实现，用于校验结果和对比耗时
+    """
+    signature = inspect.signature(func)
+    bound = signature.bind(*args, **kwargs)
+    bound.apply_defaults()
+    parameters = list(signature.parameters.keys())
+    if parameters and parameters[0] in ("self", "cls"):
+        bound.arguments.pop(parameters[0], None)
+    keys = [
+        bound.arguments[param] for param in signature.parameters if param in bound.arguments
+    ]
+    return f"{func.__name__}_{hashkey(*keys)}"
+
+
+class _Api:
+
+    def simple(self, name, year=None, mtype="movie"):
+        pass
+
+    def invoke(self, url, **kwargs):
+        pass
+
+    def keyword_only(self, name, *, page=1):
+        pass
+
+    def var_positional(self, *names, page=1):
+        pass
+
+
+class CacheTest(TestCase):
+
+    def test_cache_key(self):
+        api = _Api()
+        calls = [
+            (_Api.simple, (api, "Dune"), {}),
+            (_Api.simple, (api, "Dune", 2021, "tv"), {}),
+            (_Api.simple, (api, "Dune"), {"mtype": "tv"}),
+            (_Api.simple, (api,), {"name": "Dune", "year": 2021}),
+            (_Api.invoke, (api, "/search"), {}),
+            (_Api.invoke, (api, "/search"), {"q": "Dune", "start": 0}),
+            (_Api.invoke, (api,), {"url": "/search", "q": "Dune"}),
+            (_Api.keyword_only, (api, "Dune"), {"page": 2}),
+            (_Api.var_positional, (api, "Dune", "Arrival"), {}),
+        ]
+        for func, args, kwargs in calls:
+            self.assertEqual(legacy_cache_key(func, args, kwargs), CacheKeyMaker(func)(args, kwargs))
+        # 参数不合法时与签名绑定一样抛出异常
+        for args, kwargs in [((api,), {}), ((api, "Dune"), {"name": "Dune"}), ((api, "Dune"), {"page": 1}),
+                             ((api, "Dune", 2021, "tv", 1), {})]:
+            with self.assertRaises(TypeError):
+                CacheKeyMaker(_Api.simple)(args, kwargs)
+
+    def test_cache_hit_compatible(self):
+        tmdb = TMDb()
+        douban = DoubanApi()
+        url = "https://api.themoviedb.org/3/search/multi?api_key=xxx&query=Dune&language=zh"
+        hits = [
+            (TMDb.cached_request, (tmdb, "GET", url, None, None), {}, {"id": 438631}),
+            (DoubanApi._DoubanApi__invoke_search, (douban, "/search/weixin"), {"q": "沙丘", "start": 0, "count": 20},
+             {"items": []}),
+        ]
+        for wrapper, args, kwargs, value in hits:
+            func = wrapper.__wrapped__
+            # 按原有方式生成的键预置缓存，命中说明缓存键保持兼容
+            cache_backend.set(legacy_cache_key(func, args, kwargs), value, region=wrapper.cache_region)
+            self.assertEqual(value, wrapper(*args, **kwargs))
+            wrapper.cache_clear()
+
+
+class _FakePubSub:
+
+    def __init__(self, client):
+        self.client = client
+
+    def subscribe(self, **handlers):
+        for channel, handler in handlers.items():
+            self.client.handlers.setdefault(channel, []).append(handler)
+
+    def run_in_thread(self, **kwargs):
+        return self
+
+    def stop(self):
+        pass
+
+    def close(self):
+        pass
+
+
+class _FakeRedis:
+    """
+    内存实现的 Redis 客户端，发布的消息同步投递给所有订阅者
+    """
+
+    def __init__(self):
+        self.data = {}
+        self.handlers = {}
+
+    def get(self, name):
+        return self.data.get(name)
+
+    def set(self, name, value, ex=None, **kwargs):
+        self.data[name] = value
+
+    def exists(self, name):
+        return int(name in self.data)
+
+    def delete(self, name):
+        self.data.pop(name, None)
+
+    def pubsub(self, **kwargs):
+        return _FakePubSub(self)
+
+    def publish(self, channel, message):
+        for handler in self.handlers.get(channel, []):
+            handler({"channel": channel, "data": message})
+
+    def close(self):
+        pass
+
+
+class TieredBackendTest(TestCase):
+
+    def setUp(self):
+        self.client = _FakeRedis()
+        # 不连接真实的 Redis，直接替换客户端
+        backend = RedisBackend.__new__(RedisBackend)
+        backend.redis_url = None
+        backend.ttl = 1800
+        backend.client = self.client
+        self.backend = backend
+
+    def __tiered(self, **kwargs) -> TieredBackend:
+        return TieredBackend(backend=self.backend, **kwargs)
+
+    def test_hit_and_miss(self):
+        cache = self.__tiered()
+        self.assertIsNone(cache.get("movie", region="test"))
+        cache.set("movie", {"title": "Dune", "genres": ["Sci-Fi"]}, region="test")
+        self.assertEqual({"title": "Dune", "genres": ["Sci-Fi"]}, cache.get("movie", region="test"))
+        self.assertTrue(cache.exists("movie", region="test"))
+        self.assertEqual({"l1_hits": 1, "l1_misses": 1, "l2_hits": 0, "l2_misses": 1},
+                         {k: v for k, v in cache.get_stats()["test"].items() if not k.endswith("_avg_ms")})
+
+    def test_returned_value_isolated(self):
+        cache = self.__tiered()
+        value = {"title": "Dune", "genres": ["Sci-Fi"]}
+        cache.set("movie", value, region="test")
+        # 修改写入的对象和读取到的对象都不影响一级缓存
+        value["genres"].append("Drama")
+        cache.get("movie", region="test")["genres"].append("Action")
+        self.assertEqual(["Sci-Fi"], cache.get("movie", region="test")["genres"])
+        self.assertEqual(2, cache.get_stats()["test"]["l1_hits"])
+
+    def test_ttl_expiry(self):
+        cache = self.__tiered(ttl=1)
+        cache.set("movie", "Dune", region="test")
+        self.assertEqual("Dune", cache.get("movie", region="test"))
+        time.sleep(1.1)
+        # 一级缓存过期后从 Redis 读取并回填
+        self.assertEqual("Dune", cache.get("movie", region="test"))
+        self.assertEqual("Dune", cache.get("movie", region="test"))
+        stats = cache.get_stats()["test"]
+        self.assertEqual((2, 1), (stats["l1_hits"], stats["l1_misses"]))
+        self.assertEqual((1, 0), (stats["l2_hits"], stats["l2_misses"]))
+
+    def test_backfill_from_l2(self):
+        # 其它实例写入的数据只存在于 Redis
+        self.backend.set("movie", ["Dune", 2021], region="test")
+        cache = self.__tiered()
+        self.assertEqual(["Dune", 2021], cache.get("movie", region="test"))
+        self.assertEqual(["Dune", 2021], cache.get("movie", region="test"))
+        stats = cache.get_stats()["test"]
+        self.assertEqual((1, 1, 1, 0), (stats["l1_hits"], stats["l1_misses"], stats["l2_hits"], stats["l2_misses"]))
+        self.assertGreaterEqual(stats["l1_avg_ms"], 0)
+        self.assertGreater(stats["l2_avg_ms"], 0)
+
+    def test_invalidation(self):
+        cache = self.__tiered(invalidation=True)
+        other = self.__tiered(invalidation=True)
+        cache.set("movie", "Dune", region="test")
+        self.assertEqual("Dune", other.get("movie", region="test"))
+        # 其它实例更新后通知失效，本实例重新从 Redis 读取
+        other.set("movie", "Dune: Part Two", region="test")
+        self.assertEqual("Dune: Part Two", cache.get("movie", region="test"))
+        # 删除同时清理两级缓存和其它实例的一级缓存
+        cache.set("series", "Arcane", region="test")
+        self.assertEqual("Arcane", other.get("series", region="test"))
+        cache.delete("series", region="test")
+        self.assertIsNone(cache.get("series", region="test"))
+        self.assertIsNone(other.get("series", region="test"))
+        self.assertFalse(other.exists("series", region="test"))
@@ -0,0 +1,87 @@
+# -*- coding: utf-8 -*-
+import tempfile
+from pathlib import Path
+from unittest import TestCase
+from unittest.mock import patch
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import scoped_session, sessionmaker
+
+import app.db.models  # noqa
+from app.db import Base, db_batch
+from app.db.downloadhistory_oper import DownloadHistoryOper
+from app.db.models.downloadhistory import DownloadFiles
+
+# 测试数据使用的种子Hash
+TEST_HASH = "__test_db_batch__"
+
+
+class DbBatchTest(TestCase):
+
+    def setUp(self):
+        # 使用临时数据库，不影响用户数据
+        self._tempdir = tempfile.TemporaryDirectory()
+        self._engine = create_engine(f"sqlite:///{Path(self._tempdir.name) / 'test.db'}")
+        Base.metadata.create_all(self._engine)
+        self._session_factory = sessionmaker(bind=self._engine)
+        self._patches = [patch("app.db.SessionFactory", self._session_factory),
+                         patch("app.db.ScopedSession", scoped_session(self._session_factory))]
+        for p in self._patches:
+            p.start()
+
+    def tearDown(self):
+        for p in self._patches:
+            p.stop()
+        self._engine.dispose()
+        self._tempdir.cleanup()
+
+    @staticmethod
+    def __rows(start: int, count: int, state: int = 1):
+        return [{
+            "download_hash": TEST_HASH,
+            "downloader": "qbittorrent",
+            "fullpath": f"/downloads/{TEST_HASH}/{i}.mkv",
+            "savepath": f"/downloads/{TEST_HASH}",
+            "filepath": f"{i}.mkv",
+            "torrentname": TEST_HASH,
+            "state": state
+        } for i in range(start, start + count)]
+
+    def __count(self) -> int:
+        with self._session_factory() as db:
+            return db.query(DownloadFiles).filter(DownloadFiles.download_hash == TEST_HASH).count()
+
+    def test_batch_rollback(self):
+        with self.assertRaises(RuntimeError):
+            with db_batch():
+                DownloadHistoryOper().add_files(self.__rows(0, 10))
+                # 批量操作中可以查询到未提交的数据
+                self.assertEqual(10, len(DownloadHistoryOper().get_files_by_hash(TEST_HASH)))
+                raise RuntimeError()
+        self.assertEqual(0, self.__count())
+
+    def test_batch_nested(self):
+        with db_batch() as outer:
+            DownloadHistoryOper().add_files(self.__rows(0, 5))
+            with db_batch() as inner:
+                # 嵌套的批量操作并入外层，退出时不提交
+                self.assertIs(outer, inner)
+                DownloadHistoryOper().add_files(self.__rows(5, 5))
+            self.assertEqual(0, self.__count())
+        self.assertEqual(10, self.__count())
+        # 嵌套中出错时整个批量操作回滚
+        with self.assertRaises(RuntimeError):
+            with db_batch():
+                DownloadHistoryOper().add_files(self.__rows(10, 5))
+                with db_batch():
+                    DownloadHistoryOper().add_files(self.__rows(15, 5))
+                    raise RuntimeError()
+        self.assertEqual(10, self.__count())
+
+    def test_bulk_upsert(self):
+        DownloadHistoryOper().add_files(self.__rows(0, 10))
+        inserts, updates = DownloadFiles.bulk_upsert(None, self.__rows(5, 10, state=0), ["fullpath"])
+        self.assertEqual((5, 5), (inserts, updates))
+        files = DownloadHistoryOper().get_files_by_hash(TEST_HASH)
+        self.assertEqual(15, len(files))
+        self.assertEqual(10, len([file for file in files if file.state == 0]))
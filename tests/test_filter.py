@@ -0,0 +1,124 @@
+# -*- coding: utf-8 -*-
+import random
+import re
+from typing import List
+from unittest import TestCase
+
+from app.core.context import TorrentInfo
+from app.modules.filter import FilterModule
+from app.modules.filter.RuleParser import RuleParser
+from app.schemas import FilterRuleGroup
+
+# 多级过滤规则
+RULE_STRING = "SPECSUB & CNSUB & 4K & !BLU & !REMUX & !DOLBY & !3D > CNSUB & 4K & !BLU & !REMUX & !3D " \
+              "> CNSUB & 4K & WEBDL & !DOLBY & HDR > CNSUB & 1080P & !BLU & !REMUX & !3D " \
+              "> 4K & !BLURAY & !REMUX & !DOLBY & !3D > 1080P & (H265 | H264) & !BLU > 720P | 60FPS"
+
+
+class _RuleHelper:
+    """
+    测试用规则帮助类，不读取数据库
+    """
+
+    def __init__(self, rule_groups: List[FilterRuleGroup]):
+        self.rule_groups = rule_groups
+
+    @staticmethod
+    def get_custom_rules():
+        return []
+
+    def get_rule_group_by_media(self, media=None, group_names: list = None):
+        return [group for group in self.rule_groups if group.name in group_names]
+
+
+def build_torrents(count: int) -> List[TorrentInfo]:
+    """
+    生成合成种子数据
+    """
+    rand = random.Random(20240101)
+    names = ["The Last of Us", "Breaking Bad", "Dune Part Two", "Oppenheimer", "Bluey", "Frieren"]
+    sources = ["BluRay", "WEB-DL", "UHD BluRay", "WEBRip", "BluRay REMUX", "HDTV"]
+    pixes = ["2160p", "1080p", "720p", "1080i"]
+    codecs = ["x265", "H.264", "HEVC", "AVC", "VC-1"]
+    extras = ["", "HDR", "DV", "Atmos", "60fps", "3D", "HDR10+"]
+    subtitles = ["中字", "简繁中字", "国语配音", "特效字幕", "粤语", "", "官方"]
+    torrents = []
+    for i in range(count):
+        title = f"{rand.choice(names)} S0{rand.randint(1, 5)} {rand.randint(1990, 2024)} " \
+                f"{rand.choice(pixes)} {rand.choice(sources)} {rand.choice(codecs)} {rand.choice(extras)}-GRP{i % 50}"
+        torrents.append(TorrentInfo(site=i % 40, site_name=f"site{i % 40}", title=title,
+                                    description=f"{rand.choice(subtitles)} {rand.choice(subtitles)}",
+                                    size=rand.randint(1, 80) * 1024 ** 3, seeders=rand.randint(0, 100)))
+    return torrents
+
+
+def naive_order(torrent: TorrentInfo, rule_string: str) -> int:
+    """
+    逐个种子重新解析规则并即时匹配正则的参考实现，用于校验结果和对比耗时
+    """
+
+    def __match_rule(rule_name: str) -> bool:
+        rule = FilterModule.rule_set.get(rule_name)
+        if not rule:
+            return False
+        content = f"{torrent.title} {torrent.description} {' '.join(torrent.labels or [])}"
+        includes = rule.get("include") or []
+        excludes = rule.get("exclude") or []
+        if includes and not any(re.search(r"%s" % include, content, re.IGNORECASE) for include in includes):
+            return False
+        return not any(re.search(r"%s" % exclude, content, re.IGNORECASE) for exclude in excludes)
+
+    def __match_group(group) -> bool:
+        if not isinstance(group, list):
+            return __match_rule(group)
+        elif len(group) == 1:
+            return __match_group(group[0])
+        elif group[0] == "not":
+            return not __match_group(group[1:])
+        elif group[1] == "and":
+            return __match_group(group[0]) and __match_group(group[2:])
+        elif group[1] == "or":
+            return __match_group(group[0]) or __match_group(group[2:])
+
+    order = 100
+    for level in rule_string.split('>'):
+        if __match_group(RuleParser().parse(level.strip()).as_list()[0]):
+            return order
+        order -= 1
+    return 0
+
+
+class FilterTest(TestCase):
+
+    def setUp(self) -> None:
+        self.module = FilterModule()
+        self.module.rulehelper = _RuleHelper([FilterRuleGroup(name="bench", rule_string=RULE_STRING)])
+        self.module.init_module()
+
+    def test_compile(self):
+        compiled = RuleParser().compile("CNSUB & !BLU & (4K | 1080P) > !3D")
+        self.assertEqual(compiled, (
+            ("and", (("rule", "CNSUB"), ("not", ("rule", "BLU")), ("or", (("rule", "4K"), ("rule", "1080P"))))),
+            ("not", ("rule", "3D")),
+        ))
+        self.assertIs(compiled, RuleParser().compile("CNSUB & !BLU & (4K | 1080P) > !3D"))
+
+    def test_filter_torrents(self):
+        torrents = build_torrents(300)
+        expected = {id(t): naive_order(t, RULE_STRING) for t in torrents}
+        result = self.module.filter_torrents(rule_groups=["bench"], torrent_list=torrents)
+        self.assertEqual([t for t in torrents if expected[id(t)]], result)
+        for torrent in result:
+            self.assertEqual(expected[id(torrent)], torrent.pri_order)
+        # 命中匹配结果缓存时结果一致
+        self.assertEqual(result, self.module.filter_torrents(rule_groups=["bench"], torrent_list=torrents))
+
+    def test_filter_torrents_batch(self):
+        torrents = build_torrents(300)
+        matrix = self.module.filter_torrents_batch(rule_groups_list=[["bench"], [], ["bench"]],
+                                                   torrent_list=torrents)
+        self.assertEqual({("bench",), ()}, set(matrix.keys()))
+        self.assertEqual([naive_order(t, RULE_STRING) or None for t in torrents], matrix[("bench",)])
+        self.assertEqual([t.pri_order for t in torrents], matrix[()])
+        # 批量过滤不修改种子
+        self.assertTrue(all(t.pri_order == 0 for t in torrents))
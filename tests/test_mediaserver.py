@@ -0,0 +1,57 @@
+# -*- coding: utf-8 -*-
+import tempfile
+from pathlib import Path
+from unittest import TestCase
+from unittest.mock import patch
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import scoped_session, sessionmaker
+
+import app.db.models  # noqa
+from app.chain.mediaserver import MediaServerChain
+from app.core.event import Event
+from app.db import Base
+from app.db.mediaserver_oper import MediaServerIndex, MediaServerOper
+from app.schemas import WebhookEventInfo
+from app.schemas.types import EventType
+
+
+class MediaServerWebhookTest(TestCase):
+
+    def setUp(self):
+        # 使用临时数据库，不影响用户数据
+        self._tempdir = tempfile.TemporaryDirectory()
+        self._engine = create_engine(f"sqlite:///{Path(self._tempdir.name) / 'test.db'}")
+        Base.metadata.create_all(self._engine)
+        self._session_factory = sessionmaker(bind=self._engine)
+        self._patches = [patch("app.db.SessionFactory", self._session_factory),
+                         patch("app.db.ScopedSession", scoped_session(self._session_factory))]
+        for p in self._patches:
+            p.start()
+        MediaServerIndex().clear()
+
+    def tearDown(self):
+        MediaServerIndex().clear()
+        for p in self._patches:
+            p.stop()
+        self._engine.dispose()
+        self._tempdir.cleanup()
+
+    def test_delete_webhook(self):
+        MediaServerOper().add(server="emby", library="1", item_id="1001", item_type="电影",
+                              title="沙丘", year="2021", tmdbid=438631)
+        MediaServerIndex().load()
+        self.assertIsNotNone(MediaServerOper().exists(tmdbid=438631, mtype="电影"))
+        for event, channel, message in [
+            ("library.deleted", "emby", {"Event": "library.deleted", "Item": {"Id": "1001", "Type": "Movie"}}),
+            ("ItemDeleted", "emby", {"NotificationType": "ItemDeleted", "ItemId": "1001"}),
+        ]:
+            MediaServerOper().add(server="emby", library="1", item_id="1001", item_type="电影",
+                                  title="沙丘", year="2021", tmdbid=438631)
+            event_info = WebhookEventInfo(event=event, channel=channel, server_name="emby", json_object=message)
+            # 媒体服务器中已查询不到该条目
+            with patch.object(MediaServerChain, "iteminfo", return_value=None) as iteminfo:
+                MediaServerChain().update_by_webhook(Event(EventType.WebhookMessage, event_info))
+            iteminfo.assert_called_once_with(server="emby", item_id="1001")
+            self.assertIsNone(MediaServerOper().exists(tmdbid=438631, mtype="电影"))
+            self.assertEqual({}, MediaServerOper().list_sync_dates())
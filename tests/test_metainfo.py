@@ -2,7 +2,7 @@
 from pathlib import Path
 from unittest import TestCase
 
-from app.core.metainfo import MetaInfo, MetaInfoPath
+from app.core.metainfo import MetaInfo, MetaInfoPath, MetaInfoCache
 from tests.cases.meta import meta_cases
 
 
@@ -33,3 +33,14 @@ class MetaInfoTest(TestCase):
                 "audio_codec": meta_info.audio_encode or ""
             }
             self.assertEqual(target, info.get("target"))
+
+    def test_metainfo_cache(self):
+        title = "The.Last.of.Us.S01E01.2023.2160p.WEB-DL.H265.DDP5.1.Atmos-HHWEB"
+        meta_info = MetaInfo(title=title)
+        hits = MetaInfoCache().stats().get("hits")
+        # 修改返回结果不影响缓存
+        meta_info.begin_episode = 99
+        cached_info = MetaInfo(title=title)
+        self.assertEqual(cached_info.begin_episode, 1)
+        self.assertIsNot(meta_info, cached_info)
+        self.assertEqual(MetaInfoCache().stats().get("hits"), hits + 1)
@@ -1,7 +1,24 @@
 from unittest import TestCase
+
+import regex as re
+
 from tests.cases.groups import release_group_cases
 from app.core.meta.releasegroup import ReleaseGroupsMatcher
 
+
+def legacy_match(title: str) -> str:
+    """
+    每次用全部组构建并编译正则的参考实现，用于校验结果和对比耗时
+    """
+    groups = '|'.join(group for site_groups in ReleaseGroupsMatcher.RELEASE_GROUPS.values() for group in site_groups)
+    groups_re = re.compile(r"(?<=[-@\[￡【&])(?:%s)(?=[@.\s\S\]\[】&])" % groups, re.I)
+    unique_groups = []
+    for item in re.findall(groups_re, f"{title} "):
+        if item not in unique_groups:
+            unique_groups.append(item)
+    return "@".join(unique_groups)
+
+
 class MetaInfoTest(TestCase):
     def test_release_group(self):
         for info in release_group_cases:
@@ -11,3 +28,10 @@ class MetaInfoTest(TestCase):
                 print(f"\tmatch release group {release_group}, should be: {item.get('group')}")
                 self.assertEqual(item.get("group"), release_group)
             print(f"完成 {info.get('domain')}")
+
+    def test_release_group_legacy(self):
+        titles = [item.get("title") for info in release_group_cases for item in info.get('groups', [])]
+        titles += ["【喵萌奶茶屋】★04月新番★[葬送的芙莉莲][01][1080p][简日双语]",
+                   "Dune.Part.Two.2024.2160p.UHD.BluRay.x265-NoGroup", "Oppenheimer 2023 1080p WEB-DL"]
+        for title in titles:
+            self.assertEqual(legacy_match(title), ReleaseGroupsMatcher().match(title))
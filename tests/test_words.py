@@ -0,0 +1,108 @@
+# -*- coding: utf-8 -*-
+from typing import List, Tuple
+from unittest import TestCase
+
+import cn2an
+import regex as re
+
+from app.core.meta.words import WordsMatcher
+from tests.cases.meta import meta_cases
+
+# 合成识别词：屏蔽词、替换词、集偏移及组合格式，大部分不会命中
+CUSTOM_WORDS = [f"NoiseWord{i}" for i in range(100)] \
+               + [f"OldName{i} => NewName{i}" for i in range(100)] \
+               + [f"前缀{i} <> 后缀{i} >> EP+{i}" for i in range(100)] \
+               + [f"Series{i} => Series {i} && 第 <> 集 >> EP-1" for i in range(100)] \
+               + ["#注释", "WEB-DL => WEBDL", "2160p", "(?i)the\\.", "第 <> 话 >> EP+12",
+                  "Friends => Friends && E <> \\. >> EP+1"]
+
+
+def legacy_prepare(title: str, words: List[str]) -> Tuple[str, List[str]]:
+    """
+    每个标题都重新解析识别词并先查找后替换的参考实现，用于校验结果和对比耗时
+    """
+
+    def __replace_regex(_title: str, replaced: str, replace: str) -> Tuple[str, bool]:
+        try:
+            if not re.findall(r'%s' % replaced, _title):
+                return _title, False
+            return re.sub(r'%s' % replaced, r'%s' % replace, _title), True
+        except Exception:
+            return _title, False
+
+    def __episode_offset(_title: str, front: str, back: str, offset: str) -> Tuple[str, bool]:
+        try:
+            if back and not re.findall(r'%s' % back, _title):
+                return _title, False
+            if front and not re.findall(r'%s' % front, _title):
+                return _title, False
+            offset_word_info_re = re.compile(r'(?<=%s.*?)[0-9一二三四五六七八九十]+(?=.*?%s)' % (front, back))
+            episode_nums_str = re.findall(offset_word_info_re, _title)
+            if not episode_nums_str:
+                return _title, False
+            episode_nums_offset_str = []
+            offset_order_flag = False
+            for episode_num_str in episode_nums_str:
+                episode_num_int = int(cn2an.cn2an(episode_num_str, "smart"))
+                episode_num_offset_int = int(eval(offset.replace("EP", str(episode_num_int))))
+                if episode_num_int > episode_num_offset_int:
+                    offset_order_flag = True
+                elif episode_num_int < episode_num_offset_int:
+                    offset_order_flag = False
+                if not episode_num_str.isdigit():
+                    episode_num_offset_str = cn2an.an2cn(episode_num_offset_int, "low")
+                else:
+                    count_0 = re.findall(r"^0+", episode_num_str)
+                    if count_0:
+                        episode_num_offset_str = f"{count_0[0]}{episode_num_offset_int}"
+                    else:
+                        episode_num_offset_str = str(episode_num_offset_int)
+                episode_nums_offset_str.append(episode_num_offset_str)
+            episode_nums_dict = dict(zip(episode_nums_str, episode_nums_offset_str))
+            episode_nums_list = sorted(episode_nums_dict.items(), key=lambda x: x[1], reverse=not offset_order_flag)
+            for episode_num in episode_nums_list:
+                episode_offset_re = re.compile(r'(?<=%s.*?)%s(?=.*?%s)' % (front, episode_num[0], back))
+                _title = re.sub(episode_offset_re, r'%s' % episode_num[1], _title)
+            return _title, True
+        except Exception:
+            return _title, False
+
+    apply_words = []
+    for word in words:
+        if not word or word.startswith("#"):
+            continue
+        if word.count(" => ") and word.count(" && ") and word.count(" >> ") and word.count(" <> "):
+            thc = str(re.findall(r'(.*?)\s*=>', word)[0]).strip()
+            bthc = str(re.findall(r'=>\s*(.*?)\s*&&', word)[0]).strip()
+            pyq = str(re.findall(r'&&\s*(.*?)\s*<>', word)[0]).strip()
+            pyh = str(re.findall(r'<>(.*?)\s*>>', word)[0]).strip()
+            offsets = str(re.findall(r'>>\s*(.*?)$', word)[0]).strip()
+            title, state = __replace_regex(title, thc, bthc)
+            if state:
+                title, state = __episode_offset(title, pyq, pyh, offsets)
+        elif word.count(" => "):
+            strings = word.split(" => ")
+            title, state = __replace_regex(title, strings[0], strings[1])
+        elif word.count(" >> ") and word.count(" <> "):
+            strings = word.split(" <> ")
+            offsets = strings[1].split(" >> ")
+            title, state = __episode_offset(title, strings[0], offsets[0], offsets[1])
+        else:
+            if not word.strip():
+                continue
+            title, state = __replace_regex(title, word, "")
+        if state:
+            apply_words.append(word)
+    return title, apply_words
+
+
+class WordsMatcherTest(TestCase):
+
+    def setUp(self) -> None:
+        self.titles = [info.get("title") or info.get("path") for info in meta_cases] \
+                      + ["Series7 第05集 1080p", "海贼王 第1000话 1080p", "Friends S01E05.1080p.WEB-DL"]
+
+    def test_prepare(self):
+        for title in self.titles:
+            self.assertEqual(legacy_prepare(title, CUSTOM_WORDS),
+                             WordsMatcher().prepare(title, custom_words=CUSTOM_WORDS))